@@ -1,9 +1,6 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import boto3
-import re
-from io import BytesIO
 
 # --- CONFIGURAZIONE PAGINA: SIDEBAR CHIUSA DI DEFAULT ---
 st.set_page_config(
@@ -59,107 +56,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- INIZIALIZZAZIONE S3 CLIENT ---
-@st.cache_resource
-def get_s3_client():
-    try:
-        if "digitalocean" in st.secrets:
-            secrets = st.secrets["digitalocean"]
-        else:
-            secrets = st.secrets
-        
-        return boto3.client('s3',
-            region_name=secrets.get("region", "sfo3"),
-            endpoint_url=secrets.get("endpoint", "https://sfo3.digitaloceanspaces.com"),
-            aws_access_key_id=secrets.get("access_key"),
-            aws_secret_access_key=secrets.get("secret_key")
-        ), secrets.get("bucket_name", "ihosp-kross-archive")
-    except Exception as e:
-        st.error(f"Errore connessione S3: {e}")
-        return None, None
-
-s3_client, bucket_name = get_s3_client()
-
-# --- FUNZIONE: CERCATORE DI TREND (Forecast Precedente) ---
-def get_previous_forecast_data(structure, year):
-    """
-    Trova e carica il forecast cronologicamente precedente a quello ATTUALMENTE VISUALIZZATO.
-    """
-    if not s3_client or not bucket_name:
-        return pd.DataFrame()
-    
-    try:
-        structure_map = {
-            "Lavagnini My Place": "Lavagnini", 
-            "La Terrazza di Jenny": "La_Terrazza", 
-            "B&B Pitti Palace": "Pitti_Palace"
-        }
-        
-        struct_normalized = structure_map.get(structure, structure.replace(" ", "_"))
-        prefix = f"Forecast/{struct_normalized}/{year}/"
-        
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        
-        if 'Contents' not in response:
-            return pd.DataFrame()
-        
-        files_metadata = []
-        snapshot_pattern = r'_Snapshot_(\d{8})\.xlsx$'
-        
-        for obj in response['Contents']:
-            key = obj['Key']
-            if not key.lower().endswith(('.xlsx', '.xls')):
-                continue
-            
-            match = re.search(snapshot_pattern, key)
-            if match:
-                date_str = match.group(1)
-                try:
-                    file_date = datetime.datetime.strptime(date_str, '%Y%m%d')
-                    files_metadata.append({'key': key, 'date': file_date, 'source': 'filename'})
-                except:
-                    files_metadata.append({'key': key, 'date': obj['LastModified'].replace(tzinfo=None), 'source': 'lastmodified'})
-            else:
-                files_metadata.append({'key': key, 'date': obj['LastModified'].replace(tzinfo=None), 'source': 'lastmodified'})
-        
-        if len(files_metadata) < 2:
-            return pd.DataFrame()
-        
-        files_metadata.sort(key=lambda x: x['date'], reverse=True)
-        previous_file = files_metadata[1]
-        
-        file_obj = s3_client.get_object(Bucket=bucket_name, Key=previous_file['key'])
-        df = pd.read_excel(BytesIO(file_obj['Body'].read()), engine='openpyxl')
-        
-        df.columns = [str(c).lower().strip() for c in df.columns]
-        mappa_nomi = {
-            'data': 'date', 'occupate %': 'occupancy_pct', 'occupancy %': 'occupancy_pct',
-            'totale revenue': 'revenue', 'ricavo': 'revenue', 'adr': 'adr',
-            'occupate': 'rooms_sold', 'unità': 'rooms', 'unita': 'rooms'
-        }
-        df.rename(columns=mappa_nomi, inplace=True)
-        
-        if 'date' not in df.columns or 'revenue' not in df.columns:
-            return pd.DataFrame()
-        
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = df.dropna(subset=['date'])
-        df = df[~df['date'].astype(str).str.contains('Totale|totale|TOTALE|Total', na=False, case=False)]
-        
-        for col in ['revenue', 'rooms_sold', 'adr']:
-            if col in df.columns:
-                if df[col].dtype == object:
-                    df[col] = df[col].astype(str).str.replace('€', '', regex=False)\
-                                   .str.replace('.', '', regex=False)\
-                                   .str.replace(',', '.', regex=False)\
-                                   .str.strip()
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        
-        return df
-        
-    except Exception as e:
-        return pd.DataFrame()
-
 # --- FUNZIONE: KPI CARD - FIX UNSAFE_ALLOW_HTML ---
 def render_kpi_card(label, value_str, delta_num, format_type, container):
     """
@@ -216,6 +112,13 @@ def render_kpi_card(label, value_str, delta_num, format_type, container):
     with container:
         st.markdown(html_content, unsafe_allow_html=True)
 
+# --- WARMUP CACHE IN BACKGROUND ---
+from services import warmup, portfolio
+from services.calendar_dim import MESI_IT, calendar_columns
+from services.reports import DAILY_DETAIL_COLUMNS, MONTHLY_GRID_COLUMNS
+from ui.components import render_export, render_grid, spec_column_config
+warmup.start_warmup()
+
 # --- INIZIALIZZAZIONE STATO ---
 if 'selected_year' not in st.session_state:
     st.session_state.selected_year = datetime.datetime.now().year
@@ -236,7 +139,7 @@ def change_month(delta):
 # --- SIDEBAR (Nascosta) ---
 with st.sidebar:
     st.title("🔧 Filtri")
-    strutture_options = ["Lavagnini My Place", "La Terrazza di Jenny", "B&B Pitti Palace"]
+    strutture_options = ["Lavagnini My Place", "La Terrazza di Jenny", "B&B Pitti Palace", portfolio.PORTFOLIO_LABEL]
     
     if 'selected_struct' not in st.session_state:
         st.session_state.selected_struct = strutture_options[0]
@@ -246,11 +149,19 @@ with st.sidebar:
     st.divider()
     use_ita = True 
 
+    # Stato cache: il worker parte con la prima sessione del processo e resta attivo
+    warmup_state = warmup.get_warmup_status()
+    if warmup_state['state'] == 'warm':
+        st.caption("🟢 Cache dati: calda")
+    elif warmup_state['state'] == 'error':
+        failed = [f"{d['structure']} {d['year']}" for d in warmup_state['details'] if d['state'] == 'error']
+        st.caption(f"🔴 Cache dati: caricamento fallito per {', '.join(failed)} (nuovo tentativo in corso)")
+    else:
+        st.caption("🟡 Cache dati: riscaldamento in corso")
+
 # Variabili
 current_year = st.session_state.selected_year
 past_year = current_year - 1
-current_month_idx = st.session_state.selected_month
-current_month_name = datetime.date(1900, current_month_idx, 1).strftime('%B')
 
 # --- TITOLO PRINCIPALE ---
 st.title(f"📊 Overview: {selected_struct} {current_year}")
@@ -258,9 +169,24 @@ st.title(f"📊 Overview: {selected_struct} {current_year}")
 # --- RECUPERO DATI ---
 from services import forecast_manager
 
-df_curr, info_curr = forecast_manager.get_consolidated_data(selected_struct, current_year, force_italian_date=use_ita)
-df_past, info_past = forecast_manager.get_consolidated_data(selected_struct, past_year, force_italian_date=use_ita)
-df_prev_forecast = get_previous_forecast_data(selected_struct, current_year)
+is_portfolio = selected_struct == portfolio.PORTFOLIO_LABEL
+
+if is_portfolio:
+    # Somme giornaliere di tutte le strutture (caricate in parallelo, un solo groupby)
+    df_curr = portfolio.get_portfolio_daily(current_year)
+    df_past = portfolio.get_portfolio_daily(past_year)
+    info_curr = {'source': 'portfolio'} if not df_curr.empty else None
+    df_prev_forecast = pd.DataFrame()
+else:
+    df_curr, info_curr = forecast_manager.get_consolidated_data(selected_struct, current_year, force_italian_date=use_ita)
+    df_past, info_past = forecast_manager.get_consolidated_data(selected_struct, past_year, force_italian_date=use_ita)
+    # Trend rispetto al forecast precedente: snapshot già in cache (warmup)
+    df_prev_forecast = forecast_manager.get_previous_snapshot(selected_struct, current_year)
+
+def get_monthly(year):
+    if is_portfolio:
+        return portfolio.get_portfolio_monthly(year)
+    return forecast_manager.get_monthly_summary(selected_struct, year)
 
 if not info_curr:
     st.warning(f"⚠️ Nessun dato trovato per il {current_year}")
@@ -287,18 +213,14 @@ st.divider()
 c_dummy_L, c_btn_prev, c_title, c_dummy_R, c_btn_next = st.columns([1, 1, 6, 1, 1], vertical_alignment="center")
 
 with c_btn_prev:
-    if st.button("◀ Prev", key="prev_year"):
-        change_year(-1)
-        st.rerun()
+    st.button("◀ Prev", key="prev_year", on_click=change_year, args=(-1,))
 
 with c_title:
     st.markdown(f"<div class='centered-header'>Panoramica Annuale {current_year}</div>", unsafe_allow_html=True)
     st.markdown(f"<div class='centered-subtext'>Anno di comparazione {past_year}</div>", unsafe_allow_html=True)
 
 with c_btn_next:
-    if st.button("Next ▶", key="next_year"):
-        change_year(1)
-        st.rerun()
+    st.button("Next ▶", key="next_year", on_click=change_year, args=(1,))
 
 st.markdown("<br>", unsafe_allow_html=True) 
 
@@ -311,68 +233,40 @@ render_kpi_card("Occ %", f"{cur_occ:.2f}%", cur_occ - past_occ, "percent", k3)
 render_kpi_card("ADR", f"€ {cur_adr:.2f}", cur_adr - past_adr, "currency", k4)
 render_kpi_card("RevPAR", f"€ {cur_revpar:.2f}", cur_revpar - past_revpar, "currency", k5)
 
-st.divider()
-
-# ==============================================================================
-# 2. FOCUS MESE - KPI CARDS
-# ==============================================================================
-df_curr_m = df_curr[df_curr['date'].dt.month == current_month_idx] if not df_curr.empty else pd.DataFrame()
-df_past_m = df_past[df_past['date'].dt.month == current_month_idx] if not df_past.empty else pd.DataFrame()
-
-mc_dummy_L, mc_btn_prev, mc_title, mc_dummy_R, mc_btn_next = st.columns([1, 1, 6, 1, 1], vertical_alignment="center")
-
-with mc_btn_prev:
-    if st.button("◀ Prev", key="prev_month"):
-        change_month(-1)
-        st.rerun()
-
-with mc_title:
-    st.markdown(f"<div class='centered-header'>Focus Mese: {current_month_name}</div>", unsafe_allow_html=True)
-    st.markdown(f"<div class='centered-subtext'>Anno di comparazione {past_year}</div>", unsafe_allow_html=True)
-
-with mc_btn_next:
-    if st.button("Next ▶", key="next_month"):
-        change_month(1)
-        st.rerun()
-
-st.markdown("<br>", unsafe_allow_html=True)
-
-if not df_curr_m.empty:
-    m_rev, m_sold, m_adr, m_revpar, m_occ = calc_kpi(df_curr_m)
-    p_rev, p_sold, p_adr, p_revpar, p_occ = calc_kpi(df_past_m)
-    
-    # ORDINE: Revenue | Notti | Occ % | ADR | RevPAR
-    m1, m2, m3, m4, m5 = st.columns(5)
-    
-    render_kpi_card("Revenue Mese", f"€ {m_rev:,.0f}", m_rev - p_rev, "currency", m1)
-    render_kpi_card("Notti Mese", f"{int(m_sold)}", m_sold - p_sold, "number", m2)
-    render_kpi_card("Occ %", f"{m_occ:.2f}%", m_occ - p_occ, "percent", m3)
-    render_kpi_card("ADR Mese", f"€ {m_adr:.2f}", m_adr - p_adr, "currency", m4)
-    render_kpi_card("RevPAR Mese", f"€ {m_revpar:.2f}", m_revpar - p_revpar, "currency", m5)
-else:
-    st.info(f"Nessun dato per {current_month_name} {current_year}.")
+# Vista portafoglio: KPI per struttura e consolidato dallo stesso frame
+if is_portfolio:
+    st.markdown("<br>", unsafe_allow_html=True)
+    kpi_struct = portfolio.get_portfolio_kpis(current_year)
+    if not kpi_struct.empty:
+        kpi_struct = kpi_struct[['structure', 'revenue', 'rooms_sold', 'occupancy_pct', 'adr', 'revpar']]
+        kpi_struct.columns = ['Struttura', 'Revenue', 'Notti', 'Occ %', 'ADR', 'RevPAR']
+        st.dataframe(
+            kpi_struct,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Revenue": st.column_config.NumberColumn("Revenue", format="€ %.0f"),
+                "Notti": st.column_config.NumberColumn("Notti", format="%.0f"),
+                "Occ %": st.column_config.NumberColumn("Occ %", format="%.2f%%"),
+                "ADR": st.column_config.NumberColumn("ADR", format="€ %.2f"),
+                "RevPAR": st.column_config.NumberColumn("RevPAR", format="€ %.2f")
+            }
+        )
 
 st.divider()
 
 # ==============================================================================
-# 3. GRIGLIA RIEPILOGO MESI
+# 2. GRIGLIA RIEPILOGO MESI
 # ==============================================================================
 st.subheader("📅 Griglia Riepilogo Mesi")
 
 if not df_curr.empty:
-    df_curr['MeseNum'] = df_curr['date'].dt.month
-    df_curr['Mese'] = df_curr['date'].dt.strftime('%B')
-    monthly = df_curr.groupby(['MeseNum', 'Mese']).agg({
-        'revenue':'sum', 'rooms_sold':'sum', 'rooms':'sum'
-    }).reset_index()
-    
-    monthly['ADR'] = monthly.apply(lambda x: x['revenue']/x['rooms_sold'] if x['rooms_sold']>0 else 0, axis=1)
-    monthly['Occ %'] = monthly.apply(lambda x: x['rooms_sold']/x['rooms'] *100 if x['rooms']>0 else 0, axis=1)
-    monthly['RevPAR'] = monthly.apply(lambda x: x['revenue']/x['rooms'] if x['rooms']>0 else 0, axis=1)
+    # Totali mensili dal rollup dell'ultimo snapshot (KPI mensili già calcolati)
+    monthly = get_monthly(current_year)
+    monthly = monthly.rename(columns={'adr': 'ADR', 'occupancy_pct': 'Occ %', 'revpar': 'RevPAR'})
 
     if not df_prev_forecast.empty:
-        df_prev_forecast['MeseNum'] = df_prev_forecast['date'].dt.month
-        monthly_prev_fc = df_prev_forecast.groupby('MeseNum').agg({'revenue': 'sum'}).reset_index()
+        monthly_prev_fc = df_prev_forecast.groupby(df_prev_forecast['date'].dt.month.rename('MeseNum')).agg({'revenue': 'sum'}).reset_index()
         monthly_prev_fc.columns = ['MeseNum', 'Trend Prev']
         monthly_prev_fc['Trend Prev'] = pd.to_numeric(monthly_prev_fc['Trend Prev'], errors='coerce').fillna(0)
         monthly = pd.merge(monthly, monthly_prev_fc[['MeseNum', 'Trend Prev']], on='MeseNum', how='left')
@@ -381,14 +275,8 @@ if not df_curr.empty:
         monthly['Trend Prev'] = 0
 
     if not df_past.empty:
-        df_past['MeseNum'] = df_past['date'].dt.month
-        monthly_past = df_past.groupby('MeseNum').agg({
-            'revenue': 'sum', 'rooms_sold': 'sum', 'rooms': 'sum'
-        }).reset_index()
-        monthly_past.columns = ['MeseNum', 'Revenue LY', 'sold_ly', 'rooms_ly']
-        
-        monthly_past['adr_ly'] = monthly_past.apply(lambda x: x['Revenue LY'] / x['sold_ly'] if x['sold_ly'] > 0 else 0, axis=1)
-        monthly_past['occ_ly'] = monthly_past.apply(lambda x: x['sold_ly'] / x['rooms_ly'] * 100 if x['rooms_ly'] > 0 else 0, axis=1)
+        monthly_past = get_monthly(past_year)[['MeseNum', 'revenue', 'adr', 'occupancy_pct']]
+        monthly_past.columns = ['MeseNum', 'Revenue LY', 'adr_ly', 'occ_ly']
         
         monthly = pd.merge(monthly, monthly_past[['MeseNum', 'Revenue LY', 'adr_ly', 'occ_ly']], on='MeseNum', how='left')
         monthly['Revenue LY'] = monthly['Revenue LY'].fillna(0)
@@ -412,56 +300,82 @@ if not df_curr.empty:
     
     height_monthly = (len(monthly_display) + 1) * 35 + 3
     
-    def color_delta(val):
-        color = '#28a745' if val >= 0 else '#dc3545'
-        return f'color: {color}; font-weight: bold;'
-
-    col_config = {
-        "Revenue": st.column_config.NumberColumn("Revenue", format="€ %.0f"),
-        "Trend Prev": st.column_config.NumberColumn("Trend Prev", format="€ %.0f"),
-        "Revenue LY": st.column_config.NumberColumn("Revenue LY", format="€ %.0f"),
-        "Vs Prev Year": st.column_config.NumberColumn("Vs Prev Year", format="%+.0f €"),
-        "Rooms Sold": st.column_config.NumberColumn("Rooms Sold", format="%.0f"),
-        "Occ %": st.column_config.NumberColumn("Occ %", format="%.2f%%"),
-        "Delta Occ %": st.column_config.NumberColumn("Delta Occ %", format="%+.2f pp"),
-        "ADR": st.column_config.NumberColumn("ADR", format="€ %.2f"),
-        "Delta ADR": st.column_config.NumberColumn("Delta ADR", format="%+.2f €"),
-        "RevPAR": st.column_config.NumberColumn("RevPAR", format="€ %.2f")
-    }
+    # Etichette e formati condivisi con gli export (services/reports.py)
+    col_config = spec_column_config(MONTHLY_GRID_COLUMNS, monthly_display)
 
-    styled_df = monthly_display.style\
-        .background_gradient(cmap="Blues", subset=['Revenue'])\
-        .map(color_delta, subset=['Vs Prev Year'])\
-        .map(color_delta, subset=['Delta Occ %'])\
-        .map(color_delta, subset=['Delta ADR'])\
-        .format({
-            "Revenue": "€ {:,.0f}", "Trend Prev": "€ {:,.0f}", "Revenue LY": "€ {:,.0f}",
-            "Vs Prev Year": "{:+,.0f} €", "Rooms Sold": "{:.0f}", "Occ %": "{:.2f}%",
-            "Delta Occ %": "{:+.2f} pp", "ADR": "€ {:.2f}", "Delta ADR": "{:+.2f} €", "RevPAR": "€ {:.2f}"
-        })
-
-    st.dataframe(styled_df, use_container_width=True, column_config=col_config, height=height_monthly)
+    render_grid(monthly_display, column_config=col_config, height=height_monthly,
+                gradients={'Revenue': 'Blues'}, deltas=['Vs Prev Year', 'Delta Occ %', 'Delta ADR'])
+    render_export(monthly_display, MONTHLY_GRID_COLUMNS, f"griglia_mesi_{selected_struct}_{current_year}",
+                  key='export_grid', title="Griglia Mesi")
 
 st.divider()
 
 # ==============================================================================
-# 4. DETTAGLIO GIORNALIERO
+# 3. FOCUS MESE E DETTAGLIO GIORNALIERO
 # ==============================================================================
-st.subheader(f"Dettaglio Giornaliero ({current_month_name})")
+# Fragment: i pulsanti del mese rieseguono solo questa sezione (niente caricamento
+# dati, card annuali o griglia). I mesi di ogni riga si calcolano una volta per
+# run completo, nel fragment resta un filtro su interi.
+mesi_curr = calendar_columns(df_curr['date'], ['month'])['month'].to_numpy() if not df_curr.empty else None
+mesi_past = calendar_columns(df_past['date'], ['month'])['month'].to_numpy() if not df_past.empty else None
+
+
+@st.fragment
+def sezione_mese():
+    current_month_idx = st.session_state.selected_month
+    current_month_name = MESI_IT[current_month_idx - 1]
+    df_curr_m = df_curr[mesi_curr == current_month_idx] if not df_curr.empty else pd.DataFrame()
+    df_past_m = df_past[mesi_past == current_month_idx] if not df_past.empty else pd.DataFrame()
 
-if not df_curr_m.empty:
-    daily = df_curr_m[['date', 'revenue', 'rooms_sold', 'adr', 'revpar', 'occupancy_pct']].copy()
-    daily['Data'] = daily['date'].dt.strftime('%d/%m %a')
-    daily = daily.set_index('Data')
+    mc_dummy_L, mc_btn_prev, mc_title, mc_dummy_R, mc_btn_next = st.columns([1, 1, 6, 1, 1], vertical_alignment="center")
+
+    with mc_btn_prev:
+        st.button("◀ Prev", key="prev_month", on_click=change_month, args=(-1,))
+
+    with mc_title:
+        st.markdown(f"<div class='centered-header'>Focus Mese: {current_month_name}</div>", unsafe_allow_html=True)
+        st.markdown(f"<div class='centered-subtext'>Anno di comparazione {past_year}</div>", unsafe_allow_html=True)
+
+    with mc_btn_next:
+        st.button("Next ▶", key="next_month", on_click=change_month, args=(1,))
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    if not df_curr_m.empty:
+        m_rev, m_sold, m_adr, m_revpar, m_occ = calc_kpi(df_curr_m)
+        p_rev, p_sold, p_adr, p_revpar, p_occ = calc_kpi(df_past_m)
+    
+        # ORDINE: Revenue | Notti | Occ % | ADR | RevPAR
+        m1, m2, m3, m4, m5 = st.columns(5)
     
-    height_daily = (len(daily) + 1) * 35 + 3
-
-    st.dataframe(
-        daily.style.background_gradient(cmap="Greens", subset=['revenue']),
-        use_container_width=True,
-        column_config={
-            "revenue": st.column_config.NumberColumn("Revenue", format="€ %.0f"),
-            "occupancy_pct": st.column_config.NumberColumn("Occ %", format="%.2f%%")
-        },
-        height=height_daily
-    )
\ No newline at end of file
+        render_kpi_card("Revenue Mese", f"€ {m_rev:,.0f}", m_rev - p_rev, "currency", m1)
+        render_kpi_card("Notti Mese", f"{int(m_sold)}", m_sold - p_sold, "number", m2)
+        render_kpi_card("Occ %", f"{m_occ:.2f}%", m_occ - p_occ, "percent", m3)
+        render_kpi_card("ADR Mese", f"€ {m_adr:.2f}", m_adr - p_adr, "currency", m4)
+        render_kpi_card("RevPAR Mese", f"€ {m_revpar:.2f}", m_revpar - p_revpar, "currency", m5)
+    else:
+        st.info(f"Nessun dato per {current_month_name} {current_year}.")
+
+    st.divider()
+
+    st.subheader(f"Dettaglio Giornaliero ({current_month_name})")
+
+    if not df_curr_m.empty:
+        daily = df_curr_m[['date', 'revenue', 'rooms_sold', 'adr', 'revpar', 'occupancy_pct']].copy()
+        daily['Data'] = calendar_columns(daily['date'], ['label_giorno'])['label_giorno']
+        daily = daily.set_index('Data')
+    
+        height_daily = (len(daily) + 1) * 35 + 3
+
+        render_grid(
+            daily,
+            gradients={'revenue': 'Greens'},
+            column_config=spec_column_config(DAILY_DETAIL_COLUMNS, daily),
+            height=height_daily
+        )
+        render_export(daily.reset_index(), DAILY_DETAIL_COLUMNS,
+                      f"dettaglio_{selected_struct}_{current_year}_{current_month_idx:02d}",
+                      key='export_daily', title="Dettaglio Giornaliero")
+
+
+sezione_mese()
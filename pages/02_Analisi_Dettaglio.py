@@ -3,6 +3,10 @@ import pandas as pd
 import altair as alt
 import datetime
 from services import forecast_manager
+from services.kpi_engine import add_kpi_ratios
+from services.calendar_dim import GIORNI_IT, LY_MODE_LABELS, MESI_IT, calendar_columns, gather_ly
+from ui.charts import downsample_bars, downsample_line
+from ui.components import render_grid
 
 # Configurazione Pagina
 st.set_page_config(page_title="Analisi Dettaglio", layout="wide", initial_sidebar_state="collapsed")
@@ -49,38 +53,50 @@ if df.empty:
     st.error(f"Nessun dato trovato per {selected_struct} nel {selected_year}.")
     st.stop()
 
-# Colonne ausiliarie
-df['GiornoSettimana'] = df['date'].dt.day_name()
-df['GiornoIdx'] = df['date'].dt.dayofweek
-giorni_it = {
-    'Monday': 'Lunedì', 'Tuesday': 'Martedì', 'Wednesday': 'Mercoledì', 
-    'Thursday': 'Giovedì', 'Friday': 'Venerdì', 'Saturday': 'Sabato', 'Sunday': 'Domenica'
-}
-df['GiornoLabel'] = df['GiornoSettimana'].map(giorni_it)
+# Ogni sezione con controlli propri è un fragment: un filtro riesegue solo la
+# sezione che lo contiene, non il caricamento dati né il resto della pagina.
+
+# Mese dalla dimensione calendario (intero): il filtro confronta numeri, non stringhe
+mese_num = calendar_columns(df['date'], ['month'])['month'].to_numpy()
+opzioni_mesi = [0] + sorted(set(mese_num.tolist()))
+
+
+def formato_mese(m):
+    return "Tutto l'anno" if m == 0 else MESI_IT[m - 1]
+
 
 # --- SEZIONE 1: TREND ANNUALE ---
-st.header("1️⃣ Trend Revenue & ADR")
-st.caption("Barre Blu = Revenue | Linea Rossa = ADR")
-
-mesi_disponibili = df['date'].dt.strftime('%B').unique()
-opzioni_mesi = ["Tutto l'anno"] + list(mesi_disponibili)
-filtro_mese = st.selectbox("🔎 Filtra Periodo:", opzioni_mesi)
-
-df_chart = df.copy()
-if filtro_mese != "Tutto l'anno":
-    df_chart = df[df['date'].dt.strftime('%B') == filtro_mese]
-
-base = alt.Chart(df_chart).encode(x=alt.X('date:T', axis=alt.Axis(format='%d/%m', title='Data')))
-bar = base.mark_bar(color='#4c78a8', opacity=0.8).encode(
-    y=alt.Y('revenue:Q', axis=alt.Axis(title='Revenue (€)', titleColor='#4c78a8')),
-    tooltip=['date', 'revenue', 'rooms_sold', 'adr']
-)
-line = base.mark_line(color='#d62728', strokeWidth=3).encode(
-    y=alt.Y('adr:Q', axis=alt.Axis(title='ADR (€)', titleColor='#d62728')),
-    tooltip=['date', 'adr']
-)
-chart = alt.layer(bar, line).resolve_scale(y='independent').properties(height=350).interactive()
-st.altair_chart(chart, use_container_width=True)
+@st.fragment
+def sezione_trend():
+    st.header("1️⃣ Trend Revenue & ADR")
+    st.caption("Barre Blu = Revenue | Linea Rossa = ADR")
+
+    filtro_mese = st.selectbox("🔎 Filtra Periodo:", opzioni_mesi, format_func=formato_mese, key='filtro_mese_trend')
+
+    df_chart = df
+    if filtro_mese != 0:
+        df_chart = df[mese_num == filtro_mese]
+
+    # Punti ridotti lato server: barre = picco per gruppo di giorni, linea ADR = LTTB
+    df_bars = downsample_bars(df_chart[['date', 'revenue', 'rooms_sold', 'adr']], 'date', ['revenue'])
+    df_line = downsample_line(df_chart[['date', 'adr']], 'date', 'adr')
+    x_date = alt.X('date:T', axis=alt.Axis(format='%d/%m', title='Data'))
+
+    bar = alt.Chart(df_bars).mark_bar(color='#4c78a8', opacity=0.8).encode(
+        x=x_date,
+        y=alt.Y('revenue:Q', axis=alt.Axis(title='Revenue (€)', titleColor='#4c78a8')),
+        tooltip=['date', 'revenue', 'rooms_sold', 'adr']
+    )
+    line = alt.Chart(df_line).mark_line(color='#d62728', strokeWidth=3).encode(
+        x=x_date,
+        y=alt.Y('adr:Q', axis=alt.Axis(title='ADR (€)', titleColor='#d62728')),
+        tooltip=['date', 'adr']
+    )
+    chart = alt.layer(bar, line).resolve_scale(y='independent').properties(height=350).interactive()
+    st.altair_chart(chart, use_container_width=True)
+
+
+sezione_trend()
 
 st.divider()
 
@@ -88,15 +104,16 @@ st.divider()
 st.header("2️⃣ Performance Settimanale")
 st.caption("Confronto medio per giorno della settimana.")
 
-dow_stats = df.groupby(['GiornoIdx', 'GiornoLabel']).agg({
-    'revenue': 'mean', 'adr': 'mean', 'occupancy_pct': 'mean'
-}).reset_index().sort_values('GiornoIdx')
+# Dal rollup settimanale dell'ultimo snapshot: ADR e occupazione pesati (revenue/camere vendute, vendute/disponibili)
+dow_stats = forecast_manager.get_weekday_summary(selected_struct, selected_year)
+dow_stats['GiornoLabel'] = [GIORNI_IT[i] for i in dow_stats['GiornoIdx']]
+dow_stats['revenue'] = dow_stats['revenue'] / dow_stats['days']
 
 c1, c2 = st.columns(2)
 with c1:
     st.subheader("ADR Medio")
     chart_adr = alt.Chart(dow_stats).mark_bar(color='#d62728').encode(
-        x=alt.X('GiornoLabel:N', sort=list(giorni_it.values()), title=None),
+        x=alt.X('GiornoLabel:N', sort=GIORNI_IT, title=None),
         y=alt.Y('adr:Q', title='€'),
         tooltip=['GiornoLabel', alt.Tooltip('adr', format='.2f')]
     ).properties(height=250)
@@ -105,7 +122,7 @@ with c1:
 with c2:
     st.subheader("Occupazione Media")
     chart_occ = alt.Chart(dow_stats).mark_bar(color='#2ca02c').encode(
-        x=alt.X('GiornoLabel:N', sort=list(giorni_it.values()), title=None),
+        x=alt.X('GiornoLabel:N', sort=GIORNI_IT, title=None),
         y=alt.Y('occupancy_pct:Q', title='%'),
         tooltip=['GiornoLabel', alt.Tooltip('occupancy_pct', format='.1f')]
     ).properties(height=250)
@@ -114,75 +131,128 @@ with c2:
 st.divider()
 
 # --- SEZIONE 3: RADAR ANOMALIE (NUOVA VERSIONE VISUALE) ---
-st.header("3️⃣ Gap Analysis: Dove perdo e dove guadagno?")
-st.caption(f"Confronto giorno per giorno rispetto al {past_year}. Le barre rosse indicano giorni dove stai incassando meno dell'anno scorso.")
+@st.fragment
+def sezione_gap():
+    st.header("3️⃣ Gap Analysis: Dove perdo e dove guadagno?")
+    st.caption(f"Confronto giorno per giorno rispetto al {past_year}. Le barre rosse indicano giorni dove stai incassando meno dell'anno scorso.")
 
-if not df_past.empty:
-    # 1. Merge Dati
-    df['key_date'] = df['date'].dt.strftime('%m-%d')
-    df_past['key_date'] = df_past['date'].dt.strftime('%m-%d')
-    
-    df_merge = pd.merge(
-        df[['date', 'key_date', 'revenue', 'adr']],
-        df_past[['key_date', 'revenue', 'adr']],
-        on='key_date',
-        suffixes=('', '_past'),
-        how='inner'
-    )
+    if not df_past.empty:
+        g1, g2 = st.columns([1, 2])
+        with g1:
+            filtro_mese = st.selectbox("🔎 Filtra Periodo:", opzioni_mesi, format_func=formato_mese, key='filtro_mese_gap')
+        with g2:
+            ly_mode = st.radio("Allineamento LY", list(LY_MODE_LABELS), format_func=LY_MODE_LABELS.get,
+                               horizontal=True, key='ly_mode_detail')
+
+        # 1. Valori LY con un gather sull'indice di allineamento (solo i giorni con un gemello LY)
+        df_merge = pd.concat([
+            df[['date', 'revenue', 'adr']].assign(month=mese_num),
+            gather_ly(df, df_past, ['revenue', 'adr'], mode=ly_mode, suffix='_past')
+        ], axis=1).dropna(subset=['revenue_past'])
     
-    # 2. Calcolo Differenza
-    df_merge['Delta_Rev'] = df_merge['revenue'] - df_merge['revenue_past']
+        # 2. Calcolo Differenza
+        df_merge['Delta_Rev'] = df_merge['revenue'] - df_merge['revenue_past']
     
-    # Colore per il grafico: Verde se positivo, Rosso se negativo
-    df_merge['Colore'] = df_merge['Delta_Rev'].apply(lambda x: '#2ca02c' if x >= 0 else '#d62728')
-
-    # Filtro grafico in base alla selezione del mese (se attivo)
-    df_merge_chart = df_merge.copy()
-    if filtro_mese != "Tutto l'anno":
-        df_merge_chart = df_merge[df_merge['date'].dt.strftime('%B') == filtro_mese]
-
-    # 3. GRAFICO GAP (BAR CHART DIVERGENTE)
-    gap_chart = alt.Chart(df_merge_chart).mark_bar().encode(
-        x=alt.X('date:T', axis=alt.Axis(format='%d/%m', title='Data')),
-        y=alt.Y('Delta_Rev:Q', title='Differenza Revenue (€)'),
-        color=alt.Color('Colore:N', scale=None, legend=None),
-        tooltip=[
-            alt.Tooltip('date', title='Data', format='%d/%m/%Y'),
-            alt.Tooltip('revenue', title=f'Rev {selected_year}', format=',.0f'),
-            alt.Tooltip('revenue_past', title=f'Rev {past_year}', format=',.0f'),
-            alt.Tooltip('Delta_Rev', title='Differenza', format='+.0f')
-        ]
-    ).properties(height=300).interactive()
+        # Colore per il grafico: Verde se positivo, Rosso se negativo
+        df_merge['Colore'] = df_merge['Delta_Rev'].apply(lambda x: '#2ca02c' if x >= 0 else '#d62728')
+
+        # Filtro grafico in base alla selezione del mese (se attivo)
+        df_merge_chart = df_merge
+        if filtro_mese != 0:
+            df_merge_chart = df_merge[df_merge['month'] == filtro_mese]
+
+        # 3. GRAFICO GAP (BAR CHART DIVERGENTE)
+        # Una barra per gruppo di giorni: quella con lo scostamento maggiore (in valore assoluto)
+        gap_chart = alt.Chart(downsample_bars(df_merge_chart, 'date', ['Delta_Rev'], how='absmax')).mark_bar().encode(
+            x=alt.X('date:T', axis=alt.Axis(format='%d/%m', title='Data')),
+            y=alt.Y('Delta_Rev:Q', title='Differenza Revenue (€)'),
+            color=alt.Color('Colore:N', scale=None, legend=None),
+            tooltip=[
+                alt.Tooltip('date', title='Data', format='%d/%m/%Y'),
+                alt.Tooltip('revenue', title=f'Rev {selected_year}', format=',.0f'),
+                alt.Tooltip('revenue_past', title=f'Rev {past_year}', format=',.0f'),
+                alt.Tooltip('Delta_Rev', title='Differenza', format='+.0f')
+            ]
+        ).properties(height=300).interactive()
     
-    st.altair_chart(gap_chart, use_container_width=True)
+        st.altair_chart(gap_chart, use_container_width=True)
 
-    # 4. TABELLA DEI "WORST 10" (I GIORNI PEGGIORI)
-    st.subheader("⚠️ Top 10 Giorni Critici (Perdite Maggiori)")
+        # 4. TABELLA DEI "WORST 10" (I GIORNI PEGGIORI)
+        st.subheader("⚠️ Top 10 Giorni Critici (Perdite Maggiori)")
     
-    # Filtriamo solo i giorni negativi e li ordiniamo
-    worst_days = df_merge[df_merge['Delta_Rev'] < 0].sort_values('Delta_Rev', ascending=True).head(10)
+        # Filtriamo solo i giorni negativi e li ordiniamo
+        worst_days = df_merge[df_merge['Delta_Rev'] < 0].sort_values('Delta_Rev', ascending=True).head(10)
     
-    if not worst_days.empty:
-        worst_days_show = worst_days[['date', 'revenue', 'revenue_past', 'Delta_Rev', 'adr', 'adr_past']].copy()
-        worst_days_show['date'] = worst_days_show['date'].dt.strftime('%d/%m/%Y')
+        if not worst_days.empty:
+            worst_days_show = worst_days[['date', 'revenue', 'revenue_past', 'Delta_Rev', 'adr', 'adr_past']].copy()
+            worst_days_show['date'] = calendar_columns(worst_days_show['date'], ['label_data'])['label_data']
         
-        st.dataframe(
-            worst_days_show.style.format({
-                'revenue': '€ {:,.0f}', 'revenue_past': '€ {:,.0f}', 'Delta_Rev': '€ {:,.0f}',
-                'adr': '€ {:.2f}', 'adr_past': '€ {:.2f}'
-            }).background_gradient(cmap='Reds_r', subset=['Delta_Rev']), # Rosso scuro per le perdite alte
-            use_container_width=True,
-            column_config={
-                "date": "Data",
-                "revenue": f"Rev {selected_year}",
-                "revenue_past": f"Rev {past_year}",
-                "Delta_Rev": "Perdita €",
-                "adr": f"ADR {selected_year}",
-                "adr_past": f"ADR {past_year}"
-            }
-        )
+            render_grid(
+                worst_days_show,
+                gradients={'Delta_Rev': 'Reds_r'},  # Rosso scuro per le perdite alte
+                column_config={
+                    "date": "Data",
+                    "revenue": st.column_config.NumberColumn(f"Rev {selected_year}", format="€ %.0f"),
+                    "revenue_past": st.column_config.NumberColumn(f"Rev {past_year}", format="€ %.0f"),
+                    "Delta_Rev": st.column_config.NumberColumn("Perdita €", format="€ %.0f"),
+                    "adr": st.column_config.NumberColumn(f"ADR {selected_year}", format="€ %.2f"),
+                    "adr_past": st.column_config.NumberColumn(f"ADR {past_year}", format="€ %.2f")
+                }
+            )
+        else:
+            st.success(f"Incredibile! Non c'è un solo giorno in cui stai perdendo rispetto al {past_year} nel periodo analizzato.")
+
     else:
-        st.success(f"Incredibile! Non c'è un solo giorno in cui stai perdendo rispetto al {past_year} nel periodo analizzato.")
+        st.warning("Dati storici non sufficienti per calcolare il Gap Analysis.")
+
+
+sezione_gap()
+
+st.divider()
+
+# --- SEZIONE 4: TREND PLURIENNALE ---
+@st.fragment
+def sezione_pluriennale():
+    st.header("4️⃣ Trend Pluriennale")
+    st.caption("Serie giornaliera di più anni caricata in parallelo dalla cache: stagionalità mese per mese e andamento nel tempo.")
+
+    t1, t2 = st.columns([1, 2])
+    with t1:
+        n_anni = st.slider("Anni", min_value=2, max_value=6, value=3)
+    with t2:
+        metriche = {'revpar': 'RevPAR (€)', 'adr': 'ADR (€)', 'occupancy_pct': 'Occupazione (%)'}
+        metrica = st.radio("Metrica", list(metriche), format_func=metriche.get, horizontal=True)
+
+    df_hist = forecast_manager.get_history_span(selected_struct, range(selected_year - n_anni + 1, selected_year + 1))
+
+    if df_hist.empty:
+        st.info("Nessuno storico disponibile per il periodo selezionato.")
+    else:
+        # Stagionalità: KPI mensili ricalcolati dalle somme (anno x mese in un groupby)
+        stag = df_hist.groupby([df_hist['year'], df_hist['date'].dt.month.rename('MeseNum')])[['revenue', 'rooms_sold', 'rooms']].sum(min_count=1)
+        stag = add_kpi_ratios(stag.dropna(subset=['rooms']).reset_index())
+        stag['Mese'] = [MESI_IT[m - 1][:3] for m in stag['MeseNum']]
+        stag['Anno'] = stag['year'].astype(str)
+
+        chart_stag = alt.Chart(stag).mark_line(point=True).encode(
+            x=alt.X('Mese:N', sort=[m[:3] for m in MESI_IT], title=None),
+            y=alt.Y(f'{metrica}:Q', title=metriche[metrica]),
+            color=alt.Color('Anno:N', legend=alt.Legend(orient='top')),
+            tooltip=['Anno', 'Mese', alt.Tooltip(metrica, format='.1f')]
+        ).properties(height=300)
+        st.altair_chart(chart_stag, use_container_width=True)
+
+        # Andamento: media mobile a 28 giorni (somme mobili, poi rapporti), ridotta con LTTB
+        rolling = df_hist[['revenue', 'rooms_sold', 'rooms']].rolling(28, min_periods=14).sum()
+        timeline = add_kpi_ratios(rolling.assign(date=df_hist['date']).dropna(subset=['rooms']))
+        timeline = downsample_line(timeline[['date', metrica]], 'date', metrica)
+
+        chart_timeline = alt.Chart(timeline).mark_line(color='#4c78a8', strokeWidth=2).encode(
+            x=alt.X('date:T', axis=alt.Axis(format='%m/%Y', title=None)),
+            y=alt.Y(f'{metrica}:Q', title=f"{metriche[metrica]} – media mobile 28 gg"),
+            tooltip=[alt.Tooltip('date', format='%d/%m/%Y'), alt.Tooltip(metrica, format='.1f')]
+        ).properties(height=250).interactive()
+        st.altair_chart(chart_timeline, use_container_width=True)
+
 
-else:
-    st.warning("Dati storici non sufficienti per calcolare il Gap Analysis.")
+sezione_pluriennale()
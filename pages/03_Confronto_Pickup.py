@@ -1,9 +1,12 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import altair as alt
 import plotly.express as px
 from services import forecast_manager
+from services.calendar_dim import calendar_columns
+from ui.charts import downsample_bars
+from services.reports import PICKUP_MOVERS_COLUMNS
+from ui.components import render_export, render_grid, spec_column_config
 
 st.set_page_config(page_title="Confronto Pickup", layout="wide", initial_sidebar_state="collapsed")
 
@@ -173,16 +176,13 @@ k5.metric("Var. RevPAR", f"€ {delta_revpar_global:+.2f}")
 
 st.divider()
 
-def color_delta(val):
-    if val == 0: return 'color: inherit; opacity: 0.4'
-    color = '#28a745' if val > 0 else '#dc3545'
-    return f'color: {color}; font-weight: bold;'
-
 # --- SEZIONE 2: GRIGLIA MENSILE ---
 st.subheader("2️⃣ Dettaglio Mensile")
 
-df_pickup['MeseNum'] = df_pickup['date'].dt.month
-df_pickup['Mese'] = df_pickup['date'].dt.strftime('%B')
+# Mese (numero ed etichetta) dalla dimensione calendario
+cal_pickup = calendar_columns(df_pickup['date'], ['month', 'mese'])
+df_pickup['MeseNum'] = cal_pickup['month']
+df_pickup['Mese'] = cal_pickup['mese']
 
 monthly = df_pickup.groupby(['MeseNum', 'Mese']).agg({
     'revenue_curr': 'sum', 'revenue_prev': 'sum',
@@ -195,17 +195,15 @@ monthly['adr_prev'] = monthly['revenue_prev'] / monthly['rooms_sold_prev']
 monthly['delta_adr'] = monthly['adr_curr'] - monthly['adr_prev']
 monthly['delta_adr'] = monthly['delta_adr'].fillna(0) 
 
-st.dataframe(
-    monthly[['Mese', 'pickup_revenue', 'pickup_rooms', 'delta_adr', 'revenue_curr']].style
-    .map(color_delta, subset=['pickup_revenue', 'pickup_rooms', 'delta_adr'])
-    .format({
-        'pickup_revenue': '€ {:+,.0f}', 'pickup_rooms': '{:+,.0f}',
-        'delta_adr': '€ {:+.2f}', 'revenue_curr': '€ {:,.0f}'
-    }),
-    use_container_width=True,
+render_grid(
+    monthly[['Mese', 'pickup_revenue', 'pickup_rooms', 'delta_adr', 'revenue_curr']],
+    deltas=['pickup_revenue', 'pickup_rooms', 'delta_adr'],
+    neutral_zero=True,
     column_config={
-        "pickup_revenue": "Var. Revenue", "pickup_rooms": "Var. Notti",
-        "delta_adr": "Var. ADR", "revenue_curr": "Totale Attuale"
+        "pickup_revenue": st.column_config.NumberColumn("Var. Revenue", format="€ %+.0f"),
+        "pickup_rooms": st.column_config.NumberColumn("Var. Notti", format="%+.0f"),
+        "delta_adr": st.column_config.NumberColumn("Var. ADR", format="€ %+.2f"),
+        "revenue_curr": st.column_config.NumberColumn("Totale Attuale", format="€ %.0f")
     },
     height=(len(monthly) + 1) * 35 + 3
 )
@@ -222,27 +220,21 @@ daily_movers = df_pickup[
 if daily_movers.empty:
     st.info("Nessuna variazione giornaliera rilevata nel periodo selezionato.")
 else:
-    daily_movers['date_str'] = daily_movers['date'].dt.strftime('%d/%m %a')
+    daily_movers['date_str'] = calendar_columns(daily_movers['date'], ['label_giorno'])['label_giorno']
     daily_movers = daily_movers.set_index('date_str')
     
     dynamic_height = (len(daily_movers) + 1) * 35 + 3
     
-    st.dataframe(
-        daily_movers[['pickup_revenue', 'pickup_rooms', 'pickup_adr', 'revenue_curr']].style
-        .map(color_delta, subset=['pickup_revenue', 'pickup_rooms'])
-        .map(color_delta, subset=['pickup_adr'])
-        .background_gradient(cmap='Blues', subset=['revenue_curr'])
-        .format({
-            'pickup_revenue': '€ {:+,.0f}', 'pickup_rooms': '{:+,.0f}',
-            'pickup_adr': '€ {:+.2f}', 'revenue_curr': '€ {:,.0f}'
-        }),
-        use_container_width=True,
-        column_config={
-            "pickup_revenue": "Var. Rev", "pickup_rooms": "Var. Notti",
-            "pickup_adr": "Var. ADR", "revenue_curr": "Totale Attuale"
-        },
+    render_grid(
+        daily_movers[['pickup_revenue', 'pickup_rooms', 'pickup_adr', 'revenue_curr']],
+        deltas=['pickup_revenue', 'pickup_rooms', 'pickup_adr'],
+        neutral_zero=True,
+        gradients={'revenue_curr': 'Blues'},
+        column_config=spec_column_config(PICKUP_MOVERS_COLUMNS),
         height=dynamic_height
     )
+    render_export(daily_movers.rename_axis('Data').reset_index(), PICKUP_MOVERS_COLUMNS,
+                  f"pickup_{selected_struct}_{selected_year}", key='export_pickup', title="Pickup")
 
 st.divider()
 
@@ -274,8 +266,10 @@ st.divider()
 st.subheader("5️⃣ Heatmap Temporale (Revenue)")
 st.markdown("Intensità del pickup nel tempo: **Verde** = Crescita, **Rosso** = Cancellazioni.")
 
+# Una barra per gruppo di giorni (quella con la variazione maggiore): il payload resta
+# proporzionale alla larghezza del grafico, non ai giorni
 fig_heat = px.bar(
-    df_pickup, 
+    downsample_bars(df_pickup[['date', 'pickup_revenue']], 'date', ['pickup_revenue'], how='absmax'), 
     x='date', 
     y='pickup_revenue',
     color='pickup_revenue',
@@ -1,9 +1,10 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import plotly.express as px
 import plotly.graph_objects as go
-from services import forecast_manager
+from services import forecast_manager, rollups
+from services.calendar_dim import LY_MODE_LABELS, MESI_IT_SHORT
+from ui.components import render_grid
 
 st.set_page_config(page_title="Pace Analysis", layout="wide", initial_sidebar_state="collapsed")
 
@@ -16,10 +17,11 @@ with st.sidebar:
     selected_struct = st.selectbox("Struttura", strutture)
     current_year = datetime.datetime.now().year
     target_year = st.sidebar.number_input("Anno Target", min_value=2024, max_value=2030, value=current_year)
+    ly_mode = st.radio("Allineamento LY", list(LY_MODE_LABELS), format_func=LY_MODE_LABELS.get)
 
 # --- CARICAMENTO DATI ---
 with st.spinner("Recupero dati di Pace..."):
-    df_pace, meta, df_raw = forecast_manager.get_pace_data(selected_struct, target_year)
+    df_pace, meta, df_raw = forecast_manager.get_pace_data(selected_struct, target_year, align=ly_mode)
 
 if df_pace.empty:
     st.error("Non è stato possibile recuperare dati per questa struttura/anno.")
@@ -32,15 +34,17 @@ else:
     st.warning(f"⚠️ Pace Parziale: Confronto tra oggi e il primo snapshot disponibile ({meta['date_old'].strftime('%d/%m/%y')})")
 
 # --- ELABORAZIONE MENSILE ---
-df_pace['MeseNum'] = df_pace['date'].dt.month
-df_pace['Mese'] = df_pace['date'].dt.strftime('%b')
-
-monthly_pace = df_pace.groupby(['MeseNum', 'Mese']).agg({
-    'revenue_curr': 'sum',
-    'revenue_ly': 'sum',
-    'rooms_sold_curr': 'sum',
-    'rooms_sold_ly': 'sum'
-}).reset_index().sort_values('MeseNum')
+# Totali mensili dai rollup dei due snapshot (nessun groupby sui dati giornalieri)
+roll_curr = rollups.rollup_frame(forecast_manager.get_structure_rollup(selected_struct, target_year, meta['file_recent']), 'month')
+roll_ly = rollups.rollup_frame(forecast_manager.get_structure_rollup(selected_struct, target_year, meta['file_old']), 'month')
+if roll_ly.empty:
+    roll_ly = pd.DataFrame(columns=['MeseNum', 'revenue', 'rooms_sold'])
+
+monthly_pace = roll_curr[['MeseNum', 'revenue', 'rooms_sold']].merge(
+    roll_ly[['MeseNum', 'revenue', 'rooms_sold']],
+    on='MeseNum', how='left', suffixes=('_curr', '_ly')
+).fillna(0).sort_values('MeseNum')
+monthly_pace.insert(1, 'Mese', [MESI_IT_SHORT[int(m) - 1] for m in monthly_pace['MeseNum']])
 
 # Calcolo Delta
 monthly_pace['Delta Rev'] = monthly_pace['revenue_curr'] - monthly_pace['revenue_ly']
@@ -93,18 +97,18 @@ st.plotly_chart(fig_pace, use_container_width=True)
 # --- SEZIONE 3: TABELLA DETTAGLIO ---
 st.subheader("📋 Dettaglio Numerico per Mese")
 
-def style_delta(val):
-    color = 'green' if val >= 0 else 'red'
-    return f'color: {color}; font-weight: bold;'
-
 # Calcoliamo l'altezza dinamica (35px per riga + testata)
 height_table = (len(monthly_pace) + 1) * 35 + 3
 
-st.dataframe(
-    monthly_pace[['Mese', 'revenue_curr', 'revenue_ly', 'Delta Rev', 'Delta %']].style
-    .format({'revenue_curr': '€ {:,.0f}', 'revenue_ly': '€ {:,.0f}', 'Delta Rev': '€ {:+,.0f}', 'Delta %': '{:+.1f}%'})
-    .map(style_delta, subset=['Delta Rev', 'Delta %']),
-    use_container_width=True,
+render_grid(
+    monthly_pace[['Mese', 'revenue_curr', 'revenue_ly', 'Delta Rev', 'Delta %']],
+    deltas=['Delta Rev', 'Delta %'],
+    column_config={
+        'revenue_curr': st.column_config.NumberColumn('revenue_curr', format='€ %.0f'),
+        'revenue_ly': st.column_config.NumberColumn('revenue_ly', format='€ %.0f'),
+        'Delta Rev': st.column_config.NumberColumn('Delta Rev', format='€ %+.0f'),
+        'Delta %': st.column_config.NumberColumn('Delta %', format='%+.1f%%')
+    },
     height=height_table  # <--- AGGIUNTO QUESTO PER BLOCCARE L'ALTEZZA
 )
 
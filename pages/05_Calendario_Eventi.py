@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import datetime
 import plotly.graph_objects as go
 import ssl
-import holidays # <--- AGGIUNTO
-from services import forecast_manager
+from services import events, forecast_manager
+from services.calendar_dim import LY_MODE_LABELS, MESI_IT, calendar_columns, gather_ly
+from ui.components import render_grid
 
 # --- FIX CERTIFICATI SSL ---
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -13,123 +15,84 @@ st.set_page_config(page_title="Calendario Eventi", layout="wide", initial_sideba
 
 st.title("📅 Strategia Eventi & Confronto Storico")
 
+# --- ANNI DISPONIBILI ---
+# Anni con snapshot in archivio (più l'anno in corso): selezione dell'anno e storico per l'uplift
+anni_disponibili = sorted(set(forecast_manager.get_available_years()) | {forecast_manager.CURRENT_SYSTEM_YEAR})
+
 # --- CARICAMENTO EVENTI (DRIVE + FESTIVITÀ) ---
-@st.cache_data(ttl=300)
-def load_events_enhanced():
-    # 1. Generiamo festività italiane automatiche
-    it_holidays = holidays.Italy(years=[2025, 2026])
-    festivita_list = []
-    for date, name in it_holidays.items():
-        festivita_list.append({
-            'data': pd.to_datetime(date), 
-            'evento': name, 
-            'tipo': 'Festività', 
-            'importanza': 5
-        })
-    df_feste = pd.DataFrame(festivita_list)
-
-    # 2. Carichiamo eventi da Drive
-    try:
-        if "URL_EVENTI" not in st.secrets: 
-            return df_feste
-        url = st.secrets["URL_EVENTI"]
-        df_drive = pd.read_csv(url)
-        df_drive.columns = df_drive.columns.str.strip().str.lower()
-        
-        if 'data' in df_drive.columns:
-            df_drive['data'] = pd.to_datetime(df_drive['data'], dayfirst=True, errors='coerce')
-            df_drive['importanza'] = pd.to_numeric(df_drive['importanza'], errors='coerce').fillna(1)
-            df_drive = df_drive.dropna(subset=['data'])
-            # Uniamo i due calendari (Feste + Drive)
-            return pd.concat([df_feste, df_drive], ignore_index=True)
-        else:
-            return df_feste
-    except:
-        return df_feste
-
-df_eventi = load_events_enhanced()
+# Feed su disco con GET condizionale, festività generate solo per gli anni disponibili
+calendar = events.get_event_calendar(st.secrets.get("URL_EVENTI"), years=anni_disponibili)
 
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("🔧 Filtri")
     strutture = ["Lavagnini My Place", "La Terrazza di Jenny", "B&B Pitti Palace"]
     selected_struct = st.selectbox("Struttura", strutture)
-    current_year = 2026
-    selected_month_idx = st.selectbox("Mese di Analisi", range(1, 13), index=datetime.datetime.now().month - 1, format_func=lambda x: datetime.date(2026, x, 1).strftime('%B'))
+    current_year = st.selectbox("Anno", anni_disponibili, index=anni_disponibili.index(forecast_manager.CURRENT_SYSTEM_YEAR))
+    selected_month_idx = st.selectbox("Mese di Analisi", range(1, 13), index=datetime.datetime.now().month - 1, format_func=lambda x: MESI_IT[x - 1])
+    ly_mode = st.radio("Allineamento LY", list(LY_MODE_LABELS), format_func=LY_MODE_LABELS.get)
 
-# --- CARICAMENTO DATI (Corrente 2026 e Storico 2025) ---
-df_forecast_2026, _ = forecast_manager.get_consolidated_data(selected_struct, 2026)
-df_forecast_2025, _ = forecast_manager.get_consolidated_data(selected_struct, 2025)
+# --- CARICAMENTO DATI (Anno selezionato e Storico LY) ---
+past_year = current_year - 1
+df_forecast_curr, _ = forecast_manager.get_consolidated_data(selected_struct, current_year)
+df_forecast_past, _ = forecast_manager.get_consolidated_data(selected_struct, past_year)
 
-if df_forecast_2026.empty:
-    st.warning("Dati 2026 non disponibili.")
+if df_forecast_curr.empty:
+    st.warning(f"Dati {current_year} non disponibili.")
     st.stop()
 
-# Creiamo il DataFrame principale unendo lo storico
-if not df_forecast_2025.empty:
-    # Allineiamo le date del 2025 su quelle del 2026 per il confronto diretto
-    df_ly = df_forecast_2025[['date', 'occupancy_pct']].copy()
-    df_ly['date_match'] = df_ly['date'] + pd.offsets.DateOffset(years=1)
-    df_ly = df_ly.rename(columns={'occupancy_pct': 'occ_ly'})
-    
-    # Uniamo i dati
-    df_forecast = pd.merge(
-        df_forecast_2026, 
-        df_ly[['date_match', 'occ_ly']], 
-        left_on='date', 
-        right_on='date_match', 
-        how='left'
-    )
-else:
-    df_forecast = df_forecast_2026.copy()
-    df_forecast['occ_ly'] = None
+# Occupazione LY allineata alle date dell'anno con un gather (modalità scelta nella sidebar)
+df_forecast = pd.concat([
+    df_forecast_curr,
+    gather_ly(df_forecast_curr, df_forecast_past, ['occupancy_pct'], mode=ly_mode).rename(columns={'occupancy_pct_ly': 'occ_ly'})
+], axis=1)
 
 # --- 1. GRAFICO ANNUALE CON CONFRONTO STORICO ---
 st.subheader(f"📊 Occupazione Annuale & Calendario Eventi {current_year}")
 
-# Aggreghiamo l'occupazione media mensile per 2026 e 2025
+# Aggreghiamo l'occupazione media mensile per l'anno e per l'anno scorso
 df_year = df_forecast.groupby(df_forecast['date'].dt.month).agg({
     'occupancy_pct': 'mean',
     'occ_ly': 'mean' # Aggiungiamo la media dell'anno scorso
 }).reset_index()
 
-# [Il codice per conteggio_eventi rimane lo stesso di prima...]
-if not df_eventi.empty:
-    eventi_per_mese = df_eventi[df_eventi['data'].dt.year == current_year].copy()
-    eventi_per_mese['mese'] = eventi_per_mese['data'].dt.month
-    conteggio_eventi = eventi_per_mese.groupby('mese').agg({
-        'evento': lambda x: "<br>".join([str(e) for e in list(set(x)) if pd.notna(e)][:3])
-    }).reset_index()
-    df_year = pd.merge(df_year, conteggio_eventi, left_on='date', right_on='mese', how='left').fillna("")
-else:
-    df_year['evento'] = ""
+# Nomi evento per mese: una ricerca sull'indice a intervalli per tutti i giorni dell'anno
+# (gli eventi di più giorni contano in ogni mese che toccano)
+year_days = pd.date_range(f"{current_year}-01-01", f"{current_year}-12-31", freq='D')
+eventi_giorno = calendar.daily(year_days)
+eventi_giorno['mese'] = year_days.month
+conteggio_eventi = eventi_giorno.dropna(subset=['evento']).groupby('mese').agg({
+    'evento': lambda x: "<br>".join(list(dict.fromkeys(n for names in x for n in names.split(" · ")))[:3])
+}).reset_index()
+df_year = pd.merge(df_year, conteggio_eventi, left_on='date', right_on='mese', how='left')
+df_year['evento'] = df_year['evento'].fillna("")
 
 fig_year = go.Figure()
 
-# Barre Occupazione 2026
+# Barre Occupazione anno selezionato
 fig_year.add_trace(go.Bar(
-    x=df_year['date'].apply(lambda x: datetime.date(2026, x, 1).strftime('%B')),
+    x=[MESI_IT[m - 1] for m in df_year['date']],
     y=df_year['occupancy_pct'],
-    marker_color='#1f77b4', name="Occupazione 2026",
-    hovertemplate="Mese: %{x}<br>Occ 2026: %{y:.1f}%"
+    marker_color='#1f77b4', name=f"Occupazione {current_year}",
+    hovertemplate=f"Mese: %{{x}}<br>Occ {current_year}: %{{y:.1f}}%"
 ))
 
-# LINEA Confronto 2025 (LY)
+# LINEA Confronto anno scorso (LY)
 if 'occ_ly' in df_year.columns and not df_year['occ_ly'].isnull().all():
     fig_year.add_trace(go.Scatter(
-        x=df_year['date'].apply(lambda x: datetime.date(2026, x, 1).strftime('%B')),
+        x=[MESI_IT[m - 1] for m in df_year['date']],
         y=df_year['occ_ly'],
         mode='lines+markers',
-        name='Occ 2025 (LY)',
+        name=f'Occ {past_year} (LY)',
         line=dict(color='rgba(150, 150, 150, 0.6)', width=2),
         marker=dict(size=8, symbol='circle', color='rgba(100, 100, 100, 0.8)'),
         hovertemplate="Mese: %{x}<br>Occ LY: %{y:.1f}%"
     ))
 
-# Bandierine Eventi (rimangono come prima)
-if not df_eventi.empty:
+# Bandierine Eventi
+if not calendar.events.empty:
     fig_year.add_trace(go.Scatter(
-        x=df_year['date'].apply(lambda x: datetime.date(2026, x, 1).strftime('%B')),
+        x=[MESI_IT[m - 1] for m in df_year['date']],
         y=df_year['occupancy_pct'] + 7,
         mode="text",
         text=df_year['evento'].apply(lambda x: "🚩" if x != "" else ""),
@@ -149,15 +112,16 @@ st.plotly_chart(fig_year, use_container_width=True)
 st.divider()
 
 # --- 2. GRAFICO MENSILE CON CONFRONTO ---
-df_month = df_forecast[df_forecast['date'].dt.month == selected_month_idx].copy()
-df_month = pd.merge(df_month, df_eventi, left_on='date', right_on='data', how='left')
+df_month = df_forecast[df_forecast['date'].dt.month == selected_month_idx].reset_index(drop=True)
+# Eventi del giorno allineati per posizione (eventi sovrapposti uniti in una riga)
+df_month = pd.concat([df_month, calendar.daily(df_month['date'])[['evento', 'tipo', 'importanza']]], axis=1)
 
-st.subheader(f"📍 Focus Mensile: {datetime.date(2026, selected_month_idx, 1).strftime('%B')}")
+st.subheader(f"📍 Focus Mensile: {MESI_IT[selected_month_idx - 1]}")
 
 fig_month = go.Figure()
 fig_month.add_trace(go.Scatter(
     x=df_month['date'], y=df_month['occupancy_pct'],
-    mode='lines+markers', name='Occupazione 2026',
+    mode='lines+markers', name=f'Occupazione {current_year}',
     line=dict(color='#1f77b4', width=4)
 ))
 
@@ -167,7 +131,7 @@ if 'occ_ly' in df_month.columns and not df_month['occ_ly'].isnull().all():
         x=df_month['date'], 
         y=df_month['occ_ly'],
         mode='lines', 
-        name='Occ % 2025 (LY)',
+        name=f'Occ % {past_year} (LY)',
         line=dict(color='rgba(150, 150, 150, 0.4)', width=2, dash='dot'),
         hovertemplate="Occ LY: %{y:.1f}%"
     ))
@@ -190,33 +154,59 @@ st.plotly_chart(fig_month, use_container_width=True)
 # --- 3. TABELLA DETTAGLIO ---
 st.subheader("📋 Dettaglio Analitico")
 
-def highlight_event_rows(row):
-    if pd.notna(row['evento']) and str(row['evento']).strip() != "":
-        return ['background-color: rgba(255, 165, 0, 0.15)'] * len(row)
-    return [''] * len(row)
-
 df_display = df_month.copy()
-df_display['Giorno'] = df_display['date'].dt.strftime('%d/%m (%a)')
-# --- FIX RILEVANZA (Gestione sicura di NaN e decimali) ---
-def safe_stars(val):
-    try:
-        # Trasforma prima in float per gestire i decimali, poi in int
-        if pd.isna(val): return ""
-        n = int(float(val))
-        return "⭐" * n
-    except:
-        return ""
-
-df_display['Rilevanza'] = df_display['importanza'].apply(safe_stars)
+df_display['Giorno'] = calendar_columns(df_display['date'], ['label_giorno'])['label_giorno']
+# Rilevanza: stelle per livello di importanza (NaN = nessun evento)
+stars = np.array([""] + ["⭐" * n for n in range(1, 11)], dtype=object)
+livello = pd.to_numeric(df_display['importanza'], errors='coerce').fillna(0).clip(0, 10).to_numpy(dtype='int64')
+df_display['Rilevanza'] = stars[livello]
 
 final_cols = ['Giorno', 'occupancy_pct', 'adr', 'revenue', 'evento', 'tipo', 'Rilevanza']
 h_table = (len(df_display) + 1) * 35 + 10
 
-st.dataframe(
-    df_display[final_cols].style
-    .apply(highlight_event_rows, axis=1)
-    .background_gradient(subset=['occupancy_pct'], cmap='Blues')
-    .format({'adr': '€ {:.2f}', 'revenue': '€ {:,.0f}', 'occupancy_pct': '{:.1f}%'}),
-    use_container_width=True,
+has_event = df_display['evento'].fillna("").astype(str).str.strip().to_numpy() != ""
+render_grid(
+    df_display[final_cols],
+    row_css=np.where(has_event, 'background-color: rgba(255, 165, 0, 0.15)', ''),
+    gradients={'occupancy_pct': 'Blues'},
+    column_config={
+        'adr': st.column_config.NumberColumn('adr', format='€ %.2f'),
+        'revenue': st.column_config.NumberColumn('revenue', format='€ %.0f'),
+        'occupancy_pct': st.column_config.NumberColumn('occupancy_pct', format='%.1f%%')
+    },
     height=h_table
-)
\ No newline at end of file
+)
+
+st.divider()
+
+# --- 4. UPLIFT STORICO DEGLI EVENTI ---
+st.subheader("📈 Impatto Storico degli Eventi")
+st.caption(
+    "Giorni con evento contro giorni senza eventi della stessa struttura, anno, stagione e giorno della settimana "
+    f"({anni_disponibili[0]}–{anni_disponibili[-1]}, tutti gli anni con dati, solo date passate)."
+)
+
+only_struct = st.toggle(f"Solo {selected_struct}", value=False)
+df_uplift = events.get_event_uplift(calendar, anni_disponibili, structures=[selected_struct] if only_struct else None)
+
+if df_uplift.empty:
+    st.info("Storico insufficiente per stimare l'impatto degli eventi.")
+else:
+    df_uplift_display = df_uplift[['tipo', 'importanza', 'giorni', 'occ_event', 'occ_base', 'uplift_occ_pts',
+                                   'adr_event', 'adr_base', 'uplift_adr_pct', 'revpar_event', 'uplift_revpar_pct']]
+    render_grid(
+        df_uplift_display,
+        gradients={'uplift_revpar_pct': 'RdYlGn'},
+        column_config={
+            'importanza': st.column_config.NumberColumn('importanza', format='%.0f'),
+            'occ_event': st.column_config.NumberColumn('occ_event', format='%.1f%%'),
+            'occ_base': st.column_config.NumberColumn('occ_base', format='%.1f%%'),
+            'uplift_occ_pts': st.column_config.NumberColumn('uplift_occ_pts', format='%+.1f pt'),
+            'adr_event': st.column_config.NumberColumn('adr_event', format='€ %.2f'),
+            'adr_base': st.column_config.NumberColumn('adr_base', format='€ %.2f'),
+            'uplift_adr_pct': st.column_config.NumberColumn('uplift_adr_pct', format='%+.1f%%'),
+            'revpar_event': st.column_config.NumberColumn('revpar_event', format='€ %.2f'),
+            'uplift_revpar_pct': st.column_config.NumberColumn('uplift_revpar_pct', format='%+.1f%%')
+        },
+        hide_index=True
+    )
@@ -3,7 +3,6 @@ import pandas as pd
 import numpy as np
 import sys
 import os
-from pathlib import Path
 from datetime import datetime
 
 # --- 1. CONFIGURAZIONE PAGINA (Layout Wide obbligatorio) ---
@@ -16,11 +15,23 @@ if root_dir not in sys.path:
 
 try:
     from utils.data_manager import ForecastManager
+    from services import budget_engine, budget_store
+    from ui.components import render_grid
     forecast_manager = ForecastManager()
 except Exception as e:
     st.error(f"⚠️ Errore di connessione: {e}")
     st.stop()
 
+@st.cache_data(ttl=60)
+def load_budget_versions(struttura, anno):
+    """Indice versioni + archivio colonnare (un download per struttura-anno)."""
+    try:
+        versions, official_id = budget_store.list_versions(forecast_manager.s3, forecast_manager.bucket, struttura, anno)
+        store = budget_store.load_store(forecast_manager.s3, forecast_manager.bucket, struttura, anno)
+        return versions, official_id, store
+    except Exception:
+        return pd.DataFrame(), None, pd.DataFrame()
+
 # --- 3. INTERFACCIA TITOLO ---
 st.title("🛠️ Budget Tool")
 st.markdown("Confronta i dati storici del 2025 con i nuovi obiettivi per il **Budget 2026**.")
@@ -37,27 +48,96 @@ df_base, msg = forecast_manager.get_consolidated_data(selected_struct, base_year
 if not df_base.empty:
     # --- 6. PARAMETRI DI CRESCITA TARGET (Globali) ---
     st.subheader("🎛️ Parametri di Crescita Target (Globali)")
+    
+    # Valori iniziali dei parametri scritti una volta in session_state: i widget
+    # sotto non hanno default propri (Streamlit avvisa se entrambi sono impostati)
+    st.session_state.setdefault('mod_occ', 2.0)
+    st.session_state.setdefault('mod_adr', 5.0)
+    for mese in budget_engine.MONTH_LABELS:
+        st.session_state.setdefault(f"occ_{mese}", 0.0)
+        st.session_state.setdefault(f"adr_{mese}", 0.0)
+
+    # Precompilazione dal solver (va scritta prima di creare i widget)
+    prefill = st.session_state.pop('budget_prefill', None)
+    if prefill:
+        st.session_state['mod_occ'] = 0.0
+        st.session_state['mod_adr'] = 0.0
+        for mese, occ_val, adr_val in zip(budget_engine.MONTH_LABELS, prefill['occ'], prefill['adr']):
+            st.session_state[f"occ_{mese}"] = float(occ_val)
+            st.session_state[f"adr_{mese}"] = float(adr_val)
+    
     col1, col2, col3 = st.columns([1, 1, 1])
     
     with col1:
-        mod_occ = st.slider("Incremento OCC % (Default Annuale)", -15.0, 20.0, 2.0)
+        mod_occ = st.slider("Incremento OCC % (Default Annuale)", -15.0, 20.0, key="mod_occ")
     with col2:
-        mod_adr = st.slider("Incremento ADR % (Default Annuale)", -10.0, 40.0, 5.0)
+        mod_adr = st.slider("Incremento ADR % (Default Annuale)", -10.0, 40.0, key="mod_adr")
     with col3:
         # Mapping dinamico unità per precisione calcolo
         n_camere = 5 if "Pitti" not in selected_struct else 10
         st.metric("Unità Gestite", n_camere)
 
+    # --- 6.4. SOLVER: DAL TARGET AGLI INCREMENTI ---
+    with st.expander("🎯 Calcola gli incrementi da un obiettivo di Revenue"):
+        st.markdown("Indica l'obiettivo: il solver trova per ogni mese gli incrementi OCC/ADR "
+                    "più vicini allo storico che lo raggiungono, e precompila la personalizzazione mensile.")
+        base_split = budget_engine.base_monthly_revenue(df_base, n_camere)
+        
+        with st.form("budget_solver", border=False):
+            solver_mode = st.radio("Tipo di obiettivo", ["Annuale", "Per mese"], horizontal=True)
+            annual_goal = st.number_input("Obiettivo Revenue annuale (€)", min_value=0.0,
+                                          value=float(round(base_split.sum() * 1.05, -2)), step=1000.0)
+            monthly_goal = st.data_editor(
+                pd.DataFrame({'Mese': budget_engine.MONTH_LABELS, 'Obiettivo (€)': (base_split * 1.05).round(-1)}),
+                hide_index=True,
+                use_container_width=True,
+                disabled=['Mese'],
+                column_config={"Obiettivo (€)": st.column_config.NumberColumn("Obiettivo (€)", format="€ %.0f", min_value=0)}
+            )
+            b1, b2 = st.columns(2)
+            with b1:
+                occ_bounds = st.slider("Limiti incremento OCC %", -15.0, 20.0, (-15.0, 20.0))
+            with b2:
+                adr_bounds = st.slider("Limiti incremento ADR %", -10.0, 40.0, (-10.0, 40.0))
+            solve = st.form_submit_button("🧮 Calcola e precompila", use_container_width=True)
+        
+        if solve:
+            if solver_mode == "Annuale":
+                goals = budget_engine.split_annual_target(df_base, annual_goal, n_camere)
+            else:
+                goals = monthly_goal['Obiettivo (€)'].to_numpy(dtype='float64')
+            solution = budget_engine.solve_increments(df_base, n_camere, goals, occ_bounds, adr_bounds)
+            st.session_state['budget_prefill'] = {'occ': solution['occ_inc'].tolist(), 'adr': solution['adr_inc'].tolist()}
+            st.session_state['budget_solution'] = (selected_struct, base_year, solution)
+            st.rerun()
+        
+        solved_for = st.session_state.get('budget_solution')
+        if solved_for is not None and solved_for[:2] == (selected_struct, base_year):
+            solution = solved_for[2]
+            if not solution['reachable'].all():
+                st.warning("⚠️ Alcuni mesi non raggiungono l'obiettivo entro i limiti: impostata la combinazione più vicina.")
+            st.dataframe(
+                solution,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "occ_inc": st.column_config.NumberColumn("Incr. OCC %", format="%+.2f%%"),
+                    "adr_inc": st.column_config.NumberColumn("Incr. ADR %", format="%+.2f%%"),
+                    "target": st.column_config.NumberColumn("Obiettivo", format="€ %.0f"),
+                    "revenue": st.column_config.NumberColumn("Revenue Simulata", format="€ %.0f"),
+                    "reachable": st.column_config.CheckboxColumn("Raggiunto")
+                }
+            )
+            st.caption("Incrementi globali impostati a 0: valgono i valori mensili precompilati.")
+
     # --- 6.5. PERSONALIZZAZIONE MENSILE (Taylor-made) ---
-    with st.expander("🎨 Personalizzazione Mensile Target"):
+    # I 24 campi stanno in un form: le modifiche vengono applicate tutte insieme
+    # al click su "Applica", con un solo ricalcolo invece di uno per campo
+    with st.expander("🎨 Personalizzazione Mensile Target"), st.form("monthly_overrides", border=False):
         st.markdown("**Imposta incrementi specifici per mese** (lascia a 0 per usare il valore globale)")
         
         # Lista dei mesi
-        mesi = [
-            '01 - January', '02 - February', '03 - March', '04 - April',
-            '05 - May', '06 - June', '07 - July', '08 - August',
-            '09 - September', '10 - October', '11 - November', '12 - December'
-        ]
+        mesi = budget_engine.MONTH_LABELS
         
         monthly_occ = {}
         monthly_adr = {}
@@ -77,7 +157,6 @@ if not df_base.empty:
                             f"{mese}",
                             min_value=-15.0,
                             max_value=20.0,
-                            value=0.0,
                             step=0.5,
                             key=f"occ_{mese}",
                             help="0 = usa valore globale",
@@ -101,50 +180,22 @@ if not df_base.empty:
                             f"{mese}",
                             min_value=-10.0,
                             max_value=40.0,
-                            value=0.0,
                             step=0.5,
                             key=f"adr_{mese}",
                             help="0 = usa valore globale",
                             label_visibility="visible"
                         )
+        
+        st.form_submit_button("✅ Applica personalizzazioni mensili", use_container_width=True)
 
     # --- 7. MOTORE DI CALCOLO CON LOGICA MENSILE ---
-    df_sim = df_base.copy()
-    df_sim['Mese'] = df_sim['date'].dt.strftime('%m - %B')
-    
-    # Applica incrementi personalizzati per mese
-    def apply_increment(row, metric, default_value, monthly_values):
-        """Applica incremento personalizzato se != 0, altrimenti usa default"""
-        mese = row['Mese']
-        custom_value = monthly_values.get(mese, 0.0)
-        
-        # Se custom_value è 0, usa il default globale
-        increment = custom_value if custom_value != 0.0 else default_value
-        
-        if metric == 'occ':
-            # Calcola il nuovo valore e clippalo tra 0 e 100 usando min/max
-            new_value = row['occupancy_pct'] * (1 + increment/100)
-            return min(max(new_value, 0), 100)
-        elif metric == 'adr':
-            return row['adr'] * (1 + increment/100)
-    
-    df_sim['target_occ'] = df_sim.apply(
-        lambda row: apply_increment(row, 'occ', mod_occ, monthly_occ), axis=1
-    )
-    df_sim['target_adr'] = df_sim.apply(
-        lambda row: apply_increment(row, 'adr', mod_adr, monthly_adr), axis=1
-    )
-    df_sim['target_rev'] = (n_camere * (df_sim['target_occ'] / 100)) * df_sim['target_adr']
+    # Incrementi effettivi per mese (override se != 0, altrimenti globale), applicati in un solo passaggio NumPy
+    occ_increments = budget_engine.resolve_increments(mod_occ, [monthly_occ[m] for m in mesi])
+    adr_increments = budget_engine.resolve_increments(mod_adr, [monthly_adr[m] for m in mesi])
+    df_sim = budget_engine.simulate_budget(df_base, occ_increments, adr_increments, n_camere)
 
     # --- 8. AGGREGAZIONE E CONFRONTO ---
-    budget_mensile = df_sim.groupby('Mese').agg({
-        'occupancy_pct': 'mean', # Storico
-        'target_occ': 'mean',    # Target
-        'adr': 'mean',           # Storico
-        'target_adr': 'mean',    # Target
-        'revenue': 'sum',        # Storico
-        'target_rev': 'sum'      # Target
-    }).reset_index()
+    budget_mensile = budget_engine.monthly_budget(df_sim)
 
     # Calcolo Scostamento assoluto e percentuale
     budget_mensile['Extra Rev'] = budget_mensile['target_rev'] - budget_mensile['revenue']
@@ -160,39 +211,31 @@ if not df_base.empty:
     # --- 9. VISUALIZZAZIONE CON EVIDENZIAZIONE CONDIZIONALE ---
     st.subheader(f"📊 Analisi Comparativa Budget {target_year} vs {base_year}")
     
-    # Funzione di styling condizionale per le righe
-    def highlight_growth(row):
-        growth = row['Growth %']
-        
-        if growth >= 7:
-            color = '#ffcc80'  # Arancione chiaro
-        elif 4 <= growth < 7:
-            color = '#fff9c4'  # Giallo tenue
-        else:
-            color = 'white'    # Standard
-        
-        return ['background-color: {}'.format(color)] * len(row)
+    # Colore di riga per fascia di crescita, calcolato sull'intera colonna
+    growth = budget_mensile['Growth %'].to_numpy(dtype='float64')
+    row_css = np.select(
+        [growth >= 7, growth >= 4],
+        ['background-color: #ffcc80', 'background-color: #fff9c4'],  # Arancione chiaro / Giallo tenue
+        default='background-color: white'
+    )
     
     # Calcola altezza dinamica: 38px per header + 35px per riga
     dynamic_height = 38 + (len(budget_mensile) * 35)
     
-    styled_df = budget_mensile.style.format({
-        'OCC 2025 %': '{:.1f}%', 
-        'Target OCC %': '{:.1f}%',
-        'ADR 2025 (€)': '€ {:.2f}', 
-        'Target ADR (€)': '€ {:.2f}',
-        'Revenue 2025 (€)': '€ {:,.0f}', 
-        'Target Revenue (€)': '€ {:,.0f}',
-        'Extra Rev (€)': '€ {:,.0f}',
-        'Growth %': '{:.1f}%'
-    }).apply(highlight_growth, axis=1).background_gradient(
-        subset=['Extra Rev (€)'], 
-        cmap='Greens'
-    )
-    
-    st.dataframe(
-        styled_df,
-        use_container_width=True,
+    render_grid(
+        budget_mensile,
+        row_css=row_css,
+        gradients={'Extra Rev (€)': 'Greens'},
+        column_config={
+            'OCC 2025 %': st.column_config.NumberColumn('OCC 2025 %', format='%.1f%%'),
+            'Target OCC %': st.column_config.NumberColumn('Target OCC %', format='%.1f%%'),
+            'ADR 2025 (€)': st.column_config.NumberColumn('ADR 2025 (€)', format='€ %.2f'),
+            'Target ADR (€)': st.column_config.NumberColumn('Target ADR (€)', format='€ %.2f'),
+            'Revenue 2025 (€)': st.column_config.NumberColumn('Revenue 2025 (€)', format='€ %.0f'),
+            'Target Revenue (€)': st.column_config.NumberColumn('Target Revenue (€)', format='€ %.0f'),
+            'Extra Rev (€)': st.column_config.NumberColumn('Extra Rev (€)', format='€ %.0f'),
+            'Growth %': st.column_config.NumberColumn('Growth %', format='%.1f%%')
+        },
         height=dynamic_height
     )
     
@@ -263,6 +306,87 @@ if not df_base.empty:
     </div>
     """, unsafe_allow_html=True)
 
+    # --- 9.8. SENSITIVITÀ OCC x ADR (GRIGLIA DI SCENARI) ---
+    st.divider()
+    st.subheader("🗺️ Sensitività: Revenue Target per Incremento OCC e ADR")
+    st.caption("Ogni cella è uno scenario con incrementi globali (senza personalizzazioni mensili). "
+               "Il punto bianco indica la selezione attuale degli slider.")
+    
+    grid_size = 50
+    periodo = st.selectbox("Periodo", ["Anno intero"] + budget_engine.MONTH_LABELS, key="grid_period")
+    grid = budget_engine.scenario_grid(
+        df_base,
+        np.linspace(-15.0, 20.0, grid_size),
+        np.linspace(-10.0, 40.0, grid_size),
+        n_camere
+    )
+    z = grid['annual'] if periodo == "Anno intero" else grid['monthly'][:, :, budget_engine.MONTH_LABELS.index(periodo)]
+    
+    import plotly.graph_objects as go  # import differito al primo grafico
+    fig_grid = go.Figure(go.Heatmap(
+        x=grid['adr_steps'],
+        y=grid['occ_steps'],
+        z=z,
+        colorscale='Greens',
+        colorbar=dict(title='€'),
+        hovertemplate='ADR %{x:+.1f}%<br>OCC %{y:+.1f}%<br>Revenue € %{z:,.0f}<extra></extra>'
+    ))
+    fig_grid.add_trace(go.Scatter(
+        x=[mod_adr], y=[mod_occ], mode='markers',
+        marker=dict(color='white', size=12, line=dict(color='black', width=2)),
+        name='Selezione', hoverinfo='skip'
+    ))
+    fig_grid.update_layout(
+        xaxis_title='Incremento ADR %',
+        yaxis_title='Incremento OCC %',
+        height=500,
+        showlegend=False
+    )
+    st.plotly_chart(fig_grid, use_container_width=True)
+
+    # --- 9.9. RISCHIO BUDGET (MONTE CARLO) ---
+    st.divider()
+    st.subheader("🎲 Rischio Budget: Distribuzione della Revenue")
+    st.caption(f"Shock giornalieri di OCC e ADR estratti dallo storico {base_year} della struttura, "
+               "per mese e giorno della settimana. P10 = scenario prudente, P90 = scenario favorevole.")
+    
+    rc1, rc2 = st.columns([1, 3])
+    with rc1:
+        run_mc = st.toggle("Calcola distribuzione", value=False)
+        n_years = st.selectbox("Anni simulati", [10_000, 100_000], index=0, format_func=lambda n: f"{n:,}")
+    
+    if run_mc:
+        with st.spinner(f"Simulazione di {n_years:,} anni..."):
+            started = datetime.now()
+            mc = budget_engine.monte_carlo_budget(df_sim, df_base, n_camere, n_years=n_years)
+            elapsed = (datetime.now() - started).total_seconds()
+        
+        with rc2:
+            p1, p2, p3, p4 = st.columns(4)
+            p1.metric("🎯 Target", f"€ {tot_2026:,.0f}")
+            p2.metric("P10", f"€ {mc['annual']['P10']:,.0f}", delta=f"{mc['annual']['P10'] - tot_2026:,.0f}")
+            p3.metric("P50", f"€ {mc['annual']['P50']:,.0f}", delta=f"{mc['annual']['P50'] - tot_2026:,.0f}")
+            p4.metric("P90", f"€ {mc['annual']['P90']:,.0f}", delta=f"{mc['annual']['P90'] - tot_2026:,.0f}")
+            prob_hit = float((mc['annual_samples'] >= tot_2026).mean() * 100)
+            st.caption(f"Probabilità di raggiungere il target: **{prob_hit:.1f}%** · calcolo in {elapsed:.1f}s")
+        
+        fig_mc = go.Figure()
+        fig_mc.add_trace(go.Bar(x=mc['monthly']['Mese'], y=mc['monthly']['P90'] - mc['monthly']['P10'],
+                                base=mc['monthly']['P10'], name='P10 - P90', marker_color='rgba(44,160,44,0.3)'))
+        fig_mc.add_trace(go.Scatter(x=mc['monthly']['Mese'], y=mc['monthly']['P50'], mode='lines+markers',
+                                    name='P50', line=dict(color='#2ca02c', width=3)))
+        fig_mc.add_trace(go.Scatter(x=mc['monthly']['Mese'], y=mc['monthly']['Target'], mode='markers',
+                                    name='Target', marker=dict(color='#ff7f0e', size=10, symbol='diamond')))
+        fig_mc.update_layout(height=400, yaxis_title='Revenue (€)', hovermode='x unified')
+        st.plotly_chart(fig_mc, use_container_width=True)
+        
+        st.dataframe(
+            mc['monthly'],
+            use_container_width=True,
+            hide_index=True,
+            column_config={c: st.column_config.NumberColumn(c, format="€ %.0f") for c in ['Target', 'P10', 'P50', 'P90']}
+        )
+
     # --- 10. SALVATAGGIO CON FIX DATE (2026) ---
     st.divider()
     st.subheader("💾 Salva Budget")
@@ -280,6 +404,8 @@ if not df_base.empty:
     else:
         st.info("🧪 Il budget di test è utile per simulazioni e prove senza sovrascrivere il budget ufficiale.")
     
+    version_label = st.text_input("Descrizione versione (opzionale)", placeholder="es. Scenario prudente, ADR +3%")
+    
     st.markdown("<br>", unsafe_allow_html=True)
     
     if st.button("💾 APPROVA E SALVA BUDGET 2026", use_container_width=True, type="primary"):
@@ -299,12 +425,14 @@ if not df_base.empty:
                 df=df_to_save,
                 struttura=selected_struct,
                 anno=target_year,
-                tipo=tipo
+                tipo=tipo,
+                label=version_label
             )
             
             if success:
+                load_budget_versions.clear()
                 st.success(f"✅ {budget_type} salvato con successo!")
-                st.info(f"📁 Percorso: `{info}`")
+                st.info(f"📁 Versione: `{info}`")
                 st.balloons()
             else:
                 st.error(f"❌ Errore nel salvataggio: {info}")
@@ -313,5 +441,57 @@ if not df_base.empty:
             st.error(f"❌ Errore critico durante il salvataggio: {str(e)}")
             st.exception(e)
 
+    # --- 11. VERSIONI BUDGET SALVATE ---
+    st.divider()
+    st.subheader(f"📚 Versioni Budget {target_year}")
+    
+    versions, official_id, store = load_budget_versions(selected_struct, target_year)
+    
+    if versions.empty:
+        st.info("Nessuna versione salvata per questa struttura.")
+    else:
+        versions_view = versions[['id', 'tipo', 'label', 'created_at', 'revenue']].copy()
+        versions_view['tipo'] = np.where(versions_view['id'] == official_id, '⭐ ufficiale', versions_view['tipo'])
+        st.dataframe(
+            versions_view,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "id": "Versione", "tipo": "Tipo", "label": "Descrizione", "created_at": "Creata il",
+                "revenue": st.column_config.NumberColumn("Revenue", format="€ %.0f")
+            }
+        )
+        
+        version_ids = versions['id'].tolist()
+        default_ref = version_ids.index(official_id) if official_id in version_ids else 0
+        v1, v2 = st.columns(2)
+        with v1:
+            version_a = st.selectbox("Versione di riferimento (A)", version_ids, index=default_ref)
+        with v2:
+            version_b = st.selectbox("Versione da confrontare (B)", version_ids, index=0)
+        
+        diff = budget_store.diff_versions(store, version_a, version_b)
+        if not diff.empty:
+            diff.insert(0, 'Mese', [budget_engine.MONTH_LABELS[m - 1] for m in diff['month']])
+            st.dataframe(
+                diff.drop(columns='month'),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "revenue_a": st.column_config.NumberColumn("Revenue A", format="€ %.0f"),
+                    "revenue_b": st.column_config.NumberColumn("Revenue B", format="€ %.0f"),
+                    "delta_rev": st.column_config.NumberColumn("Delta", format="%+.0f €"),
+                    "delta_pct": st.column_config.NumberColumn("Delta %", format="%+.1f%%"),
+                    "delta_occ": st.column_config.NumberColumn("Delta OCC", format="%+.2f pp"),
+                    "delta_adr": st.column_config.NumberColumn("Delta ADR", format="%+.2f €")
+                }
+            )
+        
+        if len(version_ids) > 2:
+            with st.expander("📊 Tutte le versioni rispetto alla versione A"):
+                all_delta = budget_store.compare_versions(store, version_a)
+                all_delta.columns = [c if c == 'Totale' else budget_engine.MONTH_LABELS[int(c) - 1][5:8] for c in all_delta.columns]
+                render_grid(all_delta, column_config={c: st.column_config.NumberColumn(c, format="%+.0f") for c in all_delta.columns})
+
 else:
     st.warning("⚠️ Dati non trovati. Verifica il caricamento della Baseline.")
\ No newline at end of file
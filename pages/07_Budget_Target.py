@@ -2,11 +2,9 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from datetime import datetime
+from plotly.subplots import make_subplots
 import sys
 import os
-from pathlib import Path
-from io import BytesIO
 
 # --- 1. CONFIGURAZIONE PAGINA ---
 st.set_page_config(page_title="Budget Target", layout="wide")
@@ -18,6 +16,11 @@ if root_dir not in sys.path:
 
 try:
     from utils.data_manager import ForecastManager
+    from services import budget_store, rollups
+    from services.calendar_dim import LY_MODE_LABELS, MESI_IT, calendar_columns
+    from services.reports import BUDGET_COMPARISON_COLUMNS
+    from ui.components import render_export, render_grid, spec_column_config
+    from services.forecast_manager import get_rollup, get_rollup_history, get_base_folder, get_structure_folder
     forecast_manager = ForecastManager()
 except Exception as e:
     st.error(f"⚠️ Errore di connessione: {e}")
@@ -121,82 +124,12 @@ target_year = st.sidebar.selectbox("Anno", [2025, 2026], index=1)
 
 st.divider()
 
-# --- 7. FUNZIONE NORMALIZZAZIONE COLONNE (UNIVERSALE) ---
-def normalize_dataframe(df):
-    """
-    Normalizza i nomi delle colonne e garantisce che esistano tutte le colonne necessarie
-    """
-    # Converti tutti i nomi colonne in minuscolo
-    df.columns = [str(c).lower().strip() for c in df.columns]
-    
-    # Mappatura nomi colonne (da vari formati possibili a standard)
-    mappa_nomi = {
-        'data': 'date',
-        'occupate %': 'occupancy_pct',
-        'occupancy %': 'occupancy_pct',
-        'occ %': 'occupancy_pct',
-        'totale revenue': 'revenue',
-        'ricavo': 'revenue',
-        'rev': 'revenue',
-        'adr': 'adr',
-        'occupate': 'rooms_sold',
-        'sold': 'rooms_sold',
-        'notti': 'rooms_sold',
-        'unità': 'rooms',
-        'unita': 'rooms',
-        'capacity': 'rooms',
-        'capacità': 'rooms'
-    }
-    df.rename(columns=mappa_nomi, inplace=True)
-    
-    # Converti date
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = df.dropna(subset=['date'])
-    
-    # Normalizza numeri
-    for col in ['revenue', 'rooms_sold', 'adr', 'occupancy_pct', 'rooms']:
-        if col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].astype(str).str.replace('€', '', regex=False)\
-                               .str.replace('.', '', regex=False)\
-                               .str.replace(',', '.', regex=False)\
-                               .str.strip()
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-    
-    # Fix occupancy se in formato decimale
-    if 'occupancy_pct' in df.columns and df['occupancy_pct'].max() <= 1.0 and df['occupancy_pct'].max() > 0:
-        df['occupancy_pct'] = df['occupancy_pct'] * 100
-    
-    # Calcola rooms se mancante (stima basata su struttura)
-    if 'rooms' not in df.columns or df['rooms'].sum() == 0:
-        n_camere = 5 if "Pitti" not in selected_struct else 10
-        df['rooms'] = n_camere
-    
-    # Calcola rooms_sold se mancante (da occupancy e capacity)
-    if 'rooms_sold' not in df.columns or df['rooms_sold'].sum() == 0:
-        if 'occupancy_pct' in df.columns and 'rooms' in df.columns:
-            df['rooms_sold'] = (df['occupancy_pct'] / 100 * df['rooms']).round()
-    
-    return df
-
-# --- 8. CARICAMENTO BUDGET UFFICIALE ---
+# --- 7-8. CARICAMENTO BUDGET UFFICIALE (parsing condiviso con i report: services/budget_store.py) ---
 def load_budget_official(struttura, anno):
     """Carica il budget ufficiale da S3"""
     try:
-        folder_struct = struttura.replace(" ", "_")
-        key = f"Budgets-Official/{folder_struct}-{anno}/budget_official.csv"
-        
-        file_obj = forecast_manager.s3.get_object(
-            Bucket=forecast_manager.bucket, 
-            Key=key
-        )
-        
-        df = pd.read_csv(BytesIO(file_obj['Body'].read()))
-        df = normalize_dataframe(df)
-        
-        return df, True
-        
+        df = budget_store.load_official_budget(forecast_manager.s3, forecast_manager.bucket, struttura, anno)
+        return df, not df.empty
     except Exception as e:
         return pd.DataFrame(), False
 
@@ -204,57 +137,21 @@ def load_budget_official(struttura, anno):
 # --- 9. CARICAMENTO OTB ---
 def load_otb_forecast(struttura, anno):
     """
-    Carica i forecast OTB dal percorso: Forecast/{Struttura}/{Anno}/
+    OTB dall'ultimo snapshot in Forecast/{Struttura}/{Anno}/, letto come rollup
+    mensile (vedi services/rollups.py): nessun download dei file giornalieri.
     """
     try:
-        folder_struct = struttura.replace(" ", "_")
-        prefix = f"Forecast/{folder_struct}/{anno}/"
-        
-        response = forecast_manager.s3.list_objects_v2(
-            Bucket=forecast_manager.bucket, 
-            Prefix=prefix
-        )
-        
-        if 'Contents' not in response:
-            return pd.DataFrame(), False
-        
-        forecast_files = [
-            obj['Key'] for obj in response['Contents'] 
-            if obj['Key'].lower().endswith(('.csv', '.xlsx'))
-        ]
-        
-        if not forecast_files:
-            return pd.DataFrame(), False
-        
-        all_dfs = []
-        for file_key in forecast_files:
-            file_obj = forecast_manager.s3.get_object(
-                Bucket=forecast_manager.bucket,
-                Key=file_key
-            )
-            body = file_obj['Body'].read()
-            
-            if file_key.lower().endswith('.csv'):
-                df = pd.read_csv(BytesIO(body))
-            else:
-                df = pd.read_excel(BytesIO(body))
-            
-            df = normalize_dataframe(df)
-            all_dfs.append(df)
-        
-        if all_dfs:
-            consolidated = pd.concat(all_dfs).drop_duplicates(subset=['date'])
-            return consolidated, True
-        
-        return pd.DataFrame(), False
-        
+        folder_struct = get_structure_folder(struttura)
+        rollup = get_rollup("Forecast", folder_struct, anno)
+        otb_monthly = rollups.rollup_frame(rollup, 'month')
+        return otb_monthly, not otb_monthly.empty
     except Exception as e:
         return pd.DataFrame(), False
 
 
 # --- 10. CARICAMENTO DATI ---
 df_budget, budget_exists = load_budget_official(selected_struct, target_year)
-df_otb, otb_exists = load_otb_forecast(selected_struct, target_year)
+otb_monthly, otb_exists = load_otb_forecast(selected_struct, target_year)
 
 if not budget_exists:
     st.warning(f"⚠️ Budget Ufficiale non trovato per {selected_struct} ({target_year})")
@@ -285,7 +182,7 @@ def calc_kpi_from_df(df):
 
 # Calcola KPI per Budget e OTB
 budget_rev, budget_sold, budget_adr, budget_revpar, budget_occ = calc_kpi_from_df(df_budget)
-otb_rev, otb_sold, otb_adr, otb_revpar, otb_occ = calc_kpi_from_df(df_otb)
+otb_rev, otb_sold, otb_adr, otb_revpar, otb_occ = calc_kpi_from_df(otb_monthly)
 
 # Calcola Delta
 delta_rev = otb_rev - budget_rev
@@ -312,8 +209,9 @@ st.divider()
 st.subheader("📅 Confronto Mensile: Budget vs OTB")
 
 # Aggrega per mese - BUDGET (con controlli robustezza)
-df_budget['month'] = df_budget['date'].dt.month
-df_budget['month_name'] = df_budget['date'].dt.strftime('%B')
+cal_budget = calendar_columns(df_budget['date'], ['month', 'mese'])
+df_budget['month'] = cal_budget['month'].astype('int64')
+df_budget['month_name'] = cal_budget['mese']
 
 # Verifica colonne disponibili
 budget_agg_cols = {'revenue': 'sum'}
@@ -338,28 +236,9 @@ else:
 budget_monthly = budget_monthly[['month', 'month_name', 'revenue', 'adr_budget', 'occ_budget']]
 budget_monthly.columns = ['month', 'month_name', 'budget', 'adr_budget', 'occ_budget']
 
-# Aggrega per mese - OTB
-df_otb['month'] = df_otb['date'].dt.month
-df_otb['month_name'] = df_otb['date'].dt.strftime('%B')
-
-otb_agg_cols = {'revenue': 'sum'}
-if 'rooms_sold' in df_otb.columns:
-    otb_agg_cols['rooms_sold'] = 'sum'
-if 'rooms' in df_otb.columns:
-    otb_agg_cols['rooms'] = 'sum'
-
-otb_monthly = df_otb.groupby(['month', 'month_name']).agg(otb_agg_cols).reset_index()
-
-# Calcola ADR e Occ
-if 'rooms_sold' in otb_monthly.columns:
-    otb_monthly['adr_otb'] = otb_monthly['revenue'] / otb_monthly['rooms_sold']
-else:
-    otb_monthly['adr_otb'] = 0
-
-if 'rooms' in otb_monthly.columns and 'rooms_sold' in otb_monthly.columns:
-    otb_monthly['occ_otb'] = (otb_monthly['rooms_sold'] / otb_monthly['rooms'] * 100)
-else:
-    otb_monthly['occ_otb'] = 0
+# Mensile OTB (già aggregato nel rollup)
+otb_monthly = otb_monthly.rename(columns={'MeseNum': 'month', 'adr': 'adr_otb', 'occupancy_pct': 'occ_otb'})
+otb_monthly['month_name'] = [MESI_IT[m - 1] for m in otb_monthly['month']]
 
 otb_monthly = otb_monthly[['month', 'month_name', 'revenue', 'adr_otb', 'occ_otb']]
 otb_monthly.columns = ['month', 'month_name', 'otb', 'adr_otb', 'occ_otb']
@@ -367,7 +246,7 @@ otb_monthly.columns = ['month', 'month_name', 'otb', 'adr_otb', 'occ_otb']
 # Crea DataFrame con tutti i 12 mesi
 all_months = pd.DataFrame({
     'month': range(1, 13),
-    'month_name': [datetime(2000, m, 1).strftime('%B') for m in range(1, 13)]
+    'month_name': MESI_IT
 })
 
 # Merge
@@ -428,55 +307,110 @@ st.subheader("📋 Dettaglio Mensile")
 detail_table = comparison[['month_name', 'budget', 'otb', 'delta_rev', 'delta_adr', 'delta_occ', 'copertura_pct']].copy()
 detail_table.columns = ['Mese', 'Target Budget (€)', 'OTB Reale (€)', 'Delta Rev (€)', 'Delta ADR', 'Delta Occ %', '% Copertura']
 
-def color_delta(val):
-    color = '#28a745' if val >= 0 else '#dc3545'
-    return f'color: {color}; font-weight: bold;'
-
-def color_copertura(val):
-    if val >= 100:
-        return 'background-color: #d4edda; color: #155724; font-weight: bold;'
-    elif val >= 90:
-        return 'background-color: #fff3cd; color: #856404;'
-    else:
-        return 'background-color: #f8d7da; color: #721c24;'
+# Fasce di copertura (>= 100 verde, 90-99 giallo, sotto rosso) per tutta la colonna in una volta
+copertura = detail_table['% Copertura'].to_numpy(dtype='float64')
+copertura_css = np.select(
+    [copertura >= 100, copertura >= 90],
+    ['background-color: #d4edda; color: #155724; font-weight: bold;', 'background-color: #fff3cd; color: #856404;'],
+    default='background-color: #f8d7da; color: #721c24;'
+)
 
 dynamic_height = 38 + (12 * 35)
 
-styled_table = detail_table.style\
-    .format({
-        'Target Budget (€)': '€ {:,.0f}',
-        'OTB Reale (€)': '€ {:,.0f}',
-        'Delta Rev (€)': '{:+,.0f} €',
-        'Delta ADR': '{:+.2f} €',
-        'Delta Occ %': '{:+.2f} pp',
-        '% Copertura': '{:.1f}%'
-    })\
-    .map(color_delta, subset=['Delta Rev (€)'])\
-    .map(color_delta, subset=['Delta ADR'])\
-    .map(color_delta, subset=['Delta Occ %'])\
-    .map(color_copertura, subset=['% Copertura'])\
-    .background_gradient(cmap='Blues', subset=['Target Budget (€)'])\
-    .background_gradient(cmap='Greens', subset=['OTB Reale (€)'])
-
-st.dataframe(
-    styled_table,
-    use_container_width=True,
+render_grid(
+    detail_table,
+    deltas=['Delta Rev (€)', 'Delta ADR', 'Delta Occ %'],
+    gradients={'Target Budget (€)': 'Blues', 'OTB Reale (€)': 'Greens'},
+    cell_css={'% Copertura': copertura_css},
     height=dynamic_height,
     column_config={
-        'Mese': st.column_config.TextColumn('Mese', width='medium'),
-        'Target Budget (€)': st.column_config.NumberColumn('Target Budget', format='€ %.0f'),
-        'OTB Reale (€)': st.column_config.NumberColumn('OTB Reale', format='€ %.0f'),
-        'Delta Rev (€)': st.column_config.NumberColumn('Delta Rev', format='%+.0f €'),
-        'Delta ADR': st.column_config.NumberColumn('Delta ADR', format='%+.2f €'),
-        'Delta Occ %': st.column_config.NumberColumn('Delta Occ %', format='%+.2f pp'),
-        '% Copertura': st.column_config.NumberColumn('% Copertura', format='%.1f%%')
+        **spec_column_config(BUDGET_COMPARISON_COLUMNS, detail_table),
+        'Mese': st.column_config.TextColumn('Mese', width='medium')
     }
 )
+render_export(detail_table, BUDGET_COMPARISON_COLUMNS, f"budget_{selected_struct}_{target_year}",
+              key='export_budget', title="Budget vs OTB")
 
 st.caption("🟢 **Verde**: Superato il budget | 🟡 **Giallo**: Raggiunto 90-99% | 🔴 **Rosso**: Sotto il 90%")
 
 st.divider()
 
+# --- 15.5. CURVA DI COPERTURA BUDGET ---
+def coverage_for(struttura, anno, budget, align):
+    """Copertura % per snapshot e mese, con l'anno scorso alla stessa distanza dal mese."""
+    folder_struct = get_structure_folder(struttura)
+    history = get_rollup_history("Forecast", folder_struct, anno)
+    history_ly = get_rollup_history("Forecast", folder_struct, anno - 1)
+    final_ly_rollup = get_rollup(get_base_folder(anno - 1), folder_struct, anno - 1)
+    final_ly = np.asarray(final_ly_rollup['month']['revenue']) if final_ly_rollup else None
+    return rollups.coverage_curve(history, budget, anno, history_ly, final_ly, align=align)
+
+
+@st.cache_data(ttl=300)
+def budget_by_month(struttura, anno):
+    """Revenue a budget per mese (12 valori) dal budget ufficiale."""
+    df, exists = load_budget_official(struttura, anno)
+    if not exists or df.empty:
+        return None
+    return np.bincount(df['date'].dt.month.to_numpy() - 1, weights=df['revenue'].to_numpy(dtype='float64'), minlength=12)
+
+
+st.subheader("📈 Curva di Copertura Budget")
+st.caption("Copertura del budget (OTB / Budget) a ogni snapshot caricato. "
+           "Tratteggiato: l'anno scorso alla stessa distanza dal mese (OTB LY / consuntivo LY).")
+
+ly_mode = st.radio("Allineamento snapshot LY", list(LY_MODE_LABELS), format_func=LY_MODE_LABELS.get, horizontal=True)
+month_names = MESI_IT
+curve = coverage_for(selected_struct, target_year, comparison.sort_values('month')['budget'].to_numpy(), ly_mode)
+missing_rollups = get_rollup_history("Forecast", get_structure_folder(selected_struct), target_year)['missing']
+if missing_rollups:
+    st.caption(f"ℹ️ {missing_rollups} snapshot senza rollup archiviato non compaiono nella curva: "
+               "ricostruiscili da **99 - Ispettore** (🧮 Ricostruisci rollup della cartella).")
+
+if curve.empty:
+    st.info("Nessuno snapshot datato disponibile per costruire la curva.")
+else:
+    fig_cov = make_subplots(rows=3, cols=4, subplot_titles=month_names, shared_yaxes=True,
+                            vertical_spacing=0.08, horizontal_spacing=0.03)
+    for m in range(1, 13):
+        cm = curve[curve['month'] == m]
+        row, col = (m - 1) // 4 + 1, (m - 1) % 4 + 1
+        fig_cov.add_trace(go.Scatter(x=cm['snapshot_date'], y=cm['coverage'], mode='lines+markers',
+                                     line=dict(color='#2ca02c', width=2), marker=dict(size=4),
+                                     name=str(target_year), legendgroup='cy', showlegend=(m == 1)), row=row, col=col)
+        fig_cov.add_trace(go.Scatter(x=cm['snapshot_date'], y=cm['coverage_ly'], mode='lines',
+                                     line=dict(color='#7f7f7f', width=2, dash='dash'),
+                                     name=f"{target_year - 1} (stesso anticipo)", legendgroup='ly', showlegend=(m == 1)), row=row, col=col)
+        fig_cov.add_hline(y=100, line=dict(color='#ff7f0e', width=1, dash='dot'), row=row, col=col)
+    fig_cov.update_layout(height=700, hovermode='x unified', legend=dict(orientation='h', y=1.08))
+    fig_cov.update_yaxes(ticksuffix='%')
+    st.plotly_chart(fig_cov, use_container_width=True)
+
+with st.expander("🏨 Copertura attuale di tutte le strutture"):
+    rows = []
+    for struttura in strutture_options:
+        budget_struct = budget_by_month(struttura, target_year)
+        if budget_struct is None:
+            continue
+        curve_struct = coverage_for(struttura, target_year, budget_struct, ly_mode)
+        if curve_struct.empty:
+            continue
+        last = curve_struct[curve_struct['snapshot_date'] == curve_struct['snapshot_date'].max()].sort_values('month')
+        rows.append({'Struttura': struttura, 'Misura': 'Copertura %', **dict(zip(month_names, last['coverage']))})
+        rows.append({'Struttura': struttura, 'Misura': 'vs LY (pp)', **dict(zip(month_names, last['coverage'] - last['coverage_ly']))})
+    if rows:
+        st.dataframe(
+            pd.DataFrame(rows),
+            hide_index=True,
+            use_container_width=True,
+            column_config={m: st.column_config.NumberColumn(m[:3], format="%.0f") for m in month_names}
+        )
+        st.caption("Ultimo snapshot di ogni struttura. 'vs LY' = differenza in punti rispetto all'anno scorso allo stesso anticipo.")
+    else:
+        st.info("Nessuna struttura con budget ufficiale e snapshot disponibili.")
+
+st.divider()
+
 # --- 16. ANALISI AVANZATA ---
 with st.expander("📊 Analisi Avanzata"):
     col_a1, col_a2 = st.columns(2)
@@ -1,10 +1,8 @@
 import streamlit as st
 import pandas as pd
-import boto3
-import json
 import io
 from datetime import datetime, date
-from botocore.exceptions import NoCredentialsError
+from services import forecast_manager, snapshot_upload, rollups
 
 # --- CONFIGURAZIONE PAGINA ---
 st.set_page_config(page_title="Carica Dati", layout="wide")
@@ -32,7 +30,9 @@ except Exception as e:
     st.stop()
 
 # --- 2. CONNESSIONE BOTO3 ---
+@st.cache_resource
 def get_s3_client():
+    import boto3  # import differito: boto3 carica i modelli endpoint all'import
     session = boto3.session.Session()
     return session.client('s3',
                           region_name=DO_REGION,
@@ -66,100 +66,119 @@ st.divider()
 # --- 4. DATA DI RIFERIMENTO FORECAST (SOLO PER FORECAST) ---
 if folder_type == "Forecast":
     st.subheader("2. Data di Riferimento Forecast")
-    st.info("📅 Indica a quale data si riferisce questo forecast (indipendentemente da quando lo stai caricando)")
+    st.info("📅 La data di ogni forecast viene ricavata dal nome file (es. 08022025 o 20250208). Questa data si usa solo per i file senza data nel nome.")
     
     forecast_date = st.date_input(
-        "Data di Riferimento Forecast:",
+        "Data di Riferimento Forecast (fallback):",
         value=date.today(),
         min_value=date(2023, 1, 1),
         max_value=date(2030, 12, 31),
-        help="Questa data verrà usata per nominare il file e permettere il tracciamento storico"
+        help="Usata per nominare i file senza data nel nome e permettere il tracciamento storico"
     )
     
     st.divider()
 
-# --- 5. UPLOAD FILE ---
+# --- 5. UPLOAD FILE (MULTIPLO) ---
 st.subheader("3. Caricamento File")
-uploaded_file = st.file_uploader("Seleziona il file Excel", type=["xlsx", "xls"])
-
-if uploaded_file:
-    # LOGICA DI RINOMINA PER FORECAST
-    if folder_type == "Forecast":
-        # Formato: [NomeStruttura]_Forecast_Snapshot_[YYYYMMDD].xlsx
-        date_str = forecast_date.strftime("%Y%m%d")
-        new_filename = f"{folder_struct}_Forecast_Snapshot_{date_str}.xlsx"
-        
-        st.write(f"📄 File originale: **{uploaded_file.name}**")
-        st.write(f"🔄 Sarà rinominato in: **{new_filename}**")
-        st.caption(f"📅 Data di riferimento: {forecast_date.strftime('%d/%m/%Y')}")
-        
-        target_path = f"{folder_type}/{folder_struct}/{selected_year}/{new_filename}"
+uploaded_files = st.file_uploader("Seleziona uno o più file Excel", type=["xlsx", "xls"], accept_multiple_files=True)
+
+index_path = f"{folder_type}/{folder_struct}/{selected_year}/index.json"
+
+@st.cache_data(ttl=30)
+def load_existing_index(index_path):
+    """Una sola lettura dell'indice per verificare le sovrascritture (niente head_object per file)."""
+    try:
+        return snapshot_upload.read_index(get_s3_client(), DO_BUCKET, index_path)[0]
+    except Exception:
+        return []
+
+if uploaded_files:
+    existing_files = set(load_existing_index(index_path))
+    
+    # LOGICA DI RINOMINA PER FORECAST: [NomeStruttura]_Forecast_Snapshot_[YYYYMMDD].xlsx
+    plan = {}
+    for uploaded_file in uploaded_files:
+        if folder_type == "Forecast":
+            snap_date = forecast_manager.parse_snapshot_date(uploaded_file.name)
+            source = "nome file"
+            if not snap_date:
+                snap_date = forecast_date
+                source = "data fallback"
+            new_filename = f"{folder_struct}_Forecast_Snapshot_{snap_date.strftime('%Y%m%d')}.xlsx"
+        else:
+            # Per History_Baseline mantieni il nome originale
+            snap_date, source = None, "-"
+            new_filename = uploaded_file.name
         
-    else:
-        # Per History_Baseline mantieni il nome originale
-        new_filename = uploaded_file.name
-        st.write(f"📄 File pronto per l'upload: **{uploaded_file.name}**")
-        target_path = f"{folder_type}/{folder_struct}/{selected_year}/{uploaded_file.name}"
+        # Due file con la stessa destinazione: vince l'ultimo selezionato
+        plan[new_filename] = {
+            'file': uploaded_file,
+            'File originale': uploaded_file.name,
+            'Destinazione': new_filename,
+            'Data snapshot': snap_date.strftime('%d/%m/%Y') if snap_date else "-",
+            'Origine data': source,
+            'Sovrascrive': "⚠️ Sì" if new_filename in existing_files else "No"
+        }
+    
+    if len(plan) < len(uploaded_files):
+        st.warning(f"⚠️ {len(uploaded_files) - len(plan)} file hanno la stessa data di un altro: verrà caricato solo l'ultimo.")
+    
+    plan_df = pd.DataFrame([{k: v for k, v in item.items() if k != 'file'} for item in plan.values()])
+    st.dataframe(plan_df, use_container_width=True, hide_index=True)
     
-    # Verifica se il file esiste già
-    if folder_type == "Forecast":
-        s3_check = get_s3_client()
-        try:
-            s3_check.head_object(Bucket=DO_BUCKET, Key=target_path)
-            st.warning(f"⚠️ **ATTENZIONE**: Esiste già un forecast per la data {forecast_date.strftime('%d/%m/%Y')}. Il caricamento lo sovrascriverà.")
-        except:
-            pass  # File non esiste, tutto ok
+    n_overwrite = int((plan_df['Sovrascrive'] != "No").sum())
+    if n_overwrite:
+        st.warning(f"⚠️ **ATTENZIONE**: {n_overwrite} file esistono già e verranno sovrascritti.")
     
     st.markdown("<br>", unsafe_allow_html=True)
     
-    if st.button("🚀 Conferma e Carica su Cloud", use_container_width=True, type="primary"):
+    if st.button(f"🚀 Conferma e Carica {len(plan)} file su Cloud", use_container_width=True, type="primary"):
         s3 = get_s3_client()
-        index_path = f"{folder_type}/{folder_struct}/{selected_year}/index.json"
         
-        with st.spinner("Caricamento in corso..."):
+        with st.spinner(f"Caricamento in parallelo di {len(plan)} file..."):
             try:
-                # A. Upload File Fisico con nome corretto
-                # Reset del puntatore del file prima dell'upload
-                uploaded_file.seek(0)
+                # A. Upload file fisici in parallelo (multipart per i file grandi)
+                items = [
+                    {'key': f"{folder_type}/{folder_struct}/{selected_year}/{name}", 'fileobj': item['file']}
+                    for name, item in plan.items()
+                ]
+                results = snapshot_upload.upload_files_parallel(s3, DO_BUCKET, items)
+                uploaded_names = [r['key'].split('/')[-1] for r in results if r['ok']]
+                failed = [r for r in results if not r['ok']]
                 
-                s3.upload_fileobj(
-                    uploaded_file, 
-                    DO_BUCKET, 
-                    target_path, 
-                    ExtraArgs={'ACL': 'public-read'}
-                )
-                st.success(f"✅ Caricato correttamente: `{target_path}`")
+                if uploaded_names:
+                    st.success(f"✅ Caricati correttamente {len(uploaded_names)} file.")
+                for r in failed:
+                    st.error(f"❌ `{r['key']}`: {r['error']}")
                 
-                # B. Aggiornamento Indice JSON
-                file_list = []
-                try:
-                    obj = s3.get_object(Bucket=DO_BUCKET, Key=index_path)
-                    content = obj['Body'].read().decode('utf-8')
-                    file_list = json.loads(content)
-                except:
-                    file_list = [] 
+                # B. Rollup mensili/settimanali dei file caricati, scritti PRIMA dell'indice:
+                #    quando uno snapshot compare nell'indice il suo rollup esiste già
+                if uploaded_names:
+                    new_rollups = {}
+                    for name in uploaded_names:
+                        fileobj = plan[name]['file']
+                        fileobj.seek(0)
+                        try:
+                            df_up = forecast_manager.parse_excel_bytes(fileobj.read(), name=name)
+                            new_rollups[name] = rollups.build_rollup(df_up, int(selected_year))
+                        except Exception as e:
+                            st.warning(f"⚠️ Rollup non calcolato per `{name}` (verrà ricavato alla prima lettura): {e}")
+                    if new_rollups:
+                        rollups.record_rollups(s3, DO_BUCKET, folder_type, folder_struct, selected_year, new_rollups)
                 
-                # Usa il nuovo nome del file (non quello originale)
-                if new_filename not in file_list:
-                    file_list.append(new_filename)
-                    # Ordina in ordine cronologico inverso (più recente prima)
-                    file_list.sort(reverse=True)
+                # C. Aggiornamento Indice JSON: una sola scrittura condizionale per tutto il lotto
+                if uploaded_names:
+                    snapshot_upload.commit_index(s3, DO_BUCKET, index_path, add=uploaded_names)
+                    load_existing_index.clear()
+                    st.info(f"🔄 Indice Cloud aggiornato ({len(uploaded_names)} voci).")
                     
-                    s3.put_object(
-                        Bucket=DO_BUCKET,
-                        Key=index_path,
-                        Body=json.dumps(file_list),
-                        ACL='public-read',
-                        ContentType='application/json'
-                    )
-                    st.info("🔄 Indice Cloud aggiornato.")
-                else:
-                    st.info("ℹ️ File già presente nell'indice (sovrascritto).")
+                    # Nuova generazione del dataset: le cache di questo server si aggiornano subito
+                    forecast_manager.bump_folder_generations(folder_type, folder_struct, selected_year)
                 
-                # C. Messaggio finale per Forecast
-                if folder_type == "Forecast":
-                    st.success(f"✨ **Forecast tracciato con successo per la data {forecast_date.strftime('%d/%m/%Y')}**")
-                    st.caption("Il sistema potrà ora confrontare questo forecast con quelli precedenti per l'analisi Pickup.")
+                # D. Messaggio finale per Forecast
+                if folder_type == "Forecast" and uploaded_names:
+                    st.success(f"✨ **{len(uploaded_names)} forecast tracciati con successo**")
+                    st.caption("Il sistema potrà ora confrontare questi forecast con quelli precedenti per l'analisi Pickup.")
                     
             except Exception as e:
                 st.error(f"❌ Errore tecnico durante l'upload: {str(e)}")
@@ -173,8 +192,10 @@ with st.expander("ℹ️ Informazioni sul Sistema di Tracciamento"):
     ### 📋 Come funziona il tracciamento Forecast
     
     **Per i Forecast:**
+    - Puoi selezionare più file insieme: vengono caricati in parallelo e l'indice viene aggiornato una sola volta
+    - Per ogni file vengono salvati i totali mensili e per giorno della settimana (`rollups.json`), usati dalle tabelle riepilogative
     - Ogni file viene rinominato con il formato: `[Struttura]_Forecast_Snapshot_[YYYYMMDD].xlsx`
-    - La data inserita identifica univocamente il forecast per quella giornata
+    - La data viene letta dal nome file; se manca si usa la data di riferimento inserita
     - Se carichi un altro forecast per la stessa data, il precedente verrà sovrascritto
     - Questo permette alla Dashboard Overview di:
         - Ordinare cronologicamente tutti i forecast
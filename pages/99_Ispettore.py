@@ -1,8 +1,6 @@
 import streamlit as st
 import pandas as pd
-import boto3
-import json
-from botocore.exceptions import NoCredentialsError
+from services import forecast_manager, snapshot_upload, rollups
 
 st.set_page_config(page_title="Ispettore Cloud", layout="wide")
 
@@ -30,7 +28,9 @@ except Exception as e:
     st.stop()
 
 # --- 2. CONNESSIONE ---
+@st.cache_resource
 def get_s3_client():
+    import boto3  # import differito: boto3 carica i modelli endpoint all'import
     session = boto3.session.Session()
     return session.client('s3',
                           region_name=DO_REGION,
@@ -77,7 +77,7 @@ try:
         data = []
         for obj in files:
             file_name = obj['Key'].split('/')[-1] # Prende solo il nome finale
-            if file_name and file_name != "index.json": # Ignoriamo index e cartelle vuote
+            if file_name and file_name not in ("index.json", rollups.ROLLUP_STORE_NAME): # Ignoriamo index, rollup e cartelle vuote
                 # Convertiamo dimensione in KB
                 size_kb = round(obj['Size'] / 1024, 1)
                 last_mod = obj['LastModified'].strftime("%d/%m/%Y %H:%M")
@@ -99,18 +99,31 @@ try:
                 s3.delete_object(Bucket=DO_BUCKET, Key=full_key_to_del)
                 st.success(f"File {file_to_delete} eliminato.")
                 
-                # Rigenera index.json dopo cancellazione
-                current_files = [f for f in df["Nome File"].tolist() if f != file_to_delete]
+                # Aggiorna index.json dopo cancellazione (scrittura condizionale, non perde upload concorrenti)
                 index_key = f"{prefix}index.json"
-                s3.put_object(
-                    Bucket=DO_BUCKET, 
-                    Key=index_key, 
-                    Body=json.dumps(current_files), 
-                    ACL='public-read',
-                    ContentType='application/json'
-                )
+                snapshot_upload.commit_index(s3, DO_BUCKET, index_key, remove=[file_to_delete])
+                rollups.record_rollups(s3, DO_BUCKET, folder_type, folder_struct, selected_year, {}, remove=[file_to_delete])
+                forecast_manager.bump_folder_generations(folder_type, folder_struct, selected_year)
                 st.rerun() # Ricarica pagina
                 
+            # --- ROLLUP MENSILI/SETTIMANALI ---
+            st.write("---")
+            st.caption("I rollup (totali mensili e per giorno della settimana) vengono scritti al caricamento. "
+                       "Per gli snapshot caricati prima, puoi ricostruirli qui.")
+            if st.button("🧮 Ricostruisci rollup della cartella"):
+                with st.spinner("Calcolo rollup..."):
+                    new_rollups = {}
+                    for _, row in df.iterrows():
+                        body = s3.get_object(Bucket=DO_BUCKET, Key=row["Full Key"])['Body'].read()
+                        try:
+                            df_snap = forecast_manager.parse_excel_bytes(body, name=row["Nome File"])
+                            new_rollups[row["Nome File"]] = rollups.build_rollup(df_snap, int(selected_year))
+                        except Exception as e:
+                            st.warning(f"⚠️ `{row['Nome File']}` ignorato: {e}")
+                    rollups.record_rollups(s3, DO_BUCKET, folder_type, folder_struct, selected_year, new_rollups)
+                    forecast_manager.bump_folder_generations(folder_type, folder_struct, selected_year)
+                st.success(f"✅ Rollup aggiornati per {len(new_rollups)} file.")
+                
         else:
             st.info("Nessun file Excel trovato in questa cartella.")
     else:
@@ -0,0 +1,327 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence
+import logging
+
+from services.calendar_dim import MESI_IT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# SIMULAZIONE BUDGET VETTORIALE
+# ==============================================================================
+# Gli incrementi sono array di 12 valori (uno per mese). Per ogni giorno si
+# legge l'incremento del suo mese con un'indicizzazione NumPy (gather) e si
+# calcolano OCC, ADR e revenue target in un solo passaggio, senza apply.
+
+MONTH_LABELS = [f"{m:02d} - {nome}" for m, nome in enumerate(MESI_IT, start=1)]
+
+
+def resolve_increments(default_value: float, overrides: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Incremento effettivo per mese: l'override se diverso da 0, altrimenti il globale.
+
+    Args:
+        default_value: Incremento % globale
+        overrides: 12 incrementi % mensili (0 = usa il globale)
+
+    Returns:
+        Array float64 di 12 incrementi %
+    """
+    if overrides is None:
+        return np.full(12, float(default_value))
+    overrides = np.asarray(overrides, dtype='float64')
+    return np.where(overrides != 0.0, overrides, float(default_value))
+
+
+def month_index(df: pd.DataFrame) -> np.ndarray:
+    """Indice mese 0-11 di ogni riga (da usare per il gather degli array mensili)."""
+    return df['date'].dt.month.to_numpy(dtype='int64') - 1
+
+
+def simulate_budget(df_base: pd.DataFrame, occ_increments: np.ndarray, adr_increments: np.ndarray,
+                    n_rooms: int) -> pd.DataFrame:
+    """
+    Applica gli incrementi mensili allo storico giornaliero.
+
+    Args:
+        df_base: Storico con colonne date, occupancy_pct, adr, revenue
+        occ_increments: 12 incrementi % OCC
+        adr_increments: 12 incrementi % ADR
+        n_rooms: Unità della struttura
+
+    Returns:
+        DataFrame con colonne date, month, occupancy_pct, adr, revenue, target_occ, target_adr, target_rev
+    """
+    df_sim = df_base[['date', 'occupancy_pct', 'adr', 'revenue']].copy()
+    m = month_index(df_sim)
+    occ = df_sim['occupancy_pct'].to_numpy(dtype='float64')
+    adr = df_sim['adr'].to_numpy(dtype='float64')
+
+    target_occ = np.clip(occ * (1 + np.asarray(occ_increments, dtype='float64')[m] / 100), 0, 100)
+    target_adr = adr * (1 + np.asarray(adr_increments, dtype='float64')[m] / 100)
+
+    df_sim['month'] = m + 1
+    df_sim['target_occ'] = target_occ
+    df_sim['target_adr'] = target_adr
+    df_sim['target_rev'] = n_rooms * (target_occ / 100) * target_adr
+    return df_sim
+
+
+def monthly_budget(df_sim: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregazione mensile storico vs target (medie per OCC/ADR, somme per revenue).
+
+    Returns:
+        DataFrame con colonne Mese, occupancy_pct, target_occ, adr, target_adr, revenue, target_rev
+    """
+    budget_mensile = df_sim.groupby('month').agg({
+        'occupancy_pct': 'mean',
+        'target_occ': 'mean',
+        'adr': 'mean',
+        'target_adr': 'mean',
+        'revenue': 'sum',
+        'target_rev': 'sum'
+    }).reset_index()
+    budget_mensile.insert(0, 'Mese', [MONTH_LABELS[m - 1] for m in budget_mensile['month']])
+    return budget_mensile.drop(columns='month')
+
+
+# ==============================================================================
+# GRIGLIA DI SCENARI (SENSITIVITÀ OCC x ADR)
+# ==============================================================================
+# revenue_giorno = n * clip(occ * (1 + a)) / 100 * adr * (1 + b)
+# Il fattore ADR esce dalla somma, quindi per ogni mese:
+#   revenue[a, b, mese] = n / 100 * (1 + b) * sum_giorni(clip(occ * (1 + a)) * adr)
+# Si calcola una matrice (incrementi OCC x giorni), la si riduce per mese con un
+# prodotto matriciale e si moltiplica per il vettore ADR: tutta la griglia
+# costa poco più di una singola simulazione.
+
+def scenario_grid(df_base: pd.DataFrame, occ_steps: Sequence[float], adr_steps: Sequence[float],
+                  n_rooms: int) -> Dict:
+    """
+    Revenue target per ogni coppia (incremento OCC %, incremento ADR %).
+
+    Args:
+        df_base: Storico con colonne date, occupancy_pct, adr
+        occ_steps: Incrementi % OCC da valutare (asse righe)
+        adr_steps: Incrementi % ADR da valutare (asse colonne)
+        n_rooms: Unità della struttura
+
+    Returns:
+        Dict con 'occ_steps', 'adr_steps', 'monthly' (array occ x adr x 12)
+        e 'annual' (array occ x adr)
+    """
+    occ_steps = np.asarray(occ_steps, dtype='float64')
+    adr_steps = np.asarray(adr_steps, dtype='float64')
+    occ = df_base['occupancy_pct'].to_numpy(dtype='float64')
+    adr = df_base['adr'].to_numpy(dtype='float64')
+
+    # Matrice mese one-hot (giorni x 12) per ridurre i giorni ai mesi
+    month_onehot = np.zeros((len(df_base), 12))
+    month_onehot[np.arange(len(df_base)), month_index(df_base)] = 1.0
+
+    occ_target = np.clip(occ[None, :] * (1 + occ_steps[:, None] / 100), 0, 100)   # occ x giorni
+    occ_adr_month = (occ_target * adr[None, :]) @ month_onehot                      # occ x 12
+    adr_factor = 1 + adr_steps / 100                                                # adr
+
+    monthly = n_rooms / 100 * occ_adr_month[:, None, :] * adr_factor[None, :, None]
+    return {
+        'occ_steps': occ_steps,
+        'adr_steps': adr_steps,
+        'monthly': monthly,
+        'annual': monthly.sum(axis=2)
+    }
+
+
+# ==============================================================================
+# RISCHIO BUDGET (MONTE CARLO)
+# ==============================================================================
+# Gli shock giornalieri sono i rapporti storici OCC/ADR rispetto alla media
+# della stessa cella (mese, giorno della settimana). Per ogni anno simulato e
+# ogni giorno si estrae un giorno storico della sua cella e se ne applicano i
+# due rapporti insieme (così resta la correlazione OCC-ADR). Gli anni sono
+# simulati a blocchi di matrici (anni x giorni) per tenere fissa la memoria.
+
+MC_YEARS = 100_000
+MC_CHUNK = 5_000
+MC_PERCENTILES = (10, 50, 90)
+
+
+def _shock_pools(df_history: pd.DataFrame):
+    """Rapporti OCC/ADR per cella (mese*7 + giorno settimana), ordinati per cella."""
+    cell = month_index(df_history) * 7 + df_history['date'].dt.dayofweek.to_numpy(dtype='int64')
+    occ = df_history['occupancy_pct'].to_numpy(dtype='float64')
+    adr = df_history['adr'].to_numpy(dtype='float64')
+
+    counts = np.bincount(cell, minlength=84)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        occ_mean = np.bincount(cell, weights=occ, minlength=84) / counts
+        adr_mean = np.bincount(cell, weights=adr, minlength=84) / counts
+        occ_ratio = np.where(occ_mean[cell] > 0, occ / occ_mean[cell], 1.0)
+        adr_ratio = np.where(adr_mean[cell] > 0, adr / adr_mean[cell], 1.0)
+
+    order = np.argsort(cell, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return occ_ratio[order], adr_ratio[order], starts, counts
+
+
+def monte_carlo_budget(df_sim: pd.DataFrame, df_history: pd.DataFrame, n_rooms: int,
+                       n_years: int = MC_YEARS, seed: Optional[int] = 42,
+                       chunk: int = MC_CHUNK) -> Dict:
+    """
+    Distribuzione della revenue annua e mensile attorno al target.
+
+    Args:
+        df_sim: Output di simulate_budget (date, target_occ, target_adr, target_rev)
+        df_history: Storico giornaliero da cui stimare gli shock (date, occupancy_pct, adr)
+        n_rooms: Unità della struttura
+        n_years: Anni simulati
+        seed: Seed del generatore (None = casuale)
+        chunk: Anni simulati per blocco
+
+    Returns:
+        Dict con 'annual' {P10, P50, P90, mean}, 'monthly' (DataFrame Mese, P10, P50, P90)
+        e 'annual_samples' (array n_years)
+    """
+    occ_pool, adr_pool, starts, counts = _shock_pools(df_history)
+    if len(occ_pool) == 0:
+        # Nessuno storico: distribuzione degenere sul target
+        occ_pool, adr_pool = np.ones(1), np.ones(1)
+
+    m = month_index(df_sim)
+    cell = m * 7 + df_sim['date'].dt.dayofweek.to_numpy(dtype='int64')
+    day_start, day_count = starts[cell], counts[cell]
+    has_pool = day_count > 0
+    # Giorni senza storico nella cella: shock neutro
+    safe_count = np.where(has_pool, day_count, 1)
+
+    target_rev = df_sim['target_rev'].to_numpy(dtype='float64')
+    target_adr = df_sim['target_adr'].to_numpy(dtype='float64')
+    target_occ = df_sim['target_occ'].to_numpy(dtype='float64')
+
+    month_onehot = np.zeros((len(df_sim), 12))
+    month_onehot[np.arange(len(df_sim)), m] = 1.0
+
+    rng = np.random.default_rng(seed)
+    monthly = np.empty((n_years, 12))
+    for first in range(0, n_years, chunk):
+        size = min(chunk, n_years - first)
+        idx = day_start + (rng.random((size, len(df_sim))) * safe_count).astype('int64')
+        idx = np.minimum(idx, len(occ_pool) - 1)
+        occ_shock = np.where(has_pool, occ_pool[idx], 1.0)
+        adr_shock = np.where(has_pool, adr_pool[idx], 1.0)
+
+        # OCC simulata sempre entro 0-100%
+        occ_sim = np.clip(target_occ * occ_shock, 0, 100)
+        rev = n_rooms / 100 * occ_sim * target_adr * adr_shock
+        monthly[first:first + size] = rev @ month_onehot
+
+    annual = monthly.sum(axis=1)
+    p_annual = np.percentile(annual, MC_PERCENTILES)
+    p_monthly = np.percentile(monthly, MC_PERCENTILES, axis=0)
+
+    months_present = np.unique(m)
+    monthly_df = pd.DataFrame({
+        'Mese': [MONTH_LABELS[i] for i in months_present],
+        'Target': target_rev @ month_onehot[:, months_present],
+        **{f'P{p}': p_monthly[i, months_present] for i, p in enumerate(MC_PERCENTILES)}
+    })
+
+    return {
+        'annual': {**{f'P{p}': float(v) for p, v in zip(MC_PERCENTILES, p_annual)}, 'mean': float(annual.mean())},
+        'monthly': monthly_df,
+        'annual_samples': annual
+    }
+
+
+# ==============================================================================
+# SOLVER: INCREMENTI MENSILI PER UN TARGET DI REVENUE
+# ==============================================================================
+# Per ogni mese la revenue è n / 100 * (1 + b) * S(a), con S(a) somma di
+# clip(occ * (1 + a)) * adr: fissato l'incremento OCC (a), l'incremento ADR (b)
+# che centra il target è in forma chiusa. Si valutano tutti gli a di una
+# griglia fine (un prodotto matriciale) e per ogni mese si sceglie la coppia
+# ammissibile più vicina allo storico (minimo a² + b²).
+
+SOLVER_STEPS = 701
+
+
+def base_monthly_revenue(df_base: pd.DataFrame, n_rooms: int) -> np.ndarray:
+    """Revenue mensile del modello a incrementi zero (n * occ / 100 * adr), 12 valori."""
+    rev = n_rooms / 100 * df_base['occupancy_pct'].to_numpy(dtype='float64') * df_base['adr'].to_numpy(dtype='float64')
+    return np.bincount(month_index(df_base), weights=rev, minlength=12)
+
+
+def split_annual_target(df_base: pd.DataFrame, annual_target: float, n_rooms: int) -> np.ndarray:
+    """Ripartisce un target annuo sui mesi in proporzione alla revenue storica."""
+    base = base_monthly_revenue(df_base, n_rooms)
+    total = base.sum()
+    if total <= 0:
+        return np.zeros(12)
+    return annual_target * base / total
+
+
+def solve_increments(df_base: pd.DataFrame, n_rooms: int, monthly_targets: Sequence[float],
+                     occ_bounds=(-15.0, 20.0), adr_bounds=(-10.0, 40.0),
+                     steps: int = SOLVER_STEPS) -> pd.DataFrame:
+    """
+    Incrementi mensili OCC/ADR che raggiungono i target con la minima deviazione dallo storico.
+
+    Args:
+        df_base: Storico con colonne date, occupancy_pct, adr
+        n_rooms: Unità della struttura
+        monthly_targets: 12 target di revenue (NaN = mese invariato)
+        occ_bounds: Limiti incremento % OCC (l'OCC risultante resta comunque ≤ 100%)
+        adr_bounds: Limiti incremento % ADR
+        steps: Punti della griglia sull'incremento OCC
+
+    Returns:
+        DataFrame con colonne Mese, occ_inc, adr_inc, target, revenue, reachable
+        (se il target non è raggiungibile nei limiti, la coppia più vicina)
+    """
+    targets = np.asarray(monthly_targets, dtype='float64')
+    occ = df_base['occupancy_pct'].to_numpy(dtype='float64')
+    adr = df_base['adr'].to_numpy(dtype='float64')
+
+    month_onehot = np.zeros((len(df_base), 12))
+    month_onehot[np.arange(len(df_base)), month_index(df_base)] = 1.0
+
+    a = np.linspace(occ_bounds[0], occ_bounds[1], steps)
+    a = np.union1d(a, [0.0]) if occ_bounds[0] <= 0 <= occ_bounds[1] else a
+    occ_target = np.clip(occ[None, :] * (1 + a[:, None] / 100), 0, 100)
+    base = n_rooms / 100 * ((occ_target * adr[None, :]) @ month_onehot)          # steps x 12
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = np.where(base > 0, (targets[None, :] / base - 1) * 100, np.nan)
+    feasible = (base > 0) & (b >= adr_bounds[0]) & (b <= adr_bounds[1])
+
+    # Ammissibili: minima deviazione. Altrimenti: minimo errore sul target, poi deviazione
+    b_clip = np.clip(np.nan_to_num(b, nan=0.0), adr_bounds[0], adr_bounds[1])
+    deviation = a[:, None] ** 2 + b_clip ** 2
+    error = np.abs(base * (1 + b_clip / 100) - targets[None, :])
+    score = np.where(feasible, deviation, np.inf)
+    any_feasible = feasible.any(axis=0)
+    fallback = error + deviation * 1e-9
+    best = np.where(any_feasible, np.argmin(score, axis=0), np.argmin(fallback, axis=0))
+
+    months = np.arange(12)
+    occ_inc = a[best]
+    adr_inc = b_clip[best, months]
+    revenue = base[best, months] * (1 + adr_inc / 100)
+
+    # Mesi senza target o senza storico: invariati
+    keep = np.isnan(targets) | (base.max(axis=0) <= 0)
+    occ_inc = np.where(keep, 0.0, occ_inc)
+    adr_inc = np.where(keep, 0.0, adr_inc)
+
+    return pd.DataFrame({
+        'Mese': MONTH_LABELS,
+        'occ_inc': occ_inc.round(2),
+        'adr_inc': adr_inc.round(2),
+        'target': targets,
+        'revenue': np.where(keep, base_monthly_revenue(df_base, n_rooms), revenue),
+        'reachable': any_feasible & ~keep
+    })
@@ -0,0 +1,291 @@
+import datetime
+import uuid
+import numpy as np
+import pandas as pd
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from services.snapshot_upload import commit_json, commit_object, read_json, read_object
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# ARCHIVIO VERSIONI BUDGET (COLONNARE, APPEND-ONLY)
+# ==============================================================================
+# Per ogni struttura-anno:
+#   Budgets/<Struttura>-<Anno>/budget_versions.parquet  tutte le versioni, una riga
+#                                                       per giorno per versione
+#   Budgets/<Struttura>-<Anno>/versions.json            metadati (id, tipo, data,
+#                                                       totali) e versione ufficiale
+# Le versioni non vengono mai sovrascritte: un salvataggio aggiunge righe.
+# Un solo download del parquet basta per confrontare tutte le versioni.
+# Gli oggetti sono privati (acl=None): si leggono solo con il client autenticato.
+
+STORE_PREFIX = "Budgets"
+STORE_FILE = "budget_versions.parquet"
+INDEX_FILE = "versions.json"
+VALUE_COLUMNS = ['occupancy_pct', 'adr', 'revenue']
+
+
+def _folder(struttura: str, anno: int) -> str:
+    return f"{STORE_PREFIX}/{struttura.replace(' ', '_')}-{anno}"
+
+
+def store_key(struttura: str, anno: int) -> str:
+    return f"{_folder(struttura, anno)}/{STORE_FILE}"
+
+
+def index_key(struttura: str, anno: int) -> str:
+    return f"{_folder(struttura, anno)}/{INDEX_FILE}"
+
+
+def _to_columns(df: pd.DataFrame, version_id: str) -> pd.DataFrame:
+    """Righe di una versione nello schema dell'archivio (float32 per i valori)."""
+    out = pd.DataFrame({'version': version_id, 'date': pd.to_datetime(df['date']).to_numpy()})
+    for col in VALUE_COLUMNS:
+        if col in df.columns:
+            out[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy(dtype='float32')
+        else:
+            out[col] = np.float32(0.0)
+    return out
+
+
+def _read_parquet(body: Optional[bytes]) -> pd.DataFrame:
+    if body is None:
+        return pd.DataFrame(columns=['version', 'date'] + VALUE_COLUMNS)
+    return pd.read_parquet(BytesIO(body))
+
+
+def _write_parquet(df: pd.DataFrame) -> bytes:
+    df = df.copy()
+    df['version'] = df['version'].astype('category')
+    buffer = BytesIO()
+    df.to_parquet(buffer, index=False, compression='zstd')
+    return buffer.getvalue()
+
+
+def append_version(s3, bucket: str, df: pd.DataFrame, struttura: str, anno: int,
+                   tipo: str = 'test', label: str = "") -> Dict:
+    """
+    Aggiunge una versione di budget all'archivio e ne registra i metadati.
+
+    Args:
+        s3: Client boto3 S3
+        bucket: Nome bucket
+        df: Budget giornaliero (date, occupancy_pct, adr, revenue)
+        struttura: Nome struttura (es. "La Terrazza")
+        anno: Anno del budget
+        tipo: 'official' o 'test'
+        label: Descrizione libera
+
+    Returns:
+        Dict con i metadati della versione
+    """
+    created = datetime.datetime.now()
+    version_id = f"{created.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    rows = _to_columns(df, version_id)
+
+    # 1. Righe nel parquet (prima dell'indice: una versione indicizzata esiste sempre)
+    def add_rows(body):
+        return _write_parquet(pd.concat([_read_parquet(body), rows], ignore_index=True))
+
+    commit_object(s3, bucket, store_key(struttura, anno), add_rows, acl=None)
+
+    # 2. Metadati
+    meta = {
+        'id': version_id,
+        'tipo': tipo,
+        'label': label,
+        'created_at': created.isoformat(timespec='seconds'),
+        'rows': int(len(rows)),
+        'revenue': round(float(rows['revenue'].sum()), 2)
+    }
+
+    def add_meta(index):
+        index = dict(index or {'versions': [], 'official': None})
+        index['versions'] = list(index.get('versions', [])) + [meta]
+        if tipo == 'official':
+            index['official'] = version_id
+        return index
+
+    commit_json(s3, bucket, index_key(struttura, anno), add_meta, default={'versions': [], 'official': None}, acl=None)
+    logger.info(f"Budget {struttura} {anno}: versione {version_id} ({tipo}) salvata")
+    return meta
+
+
+def list_versions(s3, bucket: str, struttura: str, anno: int) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Metadati delle versioni (più recente prima) e id della versione ufficiale.
+    Legge solo versions.json.
+    """
+    index, _ = read_json(s3, bucket, index_key(struttura, anno), default={'versions': [], 'official': None})
+    versions = pd.DataFrame(index.get('versions', []))
+    if not versions.empty:
+        versions = versions.sort_values('created_at', ascending=False).reset_index(drop=True)
+    return versions, index.get('official')
+
+
+def load_store(s3, bucket: str, struttura: str, anno: int) -> pd.DataFrame:
+    """Tutte le versioni in un unico frame (un download)."""
+    body, _ = read_object(s3, bucket, store_key(struttura, anno))
+    return _read_parquet(body)
+
+
+def load_version(store: pd.DataFrame, version_id: str) -> pd.DataFrame:
+    """Righe giornaliere di una versione."""
+    return store.loc[store['version'] == version_id, ['date'] + VALUE_COLUMNS].reset_index(drop=True)
+
+
+# ==============================================================================
+# BUDGET UFFICIALE (CSV LETTO DA 07 - BUDGET TARGET E DAI REPORT)
+# ==============================================================================
+
+OFFICIAL_PREFIX = "Budgets-Official"
+OFFICIAL_FILE = "budget_official.csv"
+
+OFFICIAL_COLUMN_NAMES = {
+    'data': 'date',
+    'occupate %': 'occupancy_pct',
+    'occupancy %': 'occupancy_pct',
+    'occ %': 'occupancy_pct',
+    'totale revenue': 'revenue',
+    'ricavo': 'revenue',
+    'rev': 'revenue',
+    'adr': 'adr',
+    'occupate': 'rooms_sold',
+    'sold': 'rooms_sold',
+    'notti': 'rooms_sold',
+    'unità': 'rooms',
+    'unita': 'rooms',
+    'capacity': 'rooms',
+    'capacità': 'rooms'
+}
+
+
+def official_key(struttura: str, anno: int) -> str:
+    """Percorso del budget ufficiale: Budgets-Official/<Struttura>-<Anno>/budget_official.csv."""
+    return f"{OFFICIAL_PREFIX}/{struttura.replace(' ', '_')}-{anno}/{OFFICIAL_FILE}"
+
+
+def normalize_budget(df: pd.DataFrame, struttura: str) -> pd.DataFrame:
+    """
+    Nomi colonne standard (date, revenue, rooms_sold, adr, occupancy_pct, rooms),
+    numeri in formato italiano convertiti, OCC in percentuale, capacità e
+    camere vendute stimate se mancanti.
+    """
+    df = df.copy()
+    df.columns = [str(c).lower().strip() for c in df.columns]
+    df = df.rename(columns=OFFICIAL_COLUMN_NAMES)
+
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        df = df.dropna(subset=['date'])
+
+    for col in ['revenue', 'rooms_sold', 'adr', 'occupancy_pct', 'rooms']:
+        if col in df.columns:
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].astype(str).str.replace('€', '', regex=False)\
+                               .str.replace('.', '', regex=False)\
+                               .str.replace(',', '.', regex=False)\
+                               .str.strip()
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # OCC in formato decimale (0-1)
+    if 'occupancy_pct' in df.columns and 0 < df['occupancy_pct'].max() <= 1.0:
+        df['occupancy_pct'] = df['occupancy_pct'] * 100
+
+    # Capacità stimata per struttura se mancante
+    if 'rooms' not in df.columns or df['rooms'].sum() == 0:
+        df['rooms'] = 5 if "Pitti" not in struttura else 10
+
+    # Camere vendute da OCC e capacità se mancanti
+    if 'rooms_sold' not in df.columns or df['rooms_sold'].sum() == 0:
+        if 'occupancy_pct' in df.columns:
+            df['rooms_sold'] = (df['occupancy_pct'] / 100 * df['rooms']).round()
+
+    return df.reset_index(drop=True)
+
+
+def load_official_budget(s3, bucket: str, struttura: str, anno: int) -> pd.DataFrame:
+    """
+    Budget ufficiale giornaliero normalizzato (client autenticato: l'oggetto è privato).
+
+    Returns:
+        DataFrame normalizzato; vuoto se il budget non esiste o non ha date e revenue
+    """
+    body, _ = read_object(s3, bucket, official_key(struttura, anno))
+    if body is None:
+        return pd.DataFrame()
+    df = normalize_budget(pd.read_csv(BytesIO(body)), struttura)
+    if 'date' not in df.columns or 'revenue' not in df.columns:
+        return pd.DataFrame()
+    return df
+
+
+# ==============================================================================
+# CONFRONTO VERSIONI PER MESE
+# ==============================================================================
+
+def monthly_matrix(store: pd.DataFrame, metric: str = 'revenue') -> Tuple[List[str], np.ndarray]:
+    """
+    Totali mensili di tutte le versioni in un solo groupby.
+
+    Args:
+        store: Frame dell'archivio (load_store)
+        metric: 'revenue' (somma) oppure 'occupancy_pct' / 'adr' (media)
+
+    Returns:
+        Tuple (id versioni, array versioni x 12)
+    """
+    if store.empty:
+        return [], np.zeros((0, 12))
+    how = 'sum' if metric == 'revenue' else 'mean'
+    version = store['version'].astype(str)
+    table = store.groupby([version, store['date'].dt.month])[metric].agg(how).unstack(fill_value=0.0)
+    table = table.reindex(columns=range(1, 13), fill_value=0.0)
+    return table.index.tolist(), table.to_numpy(dtype='float64')
+
+
+def compare_versions(store: pd.DataFrame, reference_id: str, metric: str = 'revenue') -> pd.DataFrame:
+    """
+    Delta mensile di ogni versione rispetto a una di riferimento (una sottrazione di matrici).
+
+    Returns:
+        DataFrame versioni x mesi (colonne 1-12) con il delta, più la colonna 'Totale'
+    """
+    ids, matrix = monthly_matrix(store, metric)
+    if reference_id not in ids:
+        return pd.DataFrame()
+    delta = matrix - matrix[ids.index(reference_id)]
+    out = pd.DataFrame(delta, index=pd.Index(ids, name='version'), columns=range(1, 13))
+    out['Totale'] = delta.sum(axis=1) if metric == 'revenue' else delta.mean(axis=1)
+    return out
+
+
+def diff_versions(store: pd.DataFrame, version_a: str, version_b: str) -> pd.DataFrame:
+    """
+    Confronto mensile tra due versioni (B rispetto ad A) per revenue, OCC e ADR, in un solo groupby.
+
+    Returns:
+        DataFrame con colonne month, revenue_a, revenue_b, delta_rev, delta_pct, delta_occ, delta_adr
+    """
+    pair = store[store['version'].isin([version_a, version_b])]
+    monthly = pair.groupby([pair['version'].astype(str), pair['date'].dt.month.rename('month')]).agg(
+        revenue=('revenue', 'sum'), occupancy_pct=('occupancy_pct', 'mean'), adr=('adr', 'mean')
+    )
+    versions = monthly.index.get_level_values(0)
+    if version_a not in versions or version_b not in versions:
+        return pd.DataFrame()
+
+    a = monthly.loc[version_a].reindex(range(1, 13), fill_value=0.0)
+    b = monthly.loc[version_b].reindex(range(1, 13), fill_value=0.0)
+    out = pd.DataFrame({'month': range(1, 13), 'revenue_a': a['revenue'].to_numpy(), 'revenue_b': b['revenue'].to_numpy()})
+    out['delta_rev'] = out['revenue_b'] - out['revenue_a']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['delta_pct'] = np.where(out['revenue_a'] > 0, out['delta_rev'] / out['revenue_a'] * 100, 0.0)
+    out['delta_occ'] = (b['occupancy_pct'] - a['occupancy_pct']).to_numpy()
+    out['delta_adr'] = (b['adr'] - a['adr']).to_numpy()
+    return out
@@ -0,0 +1,237 @@
+import threading
+import numpy as np
+import pandas as pd
+from typing import Iterable, Optional, Tuple
+import logging
+
+from services.dataset_cache import get_cache
+from services import events
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# DIMENSIONE CALENDARIO CONDIVISA
+# ==============================================================================
+# Una riga per giorno per tutti gli anni in uso, calcolata una volta per
+# processo (almeno CALENDAR_YEARS; si estende quando arrivano date fuori
+# intervallo, ad es. storico 2019 o forecast 2031): etichette italiane di mese e giorno, settimana ISO, festività,
+# eventi e date LY allineate. La chiave è un intero (giorni dal 2000-01-01):
+# le pagine prendono le colonne con un gather posizionale invece di formattare
+# stringhe riga per riga o fare merge su chiavi testuali.
+
+CALENDAR_YEARS = (2020, 2030)
+EPOCH = np.datetime64('2000-01-01', 'D')
+LY_DOW_OFFSET_DAYS = 364
+
+MESI_IT = ['Gennaio', 'Febbraio', 'Marzo', 'Aprile', 'Maggio', 'Giugno',
+           'Luglio', 'Agosto', 'Settembre', 'Ottobre', 'Novembre', 'Dicembre']
+MESI_IT_SHORT = [m[:3] for m in MESI_IT]
+GIORNI_IT = ['Lunedì', 'Martedì', 'Mercoledì', 'Giovedì', 'Venerdì', 'Sabato', 'Domenica']
+GIORNI_IT_SHORT = ['Lun', 'Mar', 'Mer', 'Gio', 'Ven', 'Sab', 'Dom']
+
+
+_span = CALENDAR_YEARS
+_span_lock = threading.Lock()
+
+
+def date_key(dates) -> np.ndarray:
+    """Chiave intera del calendario (giorni dal 2000-01-01) per una sequenza di date."""
+    values = pd.DatetimeIndex(pd.to_datetime(dates)).to_numpy().astype('datetime64[D]')
+    return (values - EPOCH).astype('int64')
+
+
+def _build_calendar(first_year: int, last_year: int, event_calendar: Optional['events.EventCalendar']) -> pd.DataFrame:
+    dates = pd.date_range(f"{first_year}-01-01", f"{last_year}-12-31", freq='D')
+    keys = date_key(dates)
+    month = dates.month.to_numpy()
+    day = dates.day.to_numpy()
+    dow = dates.dayofweek.to_numpy()
+    iso = dates.isocalendar()
+
+    cal = pd.DataFrame({
+        'date_key': keys,
+        'date': dates,
+        'year': dates.year.to_numpy(dtype='int16'),
+        'month': month.astype('int8'),
+        'day': day.astype('int8'),
+        'dow': dow.astype('int8'),
+        'iso_year': iso['year'].to_numpy(dtype='int16'),
+        'iso_week': iso['week'].to_numpy(dtype='int8'),
+        'mese': np.array(MESI_IT, dtype=object)[month - 1],
+        'mese_short': np.array(MESI_IT_SHORT, dtype=object)[month - 1],
+        'giorno': np.array(GIORNI_IT, dtype=object)[dow],
+        'giorno_short': np.array(GIORNI_IT_SHORT, dtype=object)[dow],
+        'is_weekend': dow >= 5
+    })
+    # Etichette testuali generate una sola volta qui, non a ogni rerun delle pagine
+    dd = pd.Series(day).astype(str).str.zfill(2)
+    mm = pd.Series(month).astype(str).str.zfill(2)
+    cal['label_giorno'] = (dd + '/' + mm + ' ' + cal['giorno_short']).to_numpy()
+    cal['label_data'] = (dd + '/' + mm + '/' + pd.Series(dates.year).astype(str)).to_numpy()
+
+    # Festività (sempre) ed eventi del feed (se passato)
+    holidays = pd.concat([events.holidays_for_year(y) for y in range(first_year, last_year + 1)], ignore_index=True)
+    holiday_name = pd.Series(holidays['evento'].to_numpy(), index=date_key(holidays['start']))
+    holiday_name = holiday_name[~holiday_name.index.duplicated()]
+    cal['festivita'] = holiday_name.reindex(keys).to_numpy()
+    cal['is_holiday'] = cal['festivita'].notna().to_numpy()
+    if event_calendar is not None:
+        cal['has_event'] = (event_calendar.daily(dates)['n_eventi'] > 0).to_numpy()
+    else:
+        cal['has_event'] = cal['is_holiday'].to_numpy()
+
+    # Date LY: stesso giorno della settimana (364 giorni prima) e stessa data di calendario
+    # (il 29 febbraio cade sul 28)
+    cal['key_ly_dow'] = keys - LY_DOW_OFFSET_DAYS
+    ly_day = np.where((month == 2) & (day == 29), 28, day)
+    ly_dates = pd.to_datetime(pd.DataFrame({'year': dates.year - 1, 'month': month, 'day': ly_day}))
+    cal['key_ly_cal'] = date_key(ly_dates)
+    return cal
+
+
+def ensure_years(dates) -> Tuple[int, int]:
+    """
+    Estende l'intervallo di anni della dimensione fino a coprire `dates` (non lo restringe mai).
+
+    Returns:
+        Tuple (primo anno, ultimo anno) della dimensione
+    """
+    global _span
+    valid = pd.DatetimeIndex(pd.to_datetime(dates)).dropna()
+    with _span_lock:
+        if len(valid):
+            span = (min(_span[0], int(valid.min().year)), max(_span[1], int(valid.max().year)))
+            if span != _span:
+                logger.info(f"Dimensione calendario estesa a {span[0]}-{span[1]}")
+                old = _span
+                get_cache().invalidate(lambda k: isinstance(k, tuple) and k[:2] == ('calendar_dim', old))
+                _span = span
+        return _span
+
+
+def get_calendar(event_calendar: Optional['events.EventCalendar'] = None) -> pd.DataFrame:
+    """
+    Dimensione calendario condivisa dal processo (una riga per giorno degli anni
+    coperti: CALENDAR_YEARS più quelli aggiunti da ensure_years).
+
+    Args:
+        event_calendar: Calendario eventi per la colonna has_event (default: solo festività)
+
+    Returns:
+        DataFrame con colonne date_key, date, year, month, day, dow, iso_year, iso_week,
+        mese, mese_short, giorno, giorno_short, is_weekend, label_giorno, label_data,
+        festivita, is_holiday, has_event, key_ly_dow, key_ly_cal
+    """
+    version = event_calendar.version if event_calendar is not None else None
+    span = _span
+    key = ('calendar_dim', span, version)
+    return get_cache().get_or_load(key, lambda: _build_calendar(*span, event_calendar))
+
+
+def calendar_columns(dates, columns: Iterable[str],
+                     event_calendar: Optional['events.EventCalendar'] = None) -> pd.DataFrame:
+    """
+    Colonne del calendario allineate a `dates` (gather sulla chiave intera, nessun merge).
+
+    Args:
+        dates: Sequenza di date (Series, DatetimeIndex o array)
+        columns: Colonne della dimensione da restituire
+
+    Returns:
+        DataFrame con una riga per data, nello stesso ordine (e indice, se Series) di `dates`
+    """
+    ensure_years(dates)
+    cal = get_calendar(event_calendar)
+    pos = date_key(dates) - int(cal['date_key'].iat[0])
+    if len(pos) and (pos.min() < 0 or pos.max() >= len(cal)):
+        raise ValueError("Date non valide (NaT) per la dimensione calendario")
+    out = cal[list(columns)].iloc[pos]
+    out.index = dates.index if isinstance(dates, pd.Series) else pd.RangeIndex(len(pos))
+    return out
+
+
+# ==============================================================================
+# ALLINEAMENTO LY (INDICE INTERO)
+# ==============================================================================
+# Ogni data di soggiorno ha due date LY nella dimensione: stessa data di
+# calendario (key_ly_cal) e stesso giorno della settimana, 52 settimane prima
+# (key_ly_dow). Un confronto LY diventa: chiave LY -> posizione nell'array
+# dell'anno precedente (tabella chiave -> posizione) -> gather delle colonne.
+
+LY_MODES = {'settimana': 'key_ly_dow', 'calendario': 'key_ly_cal'}
+LY_MODE_LABELS = {
+    'settimana': "Stesso giorno della settimana (52 settimane)",
+    'calendario': "Stessa data di calendario"
+}
+DEFAULT_LY_MODE = 'settimana'
+
+
+def ly_keys(dates, mode: str = DEFAULT_LY_MODE) -> np.ndarray:
+    """Chiavi intere delle date LY allineate secondo `mode` ('settimana' o 'calendario')."""
+    if mode not in LY_MODES:
+        raise ValueError(f"Allineamento LY sconosciuto: {mode}")
+    return calendar_columns(dates, [LY_MODES[mode]])[LY_MODES[mode]].to_numpy()
+
+
+def ly_dates(dates, mode: str = DEFAULT_LY_MODE) -> np.ndarray:
+    """Date LY allineate (datetime64[D]) per una sequenza di date."""
+    return EPOCH + ly_keys(dates, mode).astype('timedelta64[D]')
+
+
+def ly_index(dates, ly_dates_values, mode: str = DEFAULT_LY_MODE) -> np.ndarray:
+    """
+    Posizione di ogni data LY allineata dentro l'array delle date dell'anno precedente.
+
+    Args:
+        dates: Date di soggiorno correnti
+        ly_dates_values: Date dell'anno precedente (l'array su cui si farà il gather)
+        mode: 'settimana' o 'calendario'
+
+    Returns:
+        Array int64 allineato a `dates` (-1 dove la data LY non è presente)
+    """
+    ensure_years(dates)
+    ensure_years(ly_dates_values)
+    cal = get_calendar()
+    first = int(cal['date_key'].iat[0])
+    positions = np.full(len(cal), -1, dtype='int64')
+    ly_pos = date_key(ly_dates_values) - first
+    valid = (ly_pos >= 0) & (ly_pos < len(cal))
+    positions[ly_pos[valid]] = np.flatnonzero(valid)
+
+    target = ly_keys(dates, mode) - first
+    inside = (target >= 0) & (target < len(cal))
+    return np.where(inside, positions[np.clip(target, 0, len(cal) - 1)], -1)
+
+
+def gather_ly(df: pd.DataFrame, df_ly: pd.DataFrame, columns: Iterable[str],
+              mode: str = DEFAULT_LY_MODE, suffix: str = '_ly') -> pd.DataFrame:
+    """
+    Colonne LY allineate alle righe di `df` con un gather (nessun merge).
+
+    Args:
+        df: Frame corrente con colonna 'date'
+        df_ly: Frame dell'anno precedente con colonna 'date'
+        columns: Colonne di `df_ly` da portare
+        mode: 'settimana' o 'calendario'
+        suffix: Suffisso delle colonne restituite
+
+    Returns:
+        DataFrame con indice di `df` e colonne <col><suffix> (NaN dove manca la data LY)
+    """
+    columns = list(columns)
+    out = pd.DataFrame(index=df.index)
+    if df_ly is None or df_ly.empty:
+        for col in columns:
+            out[col + suffix] = np.nan
+        return out
+
+    idx = ly_index(df['date'], df_ly['date'], mode)
+    hit = idx >= 0
+    for col in columns:
+        values = np.full(len(df), np.nan)
+        values[hit] = df_ly[col].to_numpy(dtype='float64')[idx[hit]]
+        out[col + suffix] = values
+    return out
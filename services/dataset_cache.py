@@ -0,0 +1,276 @@
+import pandas as pd
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# CACHE DATASET CONDIVISA DI PROCESSO (ZERO-COPY)
+# ==============================================================================
+# st.cache_data serializza il DataFrame con pickle e ne restituisce una copia
+# nuova a ogni hit, per ogni sessione. Qui il frame è tenuto una sola volta per
+# processo e consegnato come vista: la memoria non cresce con le sessioni.
+#
+# Un artefatto vuoto (download fallito, file mancante) non resta in cache fino
+# al cambio di generazione: scade dopo EMPTY_TTL secondi e viene ricaricato.
+
+#
+# La cache è limitata (CACHE_MAX_ENTRIES voci, CACHE_MAX_BYTES di DataFrame):
+# oltre il limite si scartano le voci usate meno di recente, con i loro
+# derivati (snapshot aperti una volta sul Pickup, vecchie chiavi pace/history).
+
+EMPTY_TTL = 60
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def _nbytes(value: Any) -> int:
+    """Byte occupati dai DataFrame di un artefatto (anche dentro tuple)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+def is_empty(value: Any) -> bool:
+    """True per None, DataFrame/dict/list vuoti e tuple (frame, info) con frame vuoto."""
+    if value is None:
+        return True
+    if isinstance(value, pd.DataFrame):
+        return value.empty
+    if isinstance(value, tuple):
+        return bool(value) and is_empty(value[0])
+    if isinstance(value, (dict, list)):
+        return not value
+    return False
+
+
+class DatasetCache:
+    """
+    Cache thread-safe chiave -> artefatto, condivisa da tutte le sessioni.
+
+    Gli artefatti derivati (tabelle mensili, colonne calendario, ...) sono
+    memorizzati a parte con `derive`, legati alla chiave del dataset sorgente,
+    così le pagine non aggiungono colonne ai frame condivisi.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        # Ordine = uso: la prima voce è la meno recente
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Optional[float]]]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._evicted = 0
+        self._derived: Dict[Tuple[Hashable, str], Any] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def _lookup(self, key: Hashable, ttl: Optional[float]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            return False, None
+        loaded_at, value, max_age = entry
+        age = time.time() - loaded_at
+        if (ttl is not None and age > ttl) or (max_age is not None and age > max_age):
+            return False, None
+        return True, value
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        Restituisce l'artefatto in cache o lo carica una sola volta (anche con sessioni concorrenti).
+
+        Args:
+            key: Chiave hashable del dataset
+            loader: Funzione senza argomenti che produce l'artefatto
+            ttl: Secondi di validità (None = finché non viene invalidato;
+                 gli artefatti vuoti valgono al massimo EMPTY_TTL)
+
+        Returns:
+            L'artefatto; i DataFrame vengono consegnati come vista condivisa
+        """
+        hit, value = self._lookup(key, ttl)
+        if not hit:
+            # Un solo caricamento per chiave: le altre sessioni aspettano il risultato
+            with self._key_lock(key):
+                hit, value = self._lookup(key, ttl)
+                if not hit:
+                    value = loader()
+                    self.put(key, value)
+        return share(value)
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Ultimo valore registrato per `key`, anche se scaduto (senza caricarlo)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return default if entry is None else share(entry[1])
+
+    def put(self, key: Hashable, value: Any):
+        """Registra un artefatto e scarta i derivati della versione precedente."""
+        max_age = EMPTY_TTL if is_empty(value) else None
+        size = _nbytes(value)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time(), value, max_age)
+            self._sizes[key] = size
+            self._bytes += size
+            self._evict(keep=key)
+
+    def _remove(self, key: Hashable):
+        """Toglie una voce e i suoi derivati (da chiamare con il lock)."""
+        if self._entries.pop(key, None) is not None:
+            self._bytes -= self._sizes.pop(key, 0)
+        for derived_key in [k for k in self._derived if k[0] == key]:
+            del self._derived[derived_key]
+
+    def _evict(self, keep: Hashable):
+        """Scarta le voci meno usate finché la cache rientra nei limiti (da chiamare con il lock)."""
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._remove(oldest)
+            self._key_locks.pop(oldest, None)
+            self._evicted += 1
+
+    def derive(self, key: Hashable, name: str, builder: Callable[[], Any]) -> Any:
+        """
+        Artefatto derivato dal dataset `key` (es. tabella mensile), calcolato una volta.
+        Viene invalidato insieme al dataset sorgente; un derivato vuoto non viene memorizzato.
+        """
+        derived_key = (key, name)
+        with self._lock:
+            if derived_key in self._derived:
+                return share(self._derived[derived_key])
+        value = builder()
+        if not is_empty(value):
+            with self._lock:
+                self._derived[derived_key] = value
+        return share(value)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None):
+        """Elimina le voci la cui chiave soddisfa `predicate` (tutte se None)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                self._remove(key)
+                self._key_locks.pop(key, None)
+            for derived_key in [k for k in self._derived if predicate is None or predicate(k[0])]:
+                del self._derived[derived_key]
+
+    def stats(self) -> Dict:
+        """Numero di voci, byte occupati dai DataFrame in cache e voci scartate per i limiti."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'derived': len(self._derived),
+                'bytes': self._bytes + sum(_nbytes(v) for v in self._derived.values()),
+                'evicted': self._evicted
+            }
+
+
+def _copy_on_write() -> bool:
+    """
+    Copy-on-Write attivo: sempre da pandas 3 (il minimo in requirements.txt);
+    il controllo resta per ambienti con pandas 2, dove share() deve copiare.
+    """
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except Exception:
+        return False
+
+
+def share(value: Any) -> Any:
+    """
+    Consegna un artefatto senza serializzarlo.
+
+    Con Copy-on-Write i DataFrame (anche dentro tuple) diventano viste shallow:
+    condividono i buffer con la cache e li copiano solo se una pagina scrive.
+    Senza Copy-on-Write una vista shallow permetterebbe a una sessione di
+    modificare il dato condiviso, quindi si consegna una copia.
+    """
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=not _copy_on_write())
+    if isinstance(value, tuple):
+        return tuple(share(v) for v in value)
+    return value
+
+
+# ==============================================================================
+# GENERAZIONI DEI DATASET
+# ==============================================================================
+# Ogni dataset (cartella, struttura, anno) ha un numero di generazione che
+# cresce solo quando il suo indice cambia o quando un upload lo incrementa.
+# Gli artefatti derivati includono la generazione nella chiave: non scadono
+# mai per tempo, diventano irraggiungibili quando la generazione avanza.
+
+class GenerationRegistry:
+    """Numero di generazione per dataset, derivato dall'impronta dell'indice."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generations: Dict[Hashable, int] = {}
+        self._fingerprints: Dict[Hashable, Optional[Hashable]] = {}
+
+    def current(self, dataset: Hashable) -> int:
+        with self._lock:
+            return self._generations.get(dataset, 0)
+
+    def observe(self, dataset: Hashable, fingerprint: Hashable) -> Tuple[int, bool]:
+        """
+        Registra l'impronta corrente dell'indice.
+
+        Returns:
+            Tuple (generazione, cambiata): la generazione avanza solo se l'impronta
+            differisce da quella vista in precedenza
+        """
+        with self._lock:
+            gen = self._generations.get(dataset, 0)
+            previous = self._fingerprints.get(dataset)
+            self._fingerprints[dataset] = fingerprint
+            if previous is None or previous == fingerprint:
+                self._generations[dataset] = gen
+                return gen, False
+            self._generations[dataset] = gen + 1
+            return gen + 1, True
+
+    def bump(self, dataset: Hashable) -> int:
+        """Avanza subito la generazione (es. dopo un upload da questo processo)."""
+        with self._lock:
+            gen = self._generations.get(dataset, 0) + 1
+            self._generations[dataset] = gen
+            # La prossima impronta osservata è quella post-upload: non deve avanzare di nuovo
+            self._fingerprints[dataset] = None
+            return gen
+
+
+# Istanza unica di processo: i moduli services vengono importati una sola volta
+# dal server Streamlit, quindi tutte le sessioni vedono la stessa cache.
+_CACHE = DatasetCache()
+
+
+def get_cache() -> DatasetCache:
+    return _CACHE
+
+
+_GENERATIONS = GenerationRegistry()
+
+
+def get_generations() -> GenerationRegistry:
+    return _GENERATIONS
@@ -0,0 +1,353 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import requests
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+
+from services.dataset_cache import get_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# CALENDARIO EVENTI (FEED + FESTIVITÀ)
+# ==============================================================================
+# Il feed CSV degli eventi è salvato su disco con ETag/Last-Modified: ogni
+# EVENTS_REVALIDATE secondi si fa una GET condizionale (304 = nessun download).
+# La versione del feed è l'hash del contenuto e fa parte delle chiavi cache.
+# Le festività sono generate per anno, solo quando un anno viene richiesto.
+# Ogni evento è un intervallo [inizio, fine] (colonna opzionale 'data_fine'
+# nel feed): le ricerche per data passano da un IntervalIndex.
+
+EVENTS_REVALIDATE = 300
+CACHE_DIR = os.environ.get(
+    "EVENTS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache", "events")
+)
+EVENT_COLUMNS = ['start', 'end', 'evento', 'tipo', 'importanza']
+
+_feed_lock = threading.Lock()
+_holiday_lock = threading.Lock()
+_holidays_by_year: Dict[int, pd.DataFrame] = {}
+
+
+def _cache_paths(url: str) -> Tuple[str, str]:
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{name}.csv"), os.path.join(CACHE_DIR, f"{name}.json")
+
+
+def fetch_feed(url: str, revalidate: float = EVENTS_REVALIDATE) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Contenuto del feed eventi dalla cache su disco, rivalidata con GET condizionale.
+
+    Returns:
+        Tuple (contenuto CSV, versione); (None, None) se il feed non è mai stato scaricato
+        e non è raggiungibile
+    """
+    data_path, meta_path = _cache_paths(url)
+    with _feed_lock:
+        meta = {}
+        if os.path.exists(meta_path) and os.path.exists(data_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if time.time() - meta.get('checked_at', 0) < revalidate:
+                with open(data_path, 'rb') as f:
+                    return f.read(), meta.get('version')
+
+        headers = {}
+        if meta.get('etag'): headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'): headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            resp = requests.get(url, headers=headers, timeout=15)
+        except Exception as e:
+            logger.warning(f"Feed eventi non raggiungibile: {e}")
+            resp = None
+
+        if resp is not None and resp.status_code == 200:
+            content = resp.content
+            meta = {
+                'etag': resp.headers.get('ETag'),
+                'last_modified': resp.headers.get('Last-Modified'),
+                'version': hashlib.sha1(content).hexdigest()[:12]
+            }
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(data_path, 'wb') as f:
+                f.write(content)
+        elif not os.path.exists(data_path):
+            return None, None
+        # 304 o errore: si tiene la copia su disco
+
+        meta['checked_at'] = time.time()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        with open(data_path, 'rb') as f:
+            return f.read(), meta.get('version')
+
+
+def parse_feed(content: bytes) -> pd.DataFrame:
+    """
+    CSV del feed -> eventi con colonne start, end, evento, tipo, importanza.
+    'data_fine' (opzionale) chiude un evento di più giorni; se manca, l'evento dura un giorno.
+    """
+    df = pd.read_csv(io.BytesIO(content))
+    df.columns = df.columns.str.strip().str.lower()
+    if 'data' not in df.columns:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    df['start'] = pd.to_datetime(df['data'], dayfirst=True, errors='coerce')
+    end_col = next((c for c in ('data_fine', 'fine', 'data fine') if c in df.columns), None)
+    end = pd.to_datetime(df[end_col], dayfirst=True, errors='coerce') if end_col else pd.Series(pd.NaT, index=df.index)
+    df['end'] = end.fillna(df['start'])
+    # Date invertite: si prende l'intervallo nel verso giusto
+    df['start'], df['end'] = df[['start', 'end']].min(axis=1), df[['start', 'end']].max(axis=1)
+
+    df['importanza'] = pd.to_numeric(df.get('importanza'), errors='coerce').fillna(1)
+    for col in ('evento', 'tipo'):
+        if col not in df.columns:
+            df[col] = ""
+    return df.dropna(subset=['start'])[EVENT_COLUMNS].reset_index(drop=True)
+
+
+def holidays_for_year(year: int) -> pd.DataFrame:
+    """Festività italiane di un anno (generate al primo uso e poi tenute in memoria)."""
+    with _holiday_lock:
+        if year not in _holidays_by_year:
+            import holidays  # import differito: carica tutte le tabelle paese
+            days = sorted(holidays.Italy(years=[year]).items())
+            dates = pd.to_datetime([d for d, _ in days])
+            _holidays_by_year[year] = pd.DataFrame({
+                'start': dates,
+                'end': dates,
+                'evento': [name for _, name in days],
+                'tipo': 'Festività',
+                'importanza': 5
+            })
+        return _holidays_by_year[year]
+
+
+class EventCalendar:
+    """
+    Eventi come intervalli [start, end] con IntervalIndex.
+
+    Le ricerche per data usano l'albero di intervalli di pandas (O(log n) per
+    data), anche con eventi sovrapposti e su molti anni.
+    """
+
+    def __init__(self, events: pd.DataFrame, version: str = ""):
+        self.events = events.sort_values(['start', 'importanza'], ascending=[True, False]).reset_index(drop=True)
+        self.version = version
+        self.index = pd.IntervalIndex.from_arrays(self.events['start'], self.events['end'], closed='both')
+
+    def lookup(self, dates: Iterable) -> pd.DataFrame:
+        """
+        Coppie (posizione data, evento) per ogni evento attivo in ciascuna data.
+
+        Returns:
+            DataFrame con colonne pos (posizione in `dates`), date e le colonne evento
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+        if self.events.empty or len(dates) == 0:
+            return pd.DataFrame(columns=['pos', 'date'] + EVENT_COLUMNS)
+        # Un indice per coppia (data, evento), nell'ordine delle date; -1 = nessun evento
+        event_idx, _ = self.index.get_indexer_non_unique(dates)
+        pos = np.repeat(np.arange(len(dates)), self._match_counts(dates))
+        hit = event_idx >= 0
+        out = self.events.iloc[event_idx[hit]].reset_index(drop=True)
+        out.insert(0, 'date', dates[pos[hit]])
+        out.insert(0, 'pos', pos[hit])
+        return out
+
+    def _match_counts(self, dates: pd.DatetimeIndex) -> np.ndarray:
+        """Eventi attivi per data (almeno 1: le date senza eventi occupano uno slot -1)."""
+        starts = np.sort(self.events['start'].to_numpy())
+        ends = np.sort(self.events['end'].to_numpy())
+        values = dates.to_numpy()
+        active = np.searchsorted(starts, values, side='right') - np.searchsorted(ends, values, side='left')
+        return np.maximum(active, 1)
+
+    def daily(self, dates: Iterable) -> pd.DataFrame:
+        """
+        Una riga per data, allineata a `dates`: nomi evento uniti, tipo dell'evento
+        più importante, importanza massima e numero di eventi.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+        out = pd.DataFrame({'evento': pd.Series([None] * len(dates), dtype=object),
+                            'tipo': pd.Series([None] * len(dates), dtype=object),
+                            'importanza': np.nan, 'n_eventi': 0})
+        hits = self.lookup(dates)
+        if hits.empty:
+            return out
+
+        hits = hits.sort_values(['pos', 'importanza'], ascending=[True, False])
+        grouped = hits.groupby('pos')
+        sizes = grouped.size()
+        out.loc[sizes.index, 'n_eventi'] = sizes.to_numpy()
+        out.loc[sizes.index, 'evento'] = grouped['evento'].agg(
+            lambda names: " · ".join(dict.fromkeys(str(n) for n in names if pd.notna(n)))).to_numpy()
+        first = grouped.head(1).set_index('pos')
+        out.loc[first.index, 'tipo'] = first['tipo'].to_numpy()
+        out.loc[first.index, 'importanza'] = first['importanza'].to_numpy()
+        return out
+
+    def in_range(self, start, end) -> pd.DataFrame:
+        """Eventi che si sovrappongono all'intervallo [start, end]."""
+        if self.events.empty:
+            return self.events
+        mask = self.index.overlaps(pd.Interval(pd.Timestamp(start), pd.Timestamp(end), closed='both'))
+        return self.events[mask]
+
+
+def get_event_calendar(url: Optional[str], years: Iterable[int]) -> EventCalendar:
+    """
+    Calendario eventi (feed + festività degli anni richiesti), condiviso dal processo.
+    Si ricostruisce solo se cambia la versione del feed o l'elenco anni.
+    """
+    years = tuple(sorted(set(int(y) for y in years)))
+    content, version = fetch_feed(url) if url else (None, None)
+    version = version or "no-feed"
+
+    def build():
+        parts = [holidays_for_year(y) for y in years]
+        if content is not None:
+            try:
+                parts.append(parse_feed(content))
+            except Exception as e:
+                logger.warning(f"Feed eventi non leggibile: {e}")
+        events = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=EVENT_COLUMNS)
+        return EventCalendar(events, version=version)
+
+    return get_cache().get_or_load(('events', version, years), build)
+
+
+# ==============================================================================
+# UPLIFT EVENTI
+# ==============================================================================
+# Per ogni (tipo, importanza): KPI dei giorni con evento contro la baseline dei
+# giorni senza eventi della stessa cella struttura x anno x stagione x giorno
+# della settimana. Le baseline escono da un bincount per cella, il confronto da
+# un solo groupby sulle coppie (giorno, evento). Solo giorni passati (consuntivo).
+# Il risultato è in cache per versione del feed e generazione dei dati.
+
+SEASON_OF_MONTH = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])   # inverno, primavera, estate, autunno
+SEASON_LABELS = ['Inverno', 'Primavera', 'Estate', 'Autunno']
+UPLIFT_MIN_DAYS = 3
+
+
+def _uplift_frame(years: Tuple[int, ...], structures, today: pd.Timestamp) -> pd.DataFrame:
+    from services import portfolio
+    frames = [portfolio.get_portfolio_data(y, structures) for y in years]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df = df[df['date'] < today]
+    return df[df['rooms'] > 0].reset_index(drop=True)
+
+
+def _build_uplift(calendar: EventCalendar, years: Tuple[int, ...], structures, today: pd.Timestamp) -> pd.DataFrame:
+    df = _uplift_frame(years, structures, today)
+    if df.empty or calendar.events.empty:
+        return pd.DataFrame()
+
+    # Cella di confronto: struttura x anno x stagione x giorno della settimana
+    dates = df['date']
+    year_idx = dates.dt.year.to_numpy() - min(years)
+    cell = (((df['structure'].astype('category').cat.codes.to_numpy(dtype='int64') * len(years) + year_idx) * 4
+             + SEASON_OF_MONTH[dates.dt.month.to_numpy() - 1]) * 7 + dates.dt.dayofweek.to_numpy())
+    n_cells = int(cell.max()) + 1
+
+    # Coppie (riga, evento) con una sola ricerca sulle date distinte
+    unique_dates, date_pos = np.unique(dates.to_numpy(), return_inverse=True)
+    hits = calendar.lookup(unique_dates)[['pos', 'tipo', 'importanza']].drop_duplicates()
+    has_event = np.zeros(len(unique_dates), dtype=bool)
+    has_event[hits['pos'].to_numpy(dtype='int64')] = True
+    event_row = has_event[date_pos]
+
+    # Baseline per cella dai soli giorni senza eventi
+    base = {}
+    for col in ('revenue', 'rooms_sold', 'rooms'):
+        values = df[col].to_numpy(dtype='float64')
+        base[col] = np.bincount(cell[~event_row], weights=values[~event_row], minlength=n_cells)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        base_occ = np.where(base['rooms'] > 0, base['rooms_sold'] / base['rooms'], np.nan)
+        base_revpar = np.where(base['rooms'] > 0, base['revenue'] / base['rooms'], np.nan)
+
+    # Righe evento espanse per coppia: ogni giorno conta per ogni tipo/importanza attivo
+    rows = np.flatnonzero(event_row)
+    order = np.argsort(date_pos[rows], kind='stable')
+    rows = rows[order]
+    starts = np.searchsorted(date_pos[rows], hits['pos'].to_numpy(), side='left')
+    ends = np.searchsorted(date_pos[rows], hits['pos'].to_numpy(), side='right')
+    counts = ends - starts
+    pair = np.repeat(np.arange(len(hits)), counts)
+    # Indici [start, end) di ogni coppia concatenati senza cicli Python
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    take = rows[np.repeat(starts, counts) + within]
+
+    matched = cell[take]
+    rooms = df['rooms'].to_numpy(dtype='float64')[take]
+    pairs = pd.DataFrame({
+        'tipo': hits['tipo'].to_numpy()[pair],
+        'importanza': hits['importanza'].to_numpy()[pair],
+        'date': dates.to_numpy()[take],
+        'revenue': df['revenue'].to_numpy(dtype='float64')[take],
+        'rooms_sold': df['rooms_sold'].to_numpy(dtype='float64')[take],
+        'rooms': rooms,
+        'exp_sold': rooms * base_occ[matched],
+        'exp_revenue': rooms * base_revpar[matched]
+    }).dropna(subset=['exp_sold'])
+    if pairs.empty:
+        return pd.DataFrame()
+
+    out = pairs.groupby(['tipo', 'importanza']).agg(
+        giorni=('date', 'nunique'), revenue=('revenue', 'sum'), rooms_sold=('rooms_sold', 'sum'),
+        rooms=('rooms', 'sum'), exp_sold=('exp_sold', 'sum'), exp_revenue=('exp_revenue', 'sum')
+    ).reset_index()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['occ_event'] = out['rooms_sold'] / out['rooms'] * 100
+        out['occ_base'] = out['exp_sold'] / out['rooms'] * 100
+        out['adr_event'] = np.where(out['rooms_sold'] > 0, out['revenue'] / out['rooms_sold'], 0.0)
+        out['adr_base'] = np.where(out['exp_sold'] > 0, out['exp_revenue'] / out['exp_sold'], 0.0)
+        out['revpar_event'] = out['revenue'] / out['rooms']
+        out['revpar_base'] = out['exp_revenue'] / out['rooms']
+        out['uplift_occ_pts'] = out['occ_event'] - out['occ_base']
+        out['uplift_adr_pct'] = np.where(out['adr_base'] > 0, (out['adr_event'] / out['adr_base'] - 1) * 100, np.nan)
+        out['uplift_revpar_pct'] = np.where(out['revpar_base'] > 0, (out['revpar_event'] / out['revpar_base'] - 1) * 100, np.nan)
+
+    out = out[out['giorni'] >= UPLIFT_MIN_DAYS]
+    return out.drop(columns=['exp_sold', 'exp_revenue']).sort_values(
+        ['importanza', 'uplift_revpar_pct'], ascending=[False, False]).reset_index(drop=True)
+
+
+def get_event_uplift(calendar: EventCalendar, years: Iterable[int], structures: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Uplift di occupazione, ADR e RevPAR per tipo e importanza evento.
+
+    Args:
+        calendar: Calendario eventi (get_event_calendar) che copre gli anni richiesti
+        years: Anni storici da analizzare
+        structures: Etichette struttura (default: tutte)
+
+    Returns:
+        DataFrame con colonne tipo, importanza, giorni, revenue, rooms_sold, rooms,
+        occ_event, occ_base, adr_event, adr_base, revpar_event, revpar_base,
+        uplift_occ_pts, uplift_adr_pct, uplift_revpar_pct
+    """
+    from services import portfolio
+    years = tuple(sorted(set(int(y) for y in years)))
+    structures = list(structures) if structures is not None else None
+    data_keys = tuple(portfolio.get_portfolio_key(y, structures) for y in years)
+    # Solo giorni passati: la data odierna è nella chiave, il risultato si rinnova ogni giorno
+    today = pd.Timestamp.today().normalize()
+    key = ('event_uplift', calendar.version, years, data_keys, today)
+    return get_cache().get_or_load(key, lambda: _build_uplift(calendar, years, structures, today))
@@ -0,0 +1,266 @@
+import io
+import re
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, Optional
+import logging
+
+from services import forecast_manager, portfolio, reports
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# EXPORT TABELLE (XLSX / CSV / PARQUET IN STREAMING)
+# ==============================================================================
+# Le tabelle esportabili sono quelle dei report (services/reports.py), con le
+# stesse specifiche {colonna: (etichetta, formato printf)} usate a video.
+# Il formato printf diventa un formato numerico Excel (i delta con il colore
+# nel formato stesso, verde/rosso), quindi non serve una copia stilizzata del
+# frame: le righe si scrivono così come sono.
+#
+# Gli export multi-struttura / multi-anno procedono a blocchi struttura-anno:
+# ogni blocco viene caricato (dalla cache dataset), scritto e rilasciato.
+#   xlsx    -> openpyxl in modalità write-only (righe su file temporaneo)
+#   csv     -> un to_csv per blocco, intestazione solo sul primo
+#   parquet -> un row group per blocco
+
+EXPORT_TABLES = {
+    'monthly_grid': reports.MONTHLY_GRID_COLUMNS,
+    'daily_detail': reports.DAILY_DETAIL_COLUMNS,
+    'pickup_movers': reports.PICKUP_MOVERS_COLUMNS,
+    'budget_comparison': reports.BUDGET_COMPARISON_COLUMNS
+}
+EXPORT_TITLES = {
+    'monthly_grid': "Griglia Mesi",
+    'daily_detail': "Dettaglio Giornaliero",
+    'pickup_movers': "Pickup",
+    'budget_comparison': "Budget vs OTB"
+}
+EXPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+KEY_COLUMNS = {'Struttura': ('Struttura', None), 'Anno': ('Anno', None)}
+EXPORT_WORKERS = 4
+
+_PRINTF = re.compile(r'^(?P<prefix>.*?)%(?P<flags>[+,]*)(?:\.(?P<decimals>\d+))?[fd](?P<suffix>.*)$')
+
+
+def excel_format(fmt: Optional[str], delta: bool = False) -> str:
+    """
+    Formato numerico Excel equivalente a un formato printf del column_config.
+
+    Args:
+        fmt: Formato printf (es. '€ %.0f', '%+.2f pp', '%.2f%%'); None per il testo
+        delta: Colora positivi in verde e negativi in rosso
+
+    Returns:
+        Codice formato Excel (es. '"€ "#,##0', '[Color10]+#,##0.00" pp";[Red]-#,##0.00" pp";#,##0.00" pp"')
+    """
+    if fmt is None:
+        return 'General'
+    match = _PRINTF.match(fmt)
+    if not match:
+        return 'General'
+
+    def literal(text):
+        text = text.replace('%%', '%').replace('"', '')
+        return f'"{text}"' if text else ''
+
+    decimals = int(match['decimals'] or 0)
+    body = '#,##0' + ('.' + '0' * decimals if decimals else '')
+    prefix, suffix = literal(match['prefix']), literal(match['suffix'])
+    if '+' not in match['flags'] and not delta:
+        return f"{prefix}{body}{suffix}"
+
+    sign = '+' if '+' in match['flags'] else ''
+    positive = f"{prefix}{sign}{body}{suffix}"
+    negative = f"{prefix}-{body}{suffix}"
+    zero = f"{prefix}{body}{suffix}"
+    if delta:
+        positive, negative = f"[Color10]{positive}", f"[Red]{negative}"
+    return f"{positive};{negative};{zero}"
+
+
+def _table_chunk(table: str, structure: str, year: int) -> pd.DataFrame:
+    """Una tabella per struttura-anno, con le colonne chiave Struttura e Anno in testa."""
+    if table == 'monthly_grid':
+        df = reports.monthly_grid(structure, year)
+    elif table == 'daily_detail':
+        if structure == portfolio.PORTFOLIO_LABEL:
+            df = reports.daily_detail(portfolio.get_portfolio_daily(year))
+        else:
+            df = reports.daily_detail(forecast_manager.get_consolidated_data(structure, year)[0])
+    elif table == 'pickup_movers':
+        files = reports.default_pickup_files(structure, year)
+        pickup = forecast_manager.get_pickup_data(structure, year, *files) if files else pd.DataFrame()
+        df = reports.pickup_movers(pickup, top=None)
+    else:
+        df = reports.budget_comparison(structure, year)
+    if df.empty:
+        return df
+    return df.assign(Struttura=structure, Anno=year)
+
+
+def iter_table(table: str, structures: Iterable[str], years: Iterable[int],
+               workers: int = EXPORT_WORKERS) -> Iterator[pd.DataFrame]:
+    """
+    Blocchi struttura-anno di una tabella, nell'ordine strutture x anni.
+
+    I blocchi si preparano in parallelo su pochi thread (map pigro: al massimo
+    qualche blocco in memoria oltre a quello in scrittura).
+
+    Raises:
+        ValueError: se la tabella non è esportabile
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Tabella sconosciuta: {table} (ammesse: {', '.join(EXPORT_TABLES)})")
+    cells = [(s, y) for s in structures for y in years]
+    if not cells:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(cells)))) as pool:
+        yield from pool.map(lambda cell: _table_chunk(table, *cell), cells)
+
+
+def _columns(spec: Dict, df: Optional[pd.DataFrame] = None, keys: bool = True) -> Dict:
+    """Specifica completa (colonne chiave + tabella), ristretta alle colonne di `df` se passato."""
+    full = {**(KEY_COLUMNS if keys else {}), **spec}
+    if df is None:
+        return full
+    return {c: v for c, v in full.items() if c in df.columns}
+
+
+def write_csv(chunks: Iterable[pd.DataFrame], sink, columns: Dict) -> int:
+    """
+    CSV con le etichette a video come intestazione e valori numerici grezzi
+    (il CSV non ha formati: i numeri restano leggibili da altri strumenti).
+
+    Returns:
+        Righe scritte
+    """
+    rows, first = 0, True
+    for df in chunks:
+        if df.empty:
+            continue
+        out = df.reindex(columns=list(columns))
+        text = out.to_csv(index=False, header=[label for label, _ in columns.values()] if first else False)
+        sink.write(text.encode('utf-8-sig' if first else 'utf-8'))
+        rows += len(out)
+        first = False
+    return rows
+
+
+def write_parquet(chunks: Iterable[pd.DataFrame], sink, columns: Dict) -> int:
+    """Parquet con un row group per blocco (schema del primo blocco). Returns: righe scritte."""
+    import pyarrow as pa  # import differito: serve solo all'export parquet
+    import pyarrow.parquet as pq
+
+    writer, rows = None, 0
+    try:
+        for df in chunks:
+            if df.empty:
+                continue
+            out = df.reindex(columns=list(columns)).rename(columns={c: label for c, (label, _) in columns.items()})
+            if writer is None:
+                table = pa.Table.from_pandas(out, preserve_index=False)
+                writer = pq.ParquetWriter(sink, table.schema, compression='zstd')
+            else:
+                table = pa.Table.from_pandas(out, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(out)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_xlsx(chunks: Iterable[pd.DataFrame], sink, columns: Dict, title: str = "Export") -> int:
+    """
+    Foglio Excel in modalità write-only (memoria costante): intestazione in
+    grassetto e fissata, formati numerici da excel_format, una cella per valore.
+
+    Returns:
+        Righe scritte
+    """
+    from openpyxl import Workbook  # import differito: serve solo all'export xlsx
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title[:31])
+    ws.freeze_panes = 'A2'
+    names = list(columns)
+    formats = [excel_format(fmt, delta=c in reports.DELTA_COLUMNS) for c, (_, fmt) in columns.items()]
+    for i, (label, _) in enumerate(columns.values(), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = max(12, len(label) + 4)
+
+    bold = Font(bold=True)
+    header = []
+    for label, _ in columns.values():
+        cell = WriteOnlyCell(ws, value=label)
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+
+    rows = 0
+    for df in chunks:
+        if df.empty:
+            continue
+        # Valori colonna per colonna (tipi Python, NaN -> cella vuota)
+        values = [df[c].astype(object).where(df[c].notna(), None).tolist() if c in df.columns else [None] * len(df)
+                  for c in names]
+        for row in zip(*values):
+            cells = []
+            for value, number_format in zip(row, formats):
+                cell = WriteOnlyCell(ws, value=value)
+                if number_format != 'General' and value is not None:
+                    cell.number_format = number_format
+                cells.append(cell)
+            ws.append(cells)
+        rows += len(df)
+
+    wb.save(sink)
+    return rows
+
+
+def _write(chunks: Iterable[pd.DataFrame], sink, columns: Dict, fmt: str, title: str) -> int:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato sconosciuto: {fmt} (ammessi: {', '.join(EXPORT_FORMATS)})")
+    if fmt == 'xlsx':
+        return write_xlsx(chunks, sink, columns, title)
+    if fmt == 'parquet':
+        return write_parquet(chunks, sink, columns)
+    return write_csv(chunks, sink, columns)
+
+
+def export_table(table: str, structures: Iterable[str], years: Iterable[int], sink, fmt: str = 'xlsx') -> int:
+    """
+    Esporta una tabella per più strutture e anni in streaming su un file binario.
+
+    Args:
+        table: Una delle chiavi di EXPORT_TABLES
+        structures: Etichette struttura (anche PORTFOLIO_LABEL per le tabelle giornaliere e mensili)
+        years: Anni
+        sink: File binario di destinazione
+        fmt: 'xlsx', 'csv' o 'parquet'
+
+    Returns:
+        Righe scritte
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Tabella sconosciuta: {table} (ammesse: {', '.join(EXPORT_TABLES)})")
+    structures, years = list(structures), [int(y) for y in years]
+    rows = _write(iter_table(table, structures, years), sink, _columns(EXPORT_TABLES[table]), fmt, EXPORT_TITLES[table])
+    logger.info(f"Export {table} ({fmt}): {rows} righe, {len(structures)} strutture x {len(years)} anni")
+    return rows
+
+
+def table_bytes(df: pd.DataFrame, spec: Dict, fmt: str = 'xlsx', title: str = "Export") -> bytes:
+    """Una tabella già calcolata (quella mostrata a video) come file xlsx/csv/parquet in memoria."""
+    buffer = io.BytesIO()
+    _write([df], buffer, _columns(spec, df, keys=False), fmt, title)
+    return buffer.getvalue()
@@ -1,10 +1,18 @@
-import streamlit as st
 import pandas as pd
+import numpy as np
 import requests
 import io
 import datetime
 import time
 import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from services.schema import compact_dataset, measure_compaction
+from services.dataset_cache import get_cache, get_generations
+from services import calendar_dim, rollups
+from services.kpi_engine import add_kpi_ratios
+
+logger = logging.getLogger(__name__)
 
 BASE_URL = "https://ihosp-kross-archive.sfo3.digitaloceanspaces.com"
 
@@ -19,6 +27,22 @@ STRUCTURE_MAP = {
 
 CURRENT_SYSTEM_YEAR = datetime.datetime.now().year
 
+def get_structure_folder(name):
+    """
+    Cartella S3 di una struttura: da etichetta o alias via STRUCTURE_MAP, oppure
+    dal nome breve delle pagine budget ("La Terrazza" -> "La_Terrazza").
+    """
+    return STRUCTURE_MAP.get(name, name.replace(" ", "_"))
+
+def get_structure_labels():
+    """Una etichetta per cartella (STRUCTURE_MAP contiene alias della stessa struttura)."""
+    seen, labels = set(), []
+    for label, folder in STRUCTURE_MAP.items():
+        if folder not in seen:
+            seen.add(folder)
+            labels.append(label)
+    return labels
+
 # --- FUNZIONI DI UTILITÀ BASE ---
 def clean_italian_number(value):
     if pd.isna(value) or str(value).strip() == "": return 0.0
@@ -58,89 +82,293 @@ def normalize_forecast_df(df):
         if c in df.columns: df[c] = df[c].apply(clean_italian_number)
     return df
 
+def parse_excel_bytes(content, name=""):
+    """Parsa un export Kross (bytes) nello schema compatto. Usato da download e ingest."""
+    df = pd.read_excel(io.BytesIO(content), engine='openpyxl', dtype=object)
+    df = normalize_forecast_df(df)
+    # Schema compatto: è questo il frame che resta in cache
+    df_compact = compact_dataset(df)
+    stats = measure_compaction(df, df_compact)
+    logger.info(f"Snapshot compattato {name}: "
+                f"{stats['bytes_before']} -> {stats['bytes_after']} bytes ({stats['rows']} righe)")
+    return df_compact
+
 def load_excel_from_url(url):
     try:
         resp = requests.get(url)
         if resp.status_code != 200: return pd.DataFrame()
-        df = pd.read_excel(io.BytesIO(resp.content), engine='openpyxl', dtype=object)
-        return normalize_forecast_df(df)
+        return parse_excel_bytes(resp.content, name=url.split('/')[-1].split('?')[0])
     except: return pd.DataFrame()
 
-# --- MOTORE PER OVERVIEW E DETTAGLIO ---
-@st.cache_data(ttl=60)
-def get_consolidated_data(structure_label, year, force_italian_date=True):
+# --- INDICI, GENERAZIONI E SNAPSHOT IN CACHE ---
+# L'indice remoto viene ricontrollato ogni INDEX_REVALIDATE secondi: rileggerlo
+# non invalida nulla, solo un cambio del suo contenuto fa avanzare la generazione
+# del dataset (cartella, struttura, anno). Tutti gli artefatti (snapshot,
+# consolidati, tabelle mensili, pickup, pace) hanno la generazione nella chiave
+# e non scadono per tempo.
+INDEX_REVALIDATE = 60
+INDEX_TIMEOUT = 10
+
+def get_base_folder(year):
+    return "Forecast" if year == CURRENT_SYSTEM_YEAR else "History_Baseline"
+
+def _structure_dataset(structure_label, year):
     folder_name = STRUCTURE_MAP.get(structure_label)
-    if not folder_name: return pd.DataFrame(), None
+    if not folder_name: return None
+    return (get_base_folder(year), folder_name, year)
+
+def _fetch_index(base_folder, folder_name, year):
+    """Indice remoto (più recente prima); None se la lettura fallisce (rete, timeout, stato != 200)."""
+    ts = int(time.time())
+    url = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/index.json?ts={ts}"
+    try:
+        resp = requests.get(url, timeout=INDEX_TIMEOUT)
+        if resp.status_code == 200:
+            return sorted(resp.json(), reverse=True)
+        logger.warning(f"Indice {base_folder}/{folder_name}/{year} non letto: HTTP {resp.status_code}")
+    except Exception as e:
+        logger.warning(f"Indice {base_folder}/{folder_name}/{year} non letto: {e}")
+    return None
+
+def _evict_old_generations(dataset, generation):
+    """Libera gli artefatti delle generazioni superate di un dataset."""
+    get_cache().invalidate(
+        lambda k: isinstance(k, tuple) and len(k) > 2 and k[0] != 'index'
+        and k[1] == dataset and k[2] < generation
+    )
+
+def _load_index(dataset):
+    """
+    Legge l'indice e aggiorna la generazione. Se la lettura fallisce si tengono
+    i file già noti (e la generazione resta com'è): un errore di rete non deve
+    far sembrare cambiato l'indice.
+    """
+    files = _fetch_index(*dataset)
+    if files is None:
+        return get_cache().peek(('index', dataset), default=[])
+    generation, changed = get_generations().observe(dataset, tuple(files))
+    if changed:
+        logger.info(f"Indice cambiato per {dataset}: generazione {generation}")
+        _evict_old_generations(dataset, generation)
+    return files
+
+def _read_index(dataset, refresh=False):
+    key = ('index', dataset)
+    loader = lambda: _load_index(dataset)
+    if refresh:
+        get_cache().put(key, loader())
+    files = get_cache().get_or_load(key, loader, ttl=INDEX_REVALIDATE)
+    return list(files), get_generations().current(dataset)
+
+def get_index_files(structure_label, year, refresh=False):
+    """
+    Lista file dell'indice (ordinata per nome decrescente = più recente prima).
+    Con refresh=True l'indice viene riletto subito (usato dal warmup).
+    """
+    dataset = _structure_dataset(structure_label, year)
+    if not dataset: return []
+    return _read_index(dataset, refresh=refresh)[0]
+
+def get_generation(structure_label, year, refresh=False):
+    """Generazione corrente del dataset struttura-anno (0 finché l'indice non cambia)."""
+    dataset = _structure_dataset(structure_label, year)
+    if not dataset: return 0
+    return _read_index(dataset, refresh=refresh)[1]
+
+def get_folder_generation(base_folder, folder_name, year, refresh=False):
+    """Come get_generation, per una cartella esplicita (es. Forecast/<Struttura>/<Anno>)."""
+    return _read_index((base_folder, folder_name, year), refresh=refresh)[1]
+
+def bump_generation(base_folder, folder_name, year):
+    """
+    Da chiamare dopo un upload: avanza subito la generazione del dataset e forza
+    la rilettura dell'indice, senza aspettare INDEX_REVALIDATE.
+    """
+    dataset = (base_folder, folder_name, year)
+    generation = get_generations().bump(dataset)
+    get_cache().invalidate(lambda k: k == ('index', dataset))
+    _evict_old_generations(dataset, generation)
+    return generation
+
+def bump_folder_generations(base_folder, folder_name, year):
+    """
+    Da chiamare dopo una modifica a una cartella (upload, cancellazione, rollup):
+    avanza la generazione della cartella modificata e, se diverso, del dataset che
+    questo modulo legge per la struttura in quell'anno (get_base_folder(year)).
+    """
+    year = int(year)
+    for base in dict.fromkeys([base_folder, get_base_folder(year)]):
+        bump_generation(base, folder_name, year)
+
+def load_snapshot(structure_label, year, filename):
+    """
+    Snapshot parsato e compattato, scaricato una sola volta per generazione.
+    Un download fallito (frame vuoto) resta in cache solo EMPTY_TTL secondi.
+    """
+    dataset = _structure_dataset(structure_label, year)
+    if not dataset or not filename: return pd.DataFrame()
+    _, generation = _read_index(dataset)
+    base_folder, folder_name, _ = dataset
+    url = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/{filename}?ts={int(time.time())}"
+    key = ('snapshot', dataset, generation, filename)
+    return get_cache().get_or_load(key, lambda: load_excel_from_url(url))
+
+def get_previous_snapshot(structure_label, year):
+    """Snapshot precedente all'ultimo (secondo file dell'indice), dalla cache; vuoto se non c'è."""
+    files = get_index_files(structure_label, year)
+    if len(files) < 2: return pd.DataFrame()
+    return load_snapshot(structure_label, year, files[1])
+
+# --- ROLLUP MENSILI / SETTIMANALI (vedi services/rollups.py) ---
+def _fetch_rollup_store(base_folder, folder_name, year):
     ts = int(time.time())
-    
-    # Logica cartelle
-    if year == CURRENT_SYSTEM_YEAR:
-        base_folder = "Forecast"
-        source_label = "Live Forecast"
-    else:
-        base_folder = "History_Baseline"
-        source_label = "History Archive"
-        
     try:
-        url_idx = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/index.json?ts={ts}"
-        resp = requests.get(url_idx)
+        resp = requests.get(f"{BASE_URL}/{base_folder}/{folder_name}/{year}/{rollups.ROLLUP_STORE_NAME}?ts={ts}")
         if resp.status_code == 200:
-            files = resp.json()
-            if files:
-                # Ordina file per nome decrescente (presumendo che contengano date)
-                files.sort(reverse=True)
-                chosen_file = files[0]
-                url_file = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/{chosen_file}?ts={ts}"
-                df = load_excel_from_url(url_file)
-                if not df.empty:
-                    df = df[df['date'].dt.year == year]
-                    return df, {'source': source_label, 'file': chosen_file}
+            return resp.json()
     except: pass
-    return pd.DataFrame(), None
+    return {}
+
+def get_rollup(base_folder, folder_name, year, filename=None):
+    """
+    Rollup (somme mensili e per giorno della settimana) di uno snapshot.
+    Senza filename si usa l'ultimo snapshot dell'indice. Se lo snapshot è
+    precedente all'archivio rollup, il rollup viene calcolato dai dati
+    giornalieri una volta per generazione.
+    """
+    dataset = (base_folder, folder_name, year)
+    files, generation = _read_index(dataset)
+    filename = filename or (files[0] if files else None)
+    if not filename: return None
+
+    store = get_cache().get_or_load(('rollups', dataset, generation),
+                                    lambda: _fetch_rollup_store(base_folder, folder_name, year))
+    if filename in store:
+        return store[filename]
+
+    def build():
+        url = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/{filename}?ts={int(time.time())}"
+        df = get_cache().get_or_load(('snapshot', dataset, generation, filename), lambda: load_excel_from_url(url))
+        # Snapshot non scaricato: nessun rollup (non memorizzato, si riprova al prossimo accesso)
+        return rollups.build_rollup(df, year) if not df.empty else None
+
+    return get_cache().derive(('rollups', dataset, generation), filename, build)
+
+def get_rollup_history(base_folder, folder_name, year):
+    """
+    Revenue mensile degli snapshot datati della cartella, dal più vecchio, letta
+    solo dall'archivio rollup (nessun download dei file giornalieri).
+    Gli snapshot senza rollup archiviato sono esclusi e contati in 'missing':
+    si ricostruiscono una volta da 99 - Ispettore ("Ricostruisci rollup").
+    Calcolata una volta per generazione.
+
+    Returns:
+        Dict con 'dates' (datetime64), 'files', 'revenue' (array snapshot x 12) e 'missing'
+    """
+    dataset = (base_folder, folder_name, year)
+    files, generation = _read_index(dataset)
+    store_key = ('rollups', dataset, generation)
+    store = get_cache().get_or_load(store_key, lambda: _fetch_rollup_store(base_folder, folder_name, year))
+
+    def build():
+        dated = sorted((d, f) for f in files for d in [parse_snapshot_date(f)] if d is not None)
+        stored = [(d, f) for d, f in dated if f in store]
+        return {
+            'dates': np.array([d for d, _ in stored], dtype='datetime64[D]'),
+            'files': [f for _, f in stored],
+            'revenue': np.array([store[f]['month']['revenue'] for _, f in stored], dtype='float64').reshape(-1, 12),
+            'missing': len(dated) - len(stored)
+        }
+
+    return get_cache().derive(store_key, '__history__', build)
+
+def get_structure_rollup(structure_label, year, filename=None):
+    """Come get_rollup, a partire dall'etichetta struttura (cartella scelta per anno)."""
+    dataset = _structure_dataset(structure_label, year)
+    if not dataset: return None
+    return get_rollup(*dataset, filename=filename)
+
+# --- MOTORE PER OVERVIEW E DETTAGLIO ---
+def _consolidated_key(structure_label, year):
+    dataset = _structure_dataset(structure_label, year)
+    if not dataset: return None, None
+    files, generation = _read_index(dataset)
+    return ('consolidated', dataset, generation), (files[0] if files else None)
+
+def get_consolidated_data(structure_label, year, force_italian_date=True):
+    """
+    Dataset consolidato (ultimo snapshot) per struttura e anno.
+    Il frame è condiviso tra tutte le sessioni: le pagine non devono aggiungervi
+    colonne in place, i derivati stanno in get_monthly_summary & co.
+    """
+    key, chosen_file = _consolidated_key(structure_label, year)
+    if not key: return pd.DataFrame(), None
+    return get_cache().get_or_load(key, lambda: _load_consolidated(structure_label, year, chosen_file))
+
+def get_monthly_summary(structure_label, year):
+    """
+    Somme mensili del dataset consolidato lette dal rollup dell'ultimo snapshot
+    (nessun accesso ai dati giornalieri).
+    Colonne: MeseNum, Mese, revenue, rooms_sold, rooms, days, adr, occupancy_pct, revpar
+    """
+    return rollups.rollup_frame(get_structure_rollup(structure_label, year), 'month')
+
+def get_weekday_summary(structure_label, year):
+    """Somme per giorno della settimana (GiornoIdx 0=Lunedì) dal rollup dell'ultimo snapshot."""
+    return rollups.rollup_frame(get_structure_rollup(structure_label, year), 'dow')
+
+def _load_consolidated(structure_label, year, chosen_file):
+    if not chosen_file: return pd.DataFrame(), None
+    source_label = "Live Forecast" if year == CURRENT_SYSTEM_YEAR else "History Archive"
+    df = load_snapshot(structure_label, year, chosen_file)
+    if df.empty: return pd.DataFrame(), None
+    df = df[df['date'].dt.year == year].reset_index(drop=True)
+    return df, {'source': source_label, 'file': chosen_file}
 
 # ==============================================================================
 # FUNZIONI SPECIFICHE PER PICKUP (PARSING DATE DDMMYYYY)
 # ==============================================================================
 
+def parse_snapshot_date(filename):
+    """
+    Data di snapshot dal nome file.
+    Formati: *_Snapshot_YYYYMMDD.xlsx (upload da Carica Dati),
+    Nome_Forecast_DDMMYYYY_DDMMYYYY.xlsx (export Kross, prima data = scatto), ISO YYYY-MM-DD.
+    """
+    match = re.search(r'_Snapshot_(\d{8})', filename)
+    if match:
+        try: return datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+        except: pass
+
+    # Regex per cercare pattern DDMMYYYY (8 cifre consecutive)
+    # Esempio: Terrazza_Forecast_08022025_... -> Trova 08022025
+    match = re.findall(r'(\d{8})', filename)
+    if match:
+        for fmt in ("%d%m%Y", "%Y%m%d"):
+            try: return datetime.datetime.strptime(match[0], fmt).date()
+            except: pass
+
+    # Se il regex fallisce, proviamo a vedere se è una data ISO
+    match_iso = re.search(r'(\d{4}-\d{2}-\d{2})', filename)
+    if match_iso:
+        try: return datetime.datetime.strptime(match_iso.group(1), "%Y-%m-%d").date()
+        except: pass
+    return None
+
 def get_available_snapshots(structure_label, year):
     """
     Recupera i file e parsa la data dal nome file formato: Nome_Forecast_DDMMYYYY_DDMMYYYY.xlsx
     La prima data è quella di 'scatto' (Snapshot Date).
     """
-    folder_name = STRUCTURE_MAP.get(structure_label)
-    if not folder_name: return pd.DataFrame()
-    ts = int(time.time())
-    
-    if year == CURRENT_SYSTEM_YEAR: base_folder = "Forecast"
-    else: base_folder = "History_Baseline"
+    if not STRUCTURE_MAP.get(structure_label): return pd.DataFrame()
 
     try:
-        url_idx = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/index.json?ts={ts}"
-        resp = requests.get(url_idx)
-        
-        if resp.status_code == 200:
-            files = resp.json()
+        files = get_index_files(structure_label, year)
+        if files:
             snapshot_list = []
             
             for f in files:
-                # Regex per cercare pattern DDMMYYYY (8 cifre consecutive)
-                # Esempio: Terrazza_Forecast_08022025_... -> Trova 08022025
-                match = re.findall(r'(\d{8})', f)
-                
-                snap_date = None
-                if match and len(match) >= 1:
-                    try:
-                        # Prendiamo la prima data trovata come data di snapshot
-                        date_str = match[0]
-                        snap_date = datetime.datetime.strptime(date_str, "%d%m%Y").date()
-                    except: pass
-                
-                # Se il regex fallisce, proviamo a vedere se è una data ISO
-                if not snap_date:
-                     match_iso = re.search(r'(\d{4}-\d{2}-\d{2})', f)
-                     if match_iso:
-                         try: snap_date = datetime.datetime.strptime(match_iso.group(1), "%Y-%m-%d").date()
-                         except: pass
+                snap_date = parse_snapshot_date(f)
 
                 if snap_date:
                     snapshot_list.append({
@@ -160,18 +388,17 @@ def get_available_snapshots(structure_label, year):
 def get_pickup_data(structure_label, year, file_recent, file_old):
     """
     Scarica due file, li unisce e calcola i delta per tutti i KPI.
+    La tabella è in cache per generazione del dataset.
     """
-    folder_name = STRUCTURE_MAP.get(structure_label)
-    ts = int(time.time())
-    
-    if year == CURRENT_SYSTEM_YEAR: base_folder = "Forecast"
-    else: base_folder = "History_Baseline"
-        
-    url_recent = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/{file_recent}?ts={ts}"
-    url_old = f"{BASE_URL}/{base_folder}/{folder_name}/{year}/{file_old}?ts={ts}"
-    
-    df_curr = load_excel_from_url(url_recent)
-    df_prev = load_excel_from_url(url_old)
+    dataset = _structure_dataset(structure_label, year)
+    if not dataset: return pd.DataFrame()
+    _, generation = _read_index(dataset)
+    key = ('pickup', dataset, generation, file_recent, file_old)
+    return get_cache().get_or_load(key, lambda: _build_pickup(structure_label, year, file_recent, file_old))
+
+def _build_pickup(structure_label, year, file_recent, file_old):
+    df_curr = load_snapshot(structure_label, year, file_recent)
+    df_prev = load_snapshot(structure_label, year, file_old)
     
     if df_curr.empty or df_prev.empty: return pd.DataFrame()
         
@@ -208,11 +435,20 @@ def get_pickup_data(structure_label, year, file_recent, file_old):
 # FUNZIONI PER PACE ANALYSIS (STESSO GIORNO ANNO SCORSO)
 # ==============================================================================
 
-def get_pace_data(structure_label, target_year):
+def get_pace_data(structure_label, target_year, align=calendar_dim.DEFAULT_LY_MODE):
     """
     Recupera l'ultimo snapshot disponibile per l'anno target e 
-    tenta di recuperare lo snapshot 'gemello' di 52 settimane fa.
+    tenta di recuperare lo snapshot 'gemello' dell'anno scorso.
+    align: 'settimana' (52 settimane fa) o 'calendario' (stessa data), come calendar_dim.LY_MODES.
+    Il risultato è in cache per generazione del dataset e allineamento.
     """
+    dataset = _structure_dataset(structure_label, target_year)
+    if not dataset: return pd.DataFrame(), None, None
+    _, generation = _read_index(dataset)
+    key = ('pace', dataset, generation, align)
+    return get_cache().get_or_load(key, lambda: _build_pace(structure_label, target_year, align))
+
+def _build_pace(structure_label, target_year, align):
     df_snaps = get_available_snapshots(structure_label, target_year)
     if df_snaps.empty or len(df_snaps) < 1:
         return pd.DataFrame(), None, None
@@ -222,9 +458,9 @@ def get_pace_data(structure_label, target_year):
     date_recent = latest_snap['date']
     file_recent = latest_snap['filename']
     
-    # 2. Snapshot STORICO (Target: -52 settimane / 364 giorni)
-    # Usiamo 364 perché è divisibile per 7 (stesso giorno della settimana)
-    target_past_date = date_recent - datetime.timedelta(days=364)
+    # 2. Snapshot STORICO: data LY dall'indice di allineamento
+    # ('settimana' = 364 giorni, stesso giorno della settimana; 'calendario' = stessa data)
+    target_past_date = pd.Timestamp(calendar_dim.ly_dates([date_recent], align)[0]).date()
     
     # Cerchiamo il file che si avvicina di più a quella data
     df_snaps['diff'] = (df_snaps['date'] - target_past_date).abs()
@@ -246,8 +482,8 @@ def get_pace_data(structure_label, target_year):
         is_exact_pace = True
 
     # Caricamento dati
-    df_curr = load_excel_from_url(f"{BASE_URL}/{'Forecast' if target_year == CURRENT_SYSTEM_YEAR else 'History_Baseline'}/{STRUCTURE_MAP[structure_label]}/{target_year}/{file_recent}")
-    df_prev = load_excel_from_url(f"{BASE_URL}/{'Forecast' if target_year == CURRENT_SYSTEM_YEAR else 'History_Baseline'}/{STRUCTURE_MAP[structure_label]}/{target_year}/{file_old}")
+    df_curr = load_snapshot(structure_label, target_year, file_recent)
+    df_prev = load_snapshot(structure_label, target_year, file_old)
 
     if df_curr.empty: return pd.DataFrame(), None, None
 
@@ -266,7 +502,82 @@ def get_pace_data(structure_label, target_year):
     meta = {
         'date_recent': date_recent,
         'date_old': date_old,
+        'file_recent': file_recent,
+        'file_old': file_old,
         'is_exact_pace': is_exact_pace
     }
 
-    return df_pace, meta, df_curr
\ No newline at end of file
+    return df_pace, meta, df_curr
+
+# ==============================================================================
+# STORICO MULTI-ANNO (SERIE GIORNALIERA CONTIGUA)
+# ==============================================================================
+# Gli anni sono caricati in parallelo, ognuno dalla sua voce di cache (quindi
+# un workbook già letto non si riparsa). La serie unita copre ogni giorno
+# dell'intervallo: i giorni senza dati restano NaN, così i buchi sono visibili.
+
+HISTORY_WORKERS = 6
+HISTORY_COLUMNS = ['revenue', 'rooms_sold', 'rooms']
+HISTORY_FIRST_YEAR = 2020
+
+def get_available_years(structures=None, first_year=HISTORY_FIRST_YEAR, last_year=None):
+    """
+    Anni con almeno uno snapshot nell'indice (per le strutture indicate, default tutte).
+    Gli indici si leggono in parallelo dalla cache (rivalidati ogni INDEX_REVALIDATE secondi).
+
+    Returns:
+        Lista di anni crescente
+    """
+    last_year = last_year or CURRENT_SYSTEM_YEAR
+    structures = list(structures or get_structure_labels())
+    cells = [(s, y) for y in range(first_year, last_year + 1) for s in structures]
+    with ThreadPoolExecutor(max_workers=max(1, min(HISTORY_WORKERS, len(cells)))) as pool:
+        found = list(pool.map(lambda cell: bool(get_index_files(*cell)), cells))
+    return sorted({y for (_, y), ok in zip(cells, found) if ok})
+
+
+def get_history_span(structure_label, years):
+    """
+    Serie giornaliera di più anni per una struttura, da una sola chiamata.
+
+    Args:
+        structure_label: Etichetta struttura
+        years: Anni da includere (es. range(2021, 2027))
+
+    Returns:
+        DataFrame con colonne date, year (int16), revenue, rooms_sold, rooms,
+        adr, occupancy_pct, revpar (float32; NaN nei giorni senza dati)
+    """
+    years = sorted(set(int(y) for y in years))
+    if not years or not STRUCTURE_MAP.get(structure_label): return pd.DataFrame()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(HISTORY_WORKERS, len(years)))) as pool:
+        generations = list(pool.map(lambda y: get_generation(structure_label, y), years))
+    key = ('history_span', structure_label, tuple(zip(years, generations)))
+    return get_cache().get_or_load(key, lambda: _build_history_span(structure_label, years))
+
+def _build_history_span(structure_label, years):
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(HISTORY_WORKERS, len(years)))) as pool:
+        frames = list(pool.map(lambda y: get_consolidated_data(structure_label, y)[0], years))
+
+    parts = [f[['date'] + HISTORY_COLUMNS] for f in frames if not f.empty and 'rooms' in f.columns]
+    if not parts: return pd.DataFrame()
+
+    days = pd.date_range(f"{years[0]}-01-01", f"{years[-1]}-12-31", freq='D')
+    df = pd.concat(parts, ignore_index=True).drop_duplicates('date', keep='last').set_index('date')
+    df = df.reindex(days).rename_axis('date').reset_index()
+    for col in HISTORY_COLUMNS:
+        df[col] = df[col].astype('float64')
+    missing = df['rooms'].isna().to_numpy()
+
+    df = add_kpi_ratios(df)
+    for col in ['adr', 'occupancy_pct', 'revpar']:
+        df[col] = np.where(missing, np.nan, df[col]).astype('float32')
+    df['rooms_sold'] = df['rooms_sold'].astype('float32')
+    df['rooms'] = df['rooms'].astype('float32')
+    df.insert(1, 'year', df['date'].dt.year.astype('int16'))
+
+    logger.info(f"Storico {structure_label} {years[0]}-{years[-1]}: {len(df)} giorni in {time.time() - started:.1f}s")
+    return df
+
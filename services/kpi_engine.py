@@ -3,6 +3,8 @@ import numpy as np
 from typing import Dict, Optional, Tuple
 import logging
 
+from services.calendar_dim import MESI_IT, calendar_columns
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -160,7 +162,7 @@ def get_monthly_kpi(df: pd.DataFrame, year: int, month: int, total_rooms: Option
     delta = _calculate_delta(current_metrics, previous_metrics)
     
     # Aggiungi informazioni sul periodo
-    month_name = pd.Timestamp(year=year, month=month, day=1).strftime('%B')
+    month_name = MESI_IT[month - 1]
     
     result = {
         'year': year,
@@ -214,20 +216,10 @@ def get_daily_breakdown(df: pd.DataFrame, year: int, month: int) -> pd.DataFrame
     df_filtered = df_filtered.sort_values('date').reset_index(drop=True)
     
     # Aggiungi colonne di formattazione
-    df_filtered['day'] = df_filtered['date'].dt.day
-    df_filtered['day_name'] = df_filtered['date'].dt.strftime('%a')  # Mon, Tue, Wed...
-    
-    # Conversione nomi giorni in italiano (opzionale)
-    day_translation = {
-        'Mon': 'Lun',
-        'Tue': 'Mar',
-        'Wed': 'Mer',
-        'Thu': 'Gio',
-        'Fri': 'Ven',
-        'Sat': 'Sab',
-        'Sun': 'Dom'
-    }
-    df_filtered['day_name'] = df_filtered['day_name'].map(day_translation)
+    # Giorno e nome giorno italiano dalla dimensione calendario (gather sulla chiave data)
+    cal = calendar_columns(df_filtered['date'], ['day', 'giorno_short'])
+    df_filtered['day'] = cal['day'].astype('int64')
+    df_filtered['day_name'] = cal['giorno_short']
     
     # Converti occupancy_pct da decimale (0.85) a percentuale (85.0) se necessario
     if df_filtered['occupancy_pct'].max() <= 1:
@@ -377,8 +369,9 @@ def get_weekday_performance(df: pd.DataFrame, year: int, month: Optional[int] =
         return pd.DataFrame()
     
     # Aggiungi giorno della settimana
-    df_filtered['weekday'] = df_filtered['date'].dt.day_name()
-    df_filtered['weekday_num'] = df_filtered['date'].dt.dayofweek
+    cal = calendar_columns(df_filtered['date'], ['dow', 'giorno'])
+    df_filtered['weekday'] = cal['giorno']
+    df_filtered['weekday_num'] = cal['dow']
     
     # Raggruppa per giorno della settimana
     weekday_stats = df_filtered.groupby(['weekday_num', 'weekday']).agg({
@@ -400,4 +393,25 @@ def get_weekday_performance(df: pd.DataFrame, year: int, month: Optional[int] =
     
     logger.info(f"✓ Analisi weekday completata")
     
-    return weekday_stats[['weekday', 'revenue', 'rooms_sold', 'adr', 'occupancy_pct', 'revpar']]
\ No newline at end of file
+    return weekday_stats[['weekday', 'revenue', 'rooms_sold', 'adr', 'occupancy_pct', 'revpar']]
+
+def add_kpi_ratios(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggiunge ADR, Occupancy % e RevPAR calcolati dalle somme, in modo vettoriale.
+    
+    Args:
+        df: DataFrame con colonne revenue, rooms_sold, rooms (giornaliere o già aggregate)
+    
+    Returns:
+        DataFrame con colonne adr, occupancy_pct, revpar (0 dove il denominatore è 0)
+    """
+    revenue = df['revenue'].to_numpy(dtype='float64')
+    sold = df['rooms_sold'].to_numpy(dtype='float64')
+    rooms = df['rooms'].to_numpy(dtype='float64')
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['adr'] = np.where(sold > 0, revenue / sold, 0.0)
+        df['occupancy_pct'] = np.where(rooms > 0, sold / rooms * 100, 0.0)
+        df['revpar'] = np.where(rooms > 0, revenue / rooms, 0.0)
+    
+    return df
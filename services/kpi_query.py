@@ -0,0 +1,255 @@
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+import logging
+
+from services import forecast_manager, portfolio
+from services.calendar_dim import calendar_columns
+from services.kpi_engine import add_kpi_ratios
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# QUERY KPI SENZA STREAMLIT
+# ==============================================================================
+# Stessi loader e stessa cache dataset delle pagine, senza il modello di rerun:
+# una query è struttura x anno x mesi a una granularità ('year', 'month',
+# 'day'); un batch di query si espande in celle struttura-anno, calcolate in
+# parallelo e restituite in ordine man mano che sono pronte. Ogni cella ha le
+# stesse colonne (schema fisso), così l'output si scrive in streaming come
+# JSON lines o come stream Arrow IPC.
+#
+# Mensile e annuale arrivano dai rollup (nessun dato giornaliero), il
+# giornaliero dal dataset consolidato. PORTFOLIO_LABEL è accettata come
+# struttura e restituisce la somma di tutte le strutture.
+
+QUERY_GRAINS = ('year', 'month', 'day')
+QUERY_WORKERS = 8
+SUM_COLUMNS = ['revenue', 'rooms_sold', 'rooms', 'days']
+KPI_COLUMNS = ['adr', 'occupancy_pct', 'revpar']
+OUTPUT_COLUMNS = ['structure', 'year', 'month', 'date'] + SUM_COLUMNS + KPI_COLUMNS
+
+
+def normalize_query(query: Dict) -> Dict:
+    """
+    Valida una query e applica i default.
+
+    Args:
+        query: Dict con 'years' (obbligatorio), 'structures' (default: tutte),
+               'months' (default: tutti), 'grain' (default: 'month')
+
+    Returns:
+        Dict con chiavi structures, years, months, grain
+
+    Raises:
+        ValueError: se anni, mesi, strutture o granularità non sono validi
+    """
+    known = set(forecast_manager.get_structure_labels()) | set(forecast_manager.STRUCTURE_MAP) | {portfolio.PORTFOLIO_LABEL}
+    structures = list(query.get('structures') or forecast_manager.get_structure_labels())
+    unknown = [s for s in structures if s not in known]
+    if unknown:
+        raise ValueError(f"Strutture sconosciute: {', '.join(unknown)}")
+
+    try:
+        years = [int(y) for y in query['years']]
+        months = sorted({int(m) for m in query.get('months') or range(1, 13)})
+    except KeyError:
+        raise ValueError("La query deve indicare almeno un anno ('years')")
+    except (TypeError, ValueError):
+        raise ValueError("Anni e mesi devono essere numeri interi")
+    if not years:
+        raise ValueError("La query deve indicare almeno un anno ('years')")
+    if months[0] < 1 or months[-1] > 12:
+        raise ValueError("I mesi vanno da 1 a 12")
+
+    grain = query.get('grain', 'month')
+    if grain not in QUERY_GRAINS:
+        raise ValueError(f"Granularità sconosciuta: {grain} (ammesse: {', '.join(QUERY_GRAINS)})")
+    return {'structures': structures, 'years': years, 'months': months, 'grain': grain}
+
+
+def _empty_cell() -> pd.DataFrame:
+    return _conform(pd.DataFrame({c: [] for c in OUTPUT_COLUMNS}))
+
+
+def _conform(df: pd.DataFrame) -> pd.DataFrame:
+    """Colonne e tipi dello schema di output (uguali per ogni cella e granularità)."""
+    out = pd.DataFrame({
+        'structure': df['structure'].astype(str).to_numpy(dtype=object),
+        'year': df['year'].to_numpy(dtype='int64'),
+        'month': df['month'].to_numpy(dtype='int64'),
+        'date': pd.to_datetime(df['date']).to_numpy(dtype='datetime64[ns]')
+    })
+    for col in SUM_COLUMNS + KPI_COLUMNS:
+        out[col] = df[col].to_numpy(dtype='float64')
+    return out
+
+
+def _monthly(structure: str, year: int) -> pd.DataFrame:
+    if structure == portfolio.PORTFOLIO_LABEL:
+        return portfolio.get_portfolio_monthly(year)
+    return forecast_manager.get_monthly_summary(structure, year)
+
+
+def _daily(structure: str, year: int) -> pd.DataFrame:
+    if structure == portfolio.PORTFOLIO_LABEL:
+        return portfolio.get_portfolio_daily(year)
+    return forecast_manager.get_consolidated_data(structure, year)[0]
+
+
+def _cell(structure: str, year: int, months: List[int], grain: str) -> pd.DataFrame:
+    """KPI di una struttura-anno alla granularità richiesta (frame conforme a OUTPUT_COLUMNS)."""
+    if grain == 'day':
+        df = _daily(structure, year)
+        if df.empty:
+            return _empty_cell()
+        month = calendar_columns(df['date'], ['month'])['month'].to_numpy()
+        keep = np.isin(month, months)
+        cell = pd.DataFrame({'date': df['date'].to_numpy()[keep], 'month': month[keep]})
+        for col in ['revenue', 'rooms_sold', 'rooms']:
+            cell[col] = df[col].to_numpy(dtype='float64')[keep] if col in df.columns else 0.0
+        cell['days'] = 1.0
+    else:
+        df = _monthly(structure, year)
+        if df.empty:
+            return _empty_cell()
+        cell = df[df['MeseNum'].isin(months)].rename(columns={'MeseNum': 'month'})
+        if grain == 'year':
+            # Somme dei mesi richiesti, KPI ricalcolati dalle somme (mese 0 = periodo intero)
+            cell = cell[SUM_COLUMNS].sum().to_frame().T.assign(month=0)
+        cell = cell.assign(date=pd.NaT)
+
+    cell = add_kpi_ratios(cell.assign(structure=structure, year=year).reset_index(drop=True))
+    return _conform(cell)
+
+
+def expand_queries(queries: Iterable[Dict]) -> List[Tuple[str, int, List[int], str]]:
+    """Celle (struttura, anno, mesi, granularità) di un batch di query, nell'ordine delle query."""
+    cells = []
+    for query in queries:
+        q = normalize_query(query)
+        cells.extend((s, y, q['months'], q['grain']) for s in q['structures'] for y in q['years'])
+    return cells
+
+
+def iter_kpis(queries: Iterable[Dict], workers: int = QUERY_WORKERS) -> Iterator[pd.DataFrame]:
+    """
+    Esegue un batch di query e restituisce un frame per cella struttura-anno.
+
+    Le celle sono calcolate in parallelo; i frame escono nell'ordine del batch
+    appena pronti, quindi il chiamante può scriverli senza attendere l'intero batch.
+
+    Args:
+        queries: Lista di query (vedi normalize_query)
+        workers: Thread di caricamento
+
+    Returns:
+        Iteratore di DataFrame con colonne OUTPUT_COLUMNS
+    """
+    cells = expand_queries(queries)
+    if not cells:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(cells)))) as pool:
+        yield from pool.map(lambda cell: _cell(*cell), cells)
+
+
+def run_kpis(queries: Iterable[Dict], workers: int = QUERY_WORKERS) -> pd.DataFrame:
+    """Come iter_kpis, ma restituisce un unico DataFrame."""
+    frames = list(iter_kpis(queries, workers))
+    if not frames:
+        return _empty_cell()
+    return pd.concat(frames, ignore_index=True)
+
+
+# ==============================================================================
+# SERIALIZZAZIONE IN STREAMING
+# ==============================================================================
+
+OUTPUT_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+
+def write_jsonl(frames: Iterable[pd.DataFrame], sink) -> int:
+    """
+    Scrive i frame come JSON lines (una riga per record) su un file binario.
+
+    Returns:
+        Numero di righe scritte
+    """
+    rows = 0
+    for df in frames:
+        if df.empty:
+            continue
+        body = df.to_json(orient='records', lines=True, date_format='iso', double_precision=4)
+        sink.write(body.rstrip('\n').encode('utf-8') + b'\n')
+        sink.flush()
+        rows += len(df)
+    return rows
+
+
+def arrow_schema():
+    """Schema Arrow esplicito di OUTPUT_COLUMNS (da un frame vuoto 'structure' risulterebbe di tipo null)."""
+    import pyarrow as pa  # import differito: serve solo all'output Arrow
+
+    return pa.schema(
+        [('structure', pa.string()), ('year', pa.int64()), ('month', pa.int64()), ('date', pa.timestamp('ns'))]
+        + [(col, pa.float64()) for col in SUM_COLUMNS + KPI_COLUMNS]
+    )
+
+
+def write_arrow(frames: Iterable[pd.DataFrame], sink) -> int:
+    """
+    Scrive i frame come stream Arrow IPC (un record batch per frame) su un file binario.
+
+    Returns:
+        Numero di righe scritte
+    """
+    import pyarrow as pa  # import differito: serve solo all'output Arrow
+
+    schema = arrow_schema()
+    rows = 0
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for df in frames:
+            if df.empty:
+                continue
+            writer.write_batch(pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False))
+            sink.flush()
+            rows += len(df)
+    return rows
+
+
+def write_kpis(queries: Iterable[Dict], sink, fmt: str = 'jsonl', workers: int = QUERY_WORKERS) -> int:
+    """
+    Esegue un batch di query e scrive il risultato in streaming.
+
+    Args:
+        queries: Lista di query (vedi normalize_query)
+        sink: File binario (stdout.buffer, socket, file)
+        fmt: 'jsonl' o 'arrow'
+
+    Returns:
+        Numero di righe scritte
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato sconosciuto: {fmt} (ammessi: {', '.join(OUTPUT_FORMATS)})")
+    frames = iter_kpis(queries, workers)
+    return write_jsonl(frames, sink) if fmt == 'jsonl' else write_arrow(frames, sink)
+
+
+def parse_queries(body: bytes) -> List[Dict]:
+    """Query da un corpo JSON: un oggetto, una lista, oppure {'queries': [...]}."""
+    try:
+        payload = json.loads(body or b'{}')
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON non valido: {e}")
+    if isinstance(payload, dict):
+        payload = payload.get('queries', [payload])
+    if not isinstance(payload, list) or not all(isinstance(q, dict) for q in payload):
+        raise ValueError("Il corpo deve essere una query o una lista di query")
+    return payload
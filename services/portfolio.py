@@ -0,0 +1,139 @@
+import datetime
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+import logging
+
+from services import forecast_manager
+from services.calendar_dim import MESI_IT
+from services.dataset_cache import get_cache
+from services.kpi_engine import add_kpi_ratios
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# PORTAFOGLIO MULTI-STRUTTURA
+# ==============================================================================
+# Le strutture vengono caricate in parallelo (ognuna dalla cache dataset) e
+# impilate in un unico frame colonnare con la colonna categorica 'structure'.
+# KPI per struttura e consolidati escono da un solo groupby; la chiave cache
+# contiene la generazione di ogni struttura, quindi il frame si ricostruisce
+# solo quando una di esse cambia.
+
+PORTFOLIO_LABEL = "Tutte le strutture"
+PORTFOLIO_WORKERS = 8
+SUM_COLUMNS = ['revenue', 'rooms_sold', 'rooms']
+
+
+def _map_parallel(fn, structures: List[str]) -> list:
+    with ThreadPoolExecutor(max_workers=max(1, min(PORTFOLIO_WORKERS, len(structures)))) as pool:
+        return list(pool.map(fn, structures))
+
+
+def _portfolio_key(year: int, structures: Optional[Iterable[str]] = None):
+    structures = list(structures or forecast_manager.get_structure_labels())
+    generations = _map_parallel(lambda s: forecast_manager.get_generation(s, year), structures)
+    return ('portfolio', year, tuple(zip(structures, generations))), structures
+
+
+def _build_portfolio(structures: List[str], year: int) -> pd.DataFrame:
+    started = datetime.datetime.now()
+    frames = _map_parallel(lambda s: forecast_manager.get_consolidated_data(s, year)[0], structures)
+
+    parts, lengths = [], []
+    for df in frames:
+        lengths.append(len(df))
+        if not df.empty:
+            parts.append(df[['date'] + [c for c in SUM_COLUMNS if c in df.columns]])
+
+    if not parts:
+        return pd.DataFrame()
+
+    df = pd.concat(parts, ignore_index=True)
+    for col in SUM_COLUMNS:
+        df[col] = df[col].fillna(0) if col in df.columns else 0.0
+    # Codici interi + categorie: la colonna struttura costa due byte per riga
+    codes = np.repeat(np.arange(len(structures), dtype='int16'), lengths)
+    df.insert(0, 'structure', pd.Categorical.from_codes(codes, categories=structures))
+
+    elapsed = (datetime.datetime.now() - started).total_seconds()
+    logger.info(f"Portafoglio {year}: {len(structures)} strutture, {len(df)} righe in {elapsed:.1f}s")
+    return df
+
+
+def get_portfolio_key(year: int, structures: Optional[Iterable[str]] = None):
+    """Chiave cache del portafoglio (cambia quando cambia la generazione di una struttura)."""
+    return _portfolio_key(year, structures)[0]
+
+
+def _load(year: int, structures: Optional[Iterable[str]]):
+    key, structures = _portfolio_key(year, structures)
+    return key, get_cache().get_or_load(key, lambda: _build_portfolio(structures, year))
+
+
+def get_portfolio_data(year: int, structures: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Frame giornaliero di tutte le strutture.
+    
+    Args:
+        year: Anno
+        structures: Etichette struttura (default: tutte)
+    
+    Returns:
+        DataFrame con colonne structure (categorica), date, revenue, rooms_sold, rooms
+    """
+    return _load(year, structures)[1]
+
+
+def get_portfolio_kpis(year: int, structures: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    KPI annui per struttura più la riga consolidata 'Totale', da un solo groupby.
+    
+    Returns:
+        DataFrame con colonne structure, revenue, rooms_sold, rooms, adr, occupancy_pct, revpar
+    """
+    key, df = _load(year, structures)
+    if df.empty: return pd.DataFrame()
+
+    def build():
+        by_structure = df.groupby('structure', observed=True)[SUM_COLUMNS].sum()
+        total = by_structure.sum().to_frame('Totale').T
+        kpis = pd.concat([by_structure, total]).rename_axis('structure').reset_index()
+        kpis['structure'] = kpis['structure'].astype(str)
+        return add_kpi_ratios(kpis)
+
+    return get_cache().derive(key, 'kpis', build)
+
+
+def get_portfolio_daily(year: int, structures: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Somme giornaliere consolidate (stesse colonne di get_consolidated_data)."""
+    key, df = _load(year, structures)
+    if df.empty: return pd.DataFrame()
+
+    def build():
+        daily = df.groupby('date')[SUM_COLUMNS].sum().reset_index()
+        return add_kpi_ratios(daily)
+
+    return get_cache().derive(key, 'daily', build)
+
+
+def get_portfolio_monthly(year: int, structures: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Somme mensili consolidate, con le stesse colonne di forecast_manager.get_monthly_summary.
+    Colonne: MeseNum, Mese, revenue, rooms_sold, rooms, days, adr, occupancy_pct, revpar
+    """
+    key, df = _load(year, structures)
+    if df.empty: return pd.DataFrame()
+
+    def build():
+        daily = df.groupby('date')[SUM_COLUMNS].sum()
+        month = daily.index.month.rename('MeseNum')
+        monthly = daily.groupby(month).agg(revenue=('revenue', 'sum'), rooms_sold=('rooms_sold', 'sum'),
+                                           rooms=('rooms', 'sum'), days=('revenue', 'size')).reset_index()
+        monthly.insert(1, 'Mese', [MESI_IT[m - 1] for m in monthly['MeseNum']])
+        return add_kpi_ratios(monthly)
+
+    return get_cache().derive(key, 'monthly', build)
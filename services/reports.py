@@ -0,0 +1,481 @@
+import datetime
+import html
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import logging
+
+from services import budget_store, calendar_dim, forecast_manager, rollups, storage
+from services.calendar_dim import MESI_IT, calendar_columns
+from services.dataset_cache import get_cache
+from services.kpi_engine import add_kpi_ratios
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# TABELLE DEI REPORT (STESSE COLONNE E FORMATI DELLE PAGINE)
+# ==============================================================================
+# Ogni tabella ha una specifica {colonna: (etichetta, formato printf)} con gli
+# stessi formati del column_config delle pagine (Overview, Pickup, Budget
+# Target). I dati arrivano dai loader in cache: rollup per le tabelle mensili,
+# dataset consolidato per il giornaliero, tabella pickup per i movimenti.
+
+MONTHLY_GRID_COLUMNS = {
+    'Mese': ('Mese', None),
+    'Revenue': ('Revenue', '€ %.0f'),
+    'Trend Prev': ('Trend Prev', '€ %.0f'),
+    'Revenue LY': ('Revenue LY', '€ %.0f'),
+    'Vs Prev Year': ('Vs Prev Year', '%+.0f €'),
+    'Rooms Sold': ('Rooms Sold', '%.0f'),
+    'Occ %': ('Occ %', '%.2f%%'),
+    'Delta Occ %': ('Delta Occ %', '%+.2f pp'),
+    'ADR': ('ADR', '€ %.2f'),
+    'Delta ADR': ('Delta ADR', '%+.2f €'),
+    'RevPAR': ('RevPAR', '€ %.2f')
+}
+DAILY_DETAIL_COLUMNS = {
+    'Data': ('Data', None),
+    'revenue': ('Revenue', '€ %.0f'),
+    'rooms_sold': ('Rooms Sold', '%.0f'),
+    'adr': ('ADR', '€ %.2f'),
+    'revpar': ('RevPAR', '€ %.2f'),
+    'occupancy_pct': ('Occ %', '%.2f%%')
+}
+PICKUP_MOVERS_COLUMNS = {
+    'Data': ('Data', None),
+    'pickup_revenue': ('Var. Rev', '€ %+.0f'),
+    'pickup_rooms': ('Var. Notti', '%+.0f'),
+    'pickup_adr': ('Var. ADR', '€ %+.2f'),
+    'revenue_curr': ('Totale Attuale', '€ %.0f')
+}
+BUDGET_COMPARISON_COLUMNS = {
+    'Mese': ('Mese', None),
+    'Target Budget (€)': ('Target Budget', '€ %.0f'),
+    'OTB Reale (€)': ('OTB Reale', '€ %.0f'),
+    'Delta Rev (€)': ('Delta Rev', '%+.0f €'),
+    'Delta ADR': ('Delta ADR', '%+.2f €'),
+    'Delta Occ %': ('Delta Occ %', '%+.2f pp'),
+    '% Copertura': ('% Copertura', '%.1f%%'),
+    'Copertura LY': ('Copertura LY', '%.1f%%')
+}
+DELTA_COLUMNS = {'Vs Prev Year', 'Delta Occ %', 'Delta ADR', 'Delta Rev (€)',
+                 'pickup_revenue', 'pickup_rooms', 'pickup_adr'}
+
+BUDGET_REVALIDATE = 300
+PICKUP_DAYS_BACK = 1
+PICKUP_TOP = 10
+
+
+def _month_values(frame: pd.DataFrame, col: str) -> np.ndarray:
+    """12 valori mensili (0 dove il mese manca) da un frame con colonna MeseNum."""
+    out = np.zeros(12)
+    if not frame.empty:
+        out[frame['MeseNum'].to_numpy(dtype='int64') - 1] = frame[col].to_numpy(dtype='float64')
+    return out
+
+
+def monthly_grid(structure_label: str, year: int) -> pd.DataFrame:
+    """
+    Griglia riepilogo mesi della Overview (anno corrente, snapshot precedente e LY).
+
+    Returns:
+        DataFrame con MeseNum e le colonne di MONTHLY_GRID_COLUMNS (vuoto se mancano dati)
+    """
+    monthly = forecast_manager.get_monthly_summary(structure_label, year)
+    if monthly.empty:
+        return pd.DataFrame()
+    past = forecast_manager.get_monthly_summary(structure_label, year - 1)
+
+    # Trend Prev: revenue mensile dello snapshot precedente (dal rollup, nessun download)
+    files = forecast_manager.get_index_files(structure_label, year)
+    prev_rollup = forecast_manager.get_structure_rollup(structure_label, year, files[1]) if len(files) > 1 else None
+    trend_prev = np.asarray(prev_rollup['month']['revenue'], dtype='float64') if prev_rollup else np.zeros(12)
+
+    months = monthly['MeseNum'].to_numpy(dtype='int64')
+    grid = pd.DataFrame({'MeseNum': months, 'Mese': monthly['Mese'].to_numpy()})
+    grid['Revenue'] = monthly['revenue'].to_numpy()
+    grid['Trend Prev'] = trend_prev[months - 1]
+    grid['Revenue LY'] = _month_values(past, 'revenue')[months - 1]
+    grid['Vs Prev Year'] = grid['Revenue'] - grid['Revenue LY']
+    grid['Rooms Sold'] = monthly['rooms_sold'].to_numpy()
+    grid['Occ %'] = monthly['occupancy_pct'].to_numpy()
+    grid['Delta Occ %'] = grid['Occ %'] - _month_values(past, 'occupancy_pct')[months - 1]
+    grid['ADR'] = monthly['adr'].to_numpy()
+    grid['Delta ADR'] = grid['ADR'] - _month_values(past, 'adr')[months - 1]
+    grid['RevPAR'] = monthly['revpar'].to_numpy()
+    return grid
+
+
+def daily_detail(df: pd.DataFrame, month: Optional[int] = None) -> pd.DataFrame:
+    """Dettaglio giornaliero di un mese, o dell'anno se month è None (colonne di DAILY_DETAIL_COLUMNS)."""
+    if df.empty:
+        return pd.DataFrame()
+    cal = calendar_columns(df['date'], ['month', 'label_giorno'])
+    keep = (cal['month'] == month).to_numpy() if month is not None else np.ones(len(df), dtype=bool)
+    daily = df.loc[keep, ['revenue', 'rooms_sold', 'adr', 'revpar', 'occupancy_pct']].reset_index(drop=True)
+    daily.insert(0, 'Data', cal['label_giorno'].to_numpy()[keep])
+    return daily
+
+
+def default_pickup_files(structure_label: str, year: int, days_back: int = PICKUP_DAYS_BACK):
+    """
+    Coppia (snapshot recente, snapshot di confronto) come il default della pagina Pickup.
+
+    Returns:
+        Tuple (file_recent, file_old) oppure None se non ci sono due snapshot distinti
+    """
+    df_snaps = forecast_manager.get_available_snapshots(structure_label, year)
+    if df_snaps.empty:
+        return None
+    latest = df_snaps.iloc[0]
+    past = df_snaps[df_snaps['date'] <= latest['date'] - datetime.timedelta(days=days_back)]
+    file_old = past.iloc[0]['filename'] if not past.empty else df_snaps.iloc[-1]['filename']
+    if file_old == latest['filename']:
+        return None
+    return latest['filename'], file_old
+
+
+def pickup_movers(df_pickup: pd.DataFrame, month: Optional[int] = None, top: Optional[int] = PICKUP_TOP) -> pd.DataFrame:
+    """
+    Giorni con variazioni tra due snapshot (colonne di PICKUP_MOVERS_COLUMNS).
+
+    Args:
+        df_pickup: Tabella di forecast_manager.get_pickup_data
+        month: Solo i giorni del mese (default: tutto l'anno)
+        top: Solo i `top` giorni con la variazione di revenue più ampia, in ordine di data (None = tutti)
+    """
+    if df_pickup.empty:
+        return pd.DataFrame()
+    cal = calendar_columns(df_pickup['date'], ['month', 'label_giorno'])
+    moved = ((df_pickup['pickup_revenue'].abs() > 0) | (df_pickup['pickup_rooms'].abs() > 0)).to_numpy()
+    if month is not None:
+        moved &= (cal['month'] == month).to_numpy()
+    movers = df_pickup.loc[moved, ['pickup_revenue', 'pickup_rooms', 'pickup_adr', 'revenue_curr']]
+    if top is not None:
+        movers = movers.loc[movers['pickup_revenue'].abs().nlargest(top).index].sort_index()
+    movers.insert(0, 'Data', cal.loc[movers.index, 'label_giorno'].to_numpy())
+    return movers.reset_index(drop=True)
+
+
+def _budget_name(structure_label: str) -> str:
+    """Nome struttura usato da 06/07 per salvare il budget (es. 'La Terrazza' per 'La Terrazza di Jenny')."""
+    return forecast_manager.STRUCTURE_MAP[structure_label].replace('_', ' ')
+
+
+def _fetch_official_budget(budget_name: str, year: int) -> pd.DataFrame:
+    s3, bucket = storage.get_s3()
+    try:
+        df = budget_store.load_official_budget(s3, bucket, budget_name, year)
+    except Exception as e:
+        logger.warning(f"Budget ufficiale {budget_name} {year} non leggibile: {e}")
+        return pd.DataFrame()
+    if df.empty:
+        return df
+    return df[df['date'].dt.year == year].reset_index(drop=True)
+
+
+def get_official_budget(structure_label: str, year: int) -> pd.DataFrame:
+    """Budget ufficiale giornaliero (stesso file e stesso parsing di 07 - Budget Target), in cache."""
+    if structure_label not in forecast_manager.STRUCTURE_MAP:
+        return pd.DataFrame()
+    budget_name = _budget_name(structure_label)
+    return get_cache().get_or_load(('budget_official', budget_name, year),
+                                   lambda: _fetch_official_budget(budget_name, year), ttl=BUDGET_REVALIDATE)
+
+
+def budget_comparison(structure_label: str, year: int, align: str = calendar_dim.DEFAULT_LY_MODE) -> pd.DataFrame:
+    """
+    Budget vs OTB per mese (Budget Target), con la copertura LY alla stessa distanza dal mese.
+
+    Returns:
+        DataFrame con MeseNum e le colonne di BUDGET_COMPARISON_COLUMNS (vuoto senza budget)
+    """
+    budget = get_official_budget(structure_label, year)
+    if budget.empty:
+        return pd.DataFrame()
+
+    month_idx = budget['date'].dt.month.to_numpy(dtype='int64') - 1
+    revenue = budget['revenue'].to_numpy(dtype='float64')
+    budget_rev = np.bincount(month_idx, weights=revenue, minlength=12)
+    days = np.bincount(month_idx, minlength=12)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'rooms_sold' in budget.columns:
+            sold = budget['rooms_sold'].to_numpy(dtype='float64')
+        elif 'adr' in budget.columns:
+            adr = budget['adr'].to_numpy(dtype='float64')
+            sold = np.where(adr > 0, revenue / adr, 0.0)
+        else:
+            sold = np.zeros(len(budget))
+        budget_sold = np.bincount(month_idx, weights=sold, minlength=12)
+        budget_adr = np.where(budget_sold > 0, budget_rev / budget_sold, 0.0)
+        occ = budget['occupancy_pct'].to_numpy(dtype='float64') if 'occupancy_pct' in budget.columns else np.zeros(len(budget))
+        budget_occ = np.where(days > 0, np.bincount(month_idx, weights=occ, minlength=12) / days, 0.0)
+
+    otb = forecast_manager.get_monthly_summary(structure_label, year)
+    otb_rev = _month_values(otb, 'revenue')
+
+    out = pd.DataFrame({'MeseNum': np.arange(1, 13), 'Mese': MESI_IT})
+    out['Target Budget (€)'] = budget_rev
+    out['OTB Reale (€)'] = otb_rev
+    out['Delta Rev (€)'] = otb_rev - budget_rev
+    out['Delta ADR'] = _month_values(otb, 'adr') - budget_adr
+    out['Delta Occ %'] = _month_values(otb, 'occupancy_pct') - budget_occ
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['% Copertura'] = np.where(budget_rev > 0, otb_rev / budget_rev * 100, 0.0)
+
+    # Copertura LY all'ultimo snapshot (stessa curva della pagina Budget Target)
+    folder_name = forecast_manager.STRUCTURE_MAP[structure_label]
+    history = forecast_manager.get_rollup_history("Forecast", folder_name, year)
+    history_ly = forecast_manager.get_rollup_history("Forecast", folder_name, year - 1)
+    final_ly_rollup = forecast_manager.get_rollup(forecast_manager.get_base_folder(year - 1), folder_name, year - 1)
+    final_ly = np.asarray(final_ly_rollup['month']['revenue']) if final_ly_rollup else None
+    curve = rollups.coverage_curve(history, budget_rev, year, history_ly, final_ly, align=align)
+    if curve.empty:
+        out['Copertura LY'] = np.nan
+    else:
+        latest = curve[curve['snapshot_date'] == curve['snapshot_date'].max()].sort_values('month')
+        out['Copertura LY'] = latest['coverage_ly'].to_numpy()
+    return out
+
+
+# ==============================================================================
+# RENDER HTML
+# ==============================================================================
+# Documento autonomo (CSS inline, nessuna risorsa esterna): card KPI come nella
+# Overview, tabelle con i formati delle specifiche sopra, delta in verde/rosso.
+
+DELTA_POSITIVE = '#28a745'
+DELTA_NEGATIVE = '#dc3545'
+
+REPORT_CSS = """
+body { font-family: -apple-system, 'Segoe UI', Roboto, Arial, sans-serif; color: #212529; margin: 32px; }
+h1 { margin-bottom: 4px; } h2 { margin-top: 32px; border-bottom: 1px solid #e9ecef; padding-bottom: 4px; }
+.sub { color: #6c757d; margin-top: 0; }
+.cards { display: flex; gap: 12px; }
+.card { flex: 1; text-align: center; padding: 14px 8px; border-radius: 12px; background: #f8f9fa; border: 1px solid #e9ecef; }
+.card .label { color: #6c757d; font-size: 0.8rem; text-transform: uppercase; font-weight: 600; margin: 0 0 6px 0; }
+.card .value { font-size: 1.7rem; margin: 0; }
+.card .delta { font-weight: 700; margin: 6px 0 0 0; }
+table { border-collapse: collapse; width: 100%; font-size: 0.85rem; }
+th, td { padding: 4px 8px; border-bottom: 1px solid #e9ecef; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+tr.focus td { background: #e7f1ff; font-weight: 600; }
+"""
+
+
+def _format(value, fmt: Optional[str]) -> str:
+    if fmt is None:
+        return html.escape(str(value))
+    if value is None or pd.isna(value):
+        return ''
+    return html.escape(fmt % value)
+
+
+def table_html(df: pd.DataFrame, columns: Dict, focus_rows: Optional[np.ndarray] = None) -> str:
+    """Tabella HTML con etichette e formati della specifica `columns` (delta colorati)."""
+    if df.empty:
+        return "<p class='sub'>Nessun dato.</p>"
+    cols = [c for c in columns if c in df.columns]
+    head = ''.join(f"<th>{html.escape(columns[c][0])}</th>" for c in cols)
+    focus_rows = np.zeros(len(df), dtype=bool) if focus_rows is None else focus_rows
+
+    # Celle formattate per colonna (una passata per colonna, non per cella)
+    cells = []
+    for c in cols:
+        fmt = columns[c][1]
+        text = [_format(v, fmt) for v in df[c].tolist()]
+        if c in DELTA_COLUMNS:
+            values = df[c].to_numpy(dtype='float64')
+            color = np.where(values > 0, DELTA_POSITIVE, np.where(values < 0, DELTA_NEGATIVE, ''))
+            text = [f"<span style='color:{k}'>{t}</span>" if k else t for t, k in zip(text, color)]
+        cells.append(text)
+
+    rows = []
+    for i, row in enumerate(zip(*cells)):
+        css = " class='focus'" if focus_rows[i] else ''
+        rows.append(f"<tr{css}>" + ''.join(f"<td>{t}</td>" for t in row) + "</tr>")
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{''.join(rows)}</tbody></table>"
+
+
+def _kpi(frame: pd.DataFrame, month: int) -> Dict:
+    row = frame[frame['MeseNum'] == month] if not frame.empty else frame
+    if row.empty:
+        return {'revenue': 0.0, 'rooms_sold': 0.0, 'occupancy_pct': 0.0, 'adr': 0.0, 'revpar': 0.0}
+    return row.iloc[0][['revenue', 'rooms_sold', 'occupancy_pct', 'adr', 'revpar']].astype(float).to_dict()
+
+
+def _delta_text(delta: float, format_type: str) -> str:
+    """Delta con segno esplicito, come render_kpi_card della Overview."""
+    sign = '+' if delta >= 0 else '-'
+    if format_type == 'currency':
+        return f"{sign}€ {abs(delta):,.0f}"
+    if format_type == 'percent':
+        return f"{sign}{abs(delta):.2f}%"
+    return f"{sign}{abs(int(delta))}"
+
+
+def kpi_cards_html(current: Dict, previous: Dict) -> str:
+    """Card KPI (Revenue | Notti | Occ % | ADR | RevPAR) con delta vs anno precedente, come nella Overview."""
+    cards = [
+        ("Revenue", 'revenue', "€ {:,.0f}", 'currency'),
+        ("Notti", 'rooms_sold', "{:.0f}", 'number'),
+        ("Occ %", 'occupancy_pct', "{:.2f}%", 'percent'),
+        ("ADR", 'adr', "€ {:.2f}", 'currency'),
+        ("RevPAR", 'revpar', "€ {:.2f}", 'currency')
+    ]
+    out = []
+    for label, key, value_fmt, format_type in cards:
+        delta = current[key] - previous[key]
+        color = DELTA_POSITIVE if delta >= 0 else DELTA_NEGATIVE
+        out.append(f"<div class='card'><p class='label'>{label}</p><p class='value'>{value_fmt.format(current[key])}</p>"
+                   f"<p class='delta' style='color:{color}'>{_delta_text(delta, format_type)}</p></div>")
+    return f"<div class='cards'>{''.join(out)}</div>"
+
+
+def render_report(bundle: Dict, month: int) -> str:
+    """
+    Report HTML di una struttura per un mese.
+
+    Args:
+        bundle: Input della struttura (collect_inputs)
+        month: Mese 1-12
+
+    Returns:
+        Documento HTML completo
+    """
+    structure, year = bundle['structure'], bundle['year']
+    mese = MESI_IT[month - 1]
+    grid = bundle['grid']
+    budget = bundle['budget']
+    pickup = bundle['pickup']
+
+    parts = [
+        f"<h1>{html.escape(structure)} – {mese} {year}</h1>",
+        f"<p class='sub'>Generato il {bundle['generated_at']} · Snapshot {html.escape(bundle['snapshot'] or '-')}"
+        f" · Confronto con il {year - 1}</p>",
+        "<h2>KPI del mese</h2>",
+        kpi_cards_html(_kpi(bundle['monthly'], month), _kpi(bundle['monthly_ly'], month)),
+        "<h2>Griglia riepilogo mesi</h2>",
+        table_html(grid, MONTHLY_GRID_COLUMNS, (grid['MeseNum'] == month).to_numpy() if not grid.empty else None),
+        f"<h2>Pickup {mese}</h2>"
+    ]
+    if pickup is None or pickup.empty:
+        parts.append("<p class='sub'>Nessuna coppia di snapshot da confrontare.</p>")
+    else:
+        month_pickup = pickup[pickup['month'] == month]
+        parts.append(f"<p class='sub'>{html.escape(bundle['pickup_label'])}: "
+                     f"{month_pickup['pickup_revenue'].sum():+,.0f} € · {month_pickup['pickup_rooms'].sum():+,.0f} notti</p>")
+        parts.append(table_html(pickup_movers(month_pickup, top=PICKUP_TOP), PICKUP_MOVERS_COLUMNS))
+
+    parts.append("<h2>Copertura budget</h2>")
+    if budget.empty:
+        parts.append("<p class='sub'>Budget ufficiale non trovato.</p>")
+    else:
+        parts.append(table_html(budget, BUDGET_COMPARISON_COLUMNS, (budget['MeseNum'] == month).to_numpy()))
+
+    parts.append(f"<h2>Dettaglio giornaliero ({mese})</h2>")
+    parts.append(table_html(daily_detail(bundle['daily'], month), DAILY_DETAIL_COLUMNS))
+
+    return (f"<!DOCTYPE html><html lang='it'><head><meta charset='utf-8'>"
+            f"<title>{html.escape(structure)} {mese} {year}</title><style>{REPORT_CSS}</style></head>"
+            f"<body>{''.join(parts)}</body></html>")
+
+
+# ==============================================================================
+# GENERAZIONE BATCH
+# ==============================================================================
+# Un thread per struttura: raccoglie gli input dalla cache dataset (rollup,
+# consolidato, pickup, budget) e scrive i documenti di tutti i mesi richiesti.
+# Il tempo è tutto nel caricamento (I/O, pandas rilascia il GIL); il rendering
+# HTML è costruzione di stringhe e non giustifica un pool di processi, che
+# dovrebbe reimportare pandas e i servizi in ogni worker.
+
+REPORT_DIR = Path(__file__).resolve().parent.parent / "data" / "reports"
+REPORT_WORKERS = 8
+
+
+def collect_inputs(structure_label: str, year: int, align: str = calendar_dim.DEFAULT_LY_MODE) -> Dict:
+    """
+    Input di una struttura per tutti i suoi report.
+
+    Returns:
+        Dict con structure, year, folder, snapshot, monthly, monthly_ly, grid, daily,
+        pickup (con colonna month), pickup_label, budget, generated_at
+    """
+    df, info = forecast_manager.get_consolidated_data(structure_label, year)
+    daily = df[['date', 'revenue', 'rooms_sold', 'rooms']].copy() if not df.empty else pd.DataFrame()
+    if not daily.empty:
+        daily = add_kpi_ratios(daily)
+
+    pickup, pickup_label = None, ''
+    files = default_pickup_files(structure_label, year)
+    if files:
+        pickup = forecast_manager.get_pickup_data(structure_label, year, *files)
+        if not pickup.empty:
+            pickup = pickup[['date', 'pickup_revenue', 'pickup_rooms', 'pickup_adr', 'revenue_curr']].assign(
+                month=calendar_columns(pickup['date'], ['month'])['month'].to_numpy())
+            dates = [forecast_manager.parse_snapshot_date(f) for f in files]
+            pickup_label = ' vs '.join(d.strftime('%d/%m/%Y') if d else f for d, f in zip(dates, files))
+
+    return {
+        'structure': structure_label,
+        'year': year,
+        'folder': forecast_manager.STRUCTURE_MAP[structure_label],
+        'snapshot': info['file'] if info else None,
+        'monthly': forecast_manager.get_monthly_summary(structure_label, year),
+        'monthly_ly': forecast_manager.get_monthly_summary(structure_label, year - 1),
+        'grid': monthly_grid(structure_label, year),
+        'daily': daily,
+        'pickup': pickup,
+        'pickup_label': pickup_label,
+        'budget': budget_comparison(structure_label, year, align),
+        'generated_at': datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
+    }
+
+
+def _write_reports(bundle: Dict, months: List[int], out_dir: Path) -> List[str]:
+    """Scrive i report dei mesi richiesti per una struttura."""
+    folder = out_dir / str(bundle['year']) / bundle['folder']
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for month in months:
+        path = folder / f"{bundle['year']}-{month:02d}.html"
+        path.write_text(render_report(bundle, month), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def generate_reports(year: int, months: Optional[Iterable[int]] = None, structures: Optional[Iterable[str]] = None,
+                     out_dir: Path = REPORT_DIR, workers: int = REPORT_WORKERS) -> List[str]:
+    """
+    Report per ogni struttura e mese.
+
+    Args:
+        year: Anno
+        months: Mesi 1-12 (default: tutti)
+        structures: Etichette struttura (default: tutte)
+        out_dir: Cartella di output (<out_dir>/<anno>/<struttura>/<anno>-<mese>.html)
+        workers: Strutture elaborate in parallelo
+
+    Returns:
+        Percorsi dei documenti scritti
+    """
+    started = time.time()
+    months = sorted(set(months or range(1, 13)))
+    structures = list(structures or forecast_manager.get_structure_labels())
+
+    def build(structure):
+        return _write_reports(collect_inputs(structure, year), months, out_dir)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(structures)))) as pool:
+        results = list(pool.map(build, structures))
+    paths = [p for batch in results for p in batch]
+
+    logger.info(f"Report {year}: {len(paths)} documenti per {len(structures)} strutture "
+                f"in {time.time() - started:.1f}s")
+    return paths
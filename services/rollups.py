@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+import logging
+
+from services import calendar_dim
+from services.calendar_dim import MESI_IT
+from services.kpi_engine import add_kpi_ratios
+from services.snapshot_upload import commit_json
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# ROLLUP MENSILI E PER GIORNO DELLA SETTIMANA
+# ==============================================================================
+# Per ogni snapshot si salvano somme mensili (12) e per giorno della settimana
+# (7) di revenue, camere vendute e camere disponibili, più il numero di giorni.
+# Sono poche centinaia di byte: le tabelle mensili/settimanali si disegnano da
+# qui senza toccare i dati giornalieri.
+#
+# Archivio: <Cartella>/<Struttura>/<Anno>/rollups.json, accanto a index.json,
+# nella forma {nome_snapshot: rollup}. Viene aggiornato all'ingest.
+
+ROLLUP_METRICS = ['revenue', 'rooms_sold', 'rooms']
+ROLLUP_STORE_NAME = "rollups.json"
+
+
+def build_rollup(df: pd.DataFrame, year: int) -> Dict:
+    """
+    Calcola il rollup di uno snapshot giornaliero (solo le date dell'anno indicato).
+
+    Returns:
+        Dict {'year', 'month': {metrica: [12]}, 'dow': {metrica: [7]}}
+        con anche 'days' per mese e per giorno della settimana
+    """
+    if df is None or df.empty or 'date' not in df.columns:
+        d = pd.DataFrame({'date': pd.to_datetime([])})
+    else:
+        d = df[df['date'].dt.year == year]
+
+    month_idx = d['date'].dt.month.to_numpy(dtype='int64') - 1
+    dow_idx = d['date'].dt.dayofweek.to_numpy(dtype='int64')
+
+    rollup = {'year': int(year), 'month': {}, 'dow': {}}
+    for col in ROLLUP_METRICS:
+        values = d[col].to_numpy(dtype='float64') if col in d.columns else np.zeros(len(d))
+        rollup['month'][col] = np.bincount(month_idx, weights=values, minlength=12).round(2).tolist()
+        rollup['dow'][col] = np.bincount(dow_idx, weights=values, minlength=7).round(2).tolist()
+    rollup['month']['days'] = np.bincount(month_idx, minlength=12).tolist()
+    rollup['dow']['days'] = np.bincount(dow_idx, minlength=7).tolist()
+    return rollup
+
+
+def rollup_frame(rollup: Optional[Dict], kind: str = 'month') -> pd.DataFrame:
+    """
+    Converte un rollup in DataFrame con KPI derivati.
+
+    Args:
+        rollup: Dict prodotto da build_rollup
+        kind: 'month' (colonna MeseNum 1-12) o 'dow' (colonna GiornoIdx 0-6)
+
+    Returns:
+        DataFrame con revenue, rooms_sold, rooms, days, adr, occupancy_pct, revpar
+        (solo righe con almeno un giorno di dati)
+    """
+    if not rollup:
+        return pd.DataFrame()
+
+    data = rollup[kind]
+    key_col = 'MeseNum' if kind == 'month' else 'GiornoIdx'
+    size = 12 if kind == 'month' else 7
+    df = pd.DataFrame({key_col: np.arange(1, 13) if kind == 'month' else np.arange(7)})
+    for col in ROLLUP_METRICS + ['days']:
+        df[col] = np.asarray(data.get(col, [0] * size), dtype='float64')
+
+    df = add_kpi_ratios(df[df['days'] > 0].reset_index(drop=True))
+
+    if kind == 'month':
+        df.insert(1, 'Mese', [MESI_IT[m - 1] for m in df['MeseNum']])
+    return df
+
+
+def rollup_totals(rollup: Optional[Dict]) -> Dict:
+    """Totali annui (revenue, rooms_sold, rooms, days) sommando i 12 mesi."""
+    if not rollup:
+        return {col: 0.0 for col in ROLLUP_METRICS + ['days']}
+    return {col: float(np.sum(rollup['month'].get(col, []))) for col in ROLLUP_METRICS + ['days']}
+
+
+def store_key(folder_type: str, folder_struct: str, year: int) -> str:
+    return f"{folder_type}/{folder_struct}/{year}/{ROLLUP_STORE_NAME}"
+
+
+def record_rollups(s3, bucket: str, folder_type: str, folder_struct: str, year: int,
+                   rollups: Dict[str, Dict], remove: Iterable[str] = ()) -> Dict:
+    """
+    Aggiorna l'archivio rollup all'ingest con una scrittura condizionale.
+    Si aggiungono/sostituiscono solo le voci degli snapshot appena caricati.
+    """
+    remove = set(remove)
+
+    def mutate(store):
+        store = dict(store or {})
+        store.update(rollups)
+        for name in remove:
+            store.pop(name, None)
+        return store
+
+    return commit_json(s3, bucket, store_key(folder_type, folder_struct, year), mutate, default={})
+
+
+# ==============================================================================
+# CURVA DI COPERTURA BUDGET
+# ==============================================================================
+# Per ogni snapshot e ogni mese: revenue OTB / budget del mese. Il confronto con
+# l'anno scorso usa lo snapshot LY scattato alla data allineata (calendar_dim:
+# 52 settimane prima o stessa data) rapportato al consuntivo LY.
+
+LY_MAX_GAP_DAYS = 14
+
+
+def coverage_curve(history: Dict, budget: np.ndarray, year: int,
+                   history_ly: Optional[Dict] = None, final_ly: Optional[np.ndarray] = None,
+                   align: str = calendar_dim.DEFAULT_LY_MODE) -> pd.DataFrame:
+    """
+    Copertura % del budget per mese lungo la storia degli snapshot.
+
+    Args:
+        history: Output di forecast_manager.get_rollup_history (anno corrente)
+        budget: 12 valori di revenue a budget
+        year: Anno del budget
+        history_ly: Storia snapshot dell'anno precedente (opzionale)
+        final_ly: 12 valori di revenue consuntiva dell'anno precedente
+        align: Allineamento della data snapshot LY ('settimana' o 'calendario')
+
+    Returns:
+        DataFrame lungo con colonne snapshot_date, month, lead_days, otb, coverage, coverage_ly
+    """
+    dates = history['dates']
+    if len(dates) == 0:
+        return pd.DataFrame()
+
+    budget = np.asarray(budget, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coverage = np.where(budget > 0, history['revenue'] / budget * 100, np.nan)       # snapshot x 12
+
+    month_start = np.array([f"{year}-{m:02d}-01" for m in range(1, 13)], dtype='datetime64[D]')
+    lead_days = (month_start[None, :] - dates[:, None]).astype('int64')
+
+    coverage_ly = np.full(coverage.shape, np.nan)
+    if history_ly is not None and final_ly is not None and len(history_ly['dates']):
+        target = calendar_dim.ly_dates(dates, align)
+        idx = np.searchsorted(history_ly['dates'], target, side='right') - 1
+        gap = (target - history_ly['dates'][np.clip(idx, 0, None)]).astype('int64')
+        valid = (idx >= 0) & (gap <= LY_MAX_GAP_DAYS)
+        final_ly = np.asarray(final_ly, dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ly = np.where(final_ly > 0, history_ly['revenue'][np.clip(idx, 0, None)] / final_ly * 100, np.nan)
+        coverage_ly = np.where(valid[:, None], ly, np.nan)
+
+    n = len(dates)
+    return pd.DataFrame({
+        'snapshot_date': np.repeat(dates, 12),
+        'month': np.tile(np.arange(1, 13), n),
+        'lead_days': lead_days.ravel(),
+        'otb': history['revenue'].ravel(),
+        'coverage': coverage.ravel(),
+        'coverage_ly': coverage_ly.ravel()
+    })
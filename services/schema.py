@@ -0,0 +1,98 @@
+import pandas as pd
+from typing import Dict, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# SCHEMA CANONICO COMPATTO PER I DATASET IN CACHE
+# ==============================================================================
+# Un anno di una struttura sono ~365 righe: il peso in memoria è dominato dalle
+# colonne object lette con dtype=object e dalle colonne Kross non usate.
+# Ogni frame che finisce in cache passa da qui.
+
+# Metriche monetarie: restano float64 perché vengono sommate su base annua
+MONEY_COLUMNS = ['revenue']
+
+# Rapporti giornalieri (mai sommati su grandi volumi): float32 è sufficiente
+RATIO_COLUMNS = ['adr', 'revpar', 'occupancy_pct']
+
+# Conteggi camere: interi piccoli
+COUNT_COLUMNS = ['rooms_sold', 'rooms', 'blocked']
+
+CANONICAL_COLUMNS = ['structure', 'date'] + MONEY_COLUMNS + RATIO_COLUMNS + COUNT_COLUMNS
+
+
+def dataset_nbytes(df: pd.DataFrame) -> int:
+    """
+    Restituisce l'occupazione reale in memoria di un DataFrame (stringhe incluse).
+    """
+    if df is None or df.empty:
+        return 0
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def compact_dataset(df: pd.DataFrame, structure: Optional[str] = None) -> pd.DataFrame:
+    """
+    Converte un DataFrame normalizzato nello schema compatto usato dalle cache.
+
+    - date: datetime64[ns]
+    - revenue: float64
+    - adr, revpar, occupancy_pct: float32
+    - rooms_sold, rooms, blocked: int16
+    - structure: categorical (solo se indicata)
+    Le colonne Kross non canoniche vengono scartate.
+
+    Args:
+        df: DataFrame già normalizzato (colonne rinominate e numeri puliti)
+        structure: Etichetta struttura da aggiungere come colonna categorica (opzionale)
+
+    Returns:
+        Nuovo DataFrame compatto, ordinato per data e con indice resettato
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    out = pd.DataFrame(index=df.index)
+
+    if 'date' in df.columns:
+        out['date'] = pd.to_datetime(df['date'], errors='coerce')
+
+    for col in MONEY_COLUMNS:
+        if col in df.columns:
+            out[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('float64')
+
+    for col in RATIO_COLUMNS:
+        if col in df.columns:
+            out[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('float32')
+
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            out[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).round().astype('int16')
+
+    if structure is not None:
+        out.insert(0, 'structure', pd.Categorical([structure] * len(out)))
+
+    if 'date' in out.columns:
+        out = out.dropna(subset=['date']).sort_values('date')
+
+    return out.reset_index(drop=True)
+
+
+def measure_compaction(df_raw: pd.DataFrame, df_compact: pd.DataFrame) -> Dict:
+    """
+    Misura i byte per struttura-anno prima e dopo la compattazione.
+
+    Returns:
+        Dict con bytes_before, bytes_after, rows e ratio (after / before)
+    """
+    before = dataset_nbytes(df_raw)
+    after = dataset_nbytes(df_compact)
+    return {
+        'bytes_before': before,
+        'bytes_after': after,
+        'rows': len(df_compact),
+        'ratio': round(after / before, 3) if before > 0 else 0.0
+    }
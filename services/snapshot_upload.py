@@ -0,0 +1,186 @@
+import json
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# UPLOAD SNAPSHOT IN PARALLELO + AGGIORNAMENTO ATOMICO DELL'INDICE
+# ==============================================================================
+
+MULTIPART_THRESHOLD = 8 * 1024 * 1024   # oltre 8 MB upload multipart
+MAX_UPLOAD_WORKERS = 8
+INDEX_MAX_RETRIES = 8
+# Snapshot, indici e rollup sono letti dalla dashboard via HTTP anonimo (BASE_URL);
+# gli oggetti privati (es. budget) si scrivono con acl=None
+PUBLIC_ACL = 'public-read'
+
+
+class IndexConflictError(Exception):
+    """L'oggetto (indice o rollup) è stato modificato da altri per troppi tentativi consecutivi."""
+
+
+def _transfer_config():
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_THRESHOLD,
+        max_concurrency=4
+    )
+
+
+def upload_files_parallel(s3, bucket: str, items: List[Dict], max_workers: int = MAX_UPLOAD_WORKERS,
+                          acl: Optional[str] = PUBLIC_ACL) -> List[Dict]:
+    """
+    Carica più file in parallelo (multipart automatico sopra MULTIPART_THRESHOLD).
+
+    Args:
+        s3: Client boto3 S3 (thread-safe, condiviso tra i worker)
+        bucket: Nome bucket
+        items: Lista di dict con 'key' (percorso di destinazione) e 'fileobj'
+        max_workers: Upload contemporanei
+        acl: ACL canned degli oggetti (None = privati)
+
+    Returns:
+        Lista di dict {'key', 'ok', 'error'} nello stesso ordine di `items`
+    """
+    config = _transfer_config()
+    extra = {'ACL': acl} if acl else {}
+
+    def upload(item):
+        fileobj = item['fileobj']
+        fileobj.seek(0)
+        s3.upload_fileobj(fileobj, bucket, item['key'], ExtraArgs=extra, Config=config)
+        return item['key']
+
+    results = {item['key']: {'key': item['key'], 'ok': False, 'error': None} for item in items}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = {pool.submit(upload, item): item['key'] for item in items}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                future.result()
+                results[key]['ok'] = True
+            except Exception as e:
+                results[key]['error'] = str(e)
+                logger.warning(f"Upload fallito {key}: {e}")
+    return [results[item['key']] for item in items]
+
+
+def read_object(s3, bucket: str, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Legge un oggetto con il suo ETag.
+
+    Returns:
+        Tuple (contenuto, etag); (None, None) se l'oggetto non esiste
+    """
+    from botocore.exceptions import ClientError
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        return obj['Body'].read(), obj.get('ETag')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None, None
+        raise
+
+
+def read_json(s3, bucket: str, key: str, default=None):
+    """
+    Legge un oggetto JSON con il suo ETag.
+
+    Returns:
+        Tuple (contenuto, etag); (default, None) se l'oggetto non esiste
+    """
+    body, etag = read_object(s3, bucket, key)
+    if body is None:
+        return default, None
+    return json.loads(body.decode('utf-8')), etag
+
+
+def read_index(s3, bucket: str, index_key: str) -> Tuple[List[str], Optional[str]]:
+    """Legge index.json con il suo ETag (lista vuota se l'indice non esiste)."""
+    files, etag = read_json(s3, bucket, index_key, default=[])
+    return files, etag
+
+
+def commit_object(s3, bucket: str, key: str, mutate: Callable[[Optional[bytes]], Optional[bytes]],
+                  content_type: str = 'application/octet-stream', acl: Optional[str] = PUBLIC_ACL) -> Optional[bytes]:
+    """
+    Read-modify-write di un oggetto con scrittura condizionale.
+
+    La PUT usa If-Match sull'ETag letto (If-None-Match se l'oggetto non esiste):
+    se un'altra scrittura è arrivata nel frattempo, l'oggetto viene riletto e
+    `mutate` riapplicato, così nessuna modifica concorrente va persa.
+    Se `mutate` restituisce None non si scrive nulla. Con acl=None l'oggetto resta privato.
+
+    Returns:
+        Il contenuto scritto (o quello esistente, se non è cambiato nulla)
+    """
+    from botocore.exceptions import ClientError
+
+    extra = {'ACL': acl} if acl else {}
+    for attempt in range(INDEX_MAX_RETRIES):
+        current, etag = read_object(s3, bucket, key)
+        updated = mutate(current)
+        if updated is None or (updated == current and etag is not None):
+            return current
+
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            s3.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=updated,
+                ContentType=content_type,
+                **condition,
+                **extra
+            )
+            return updated
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code not in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+                raise
+            # Conflitto: un'altra scrittura è arrivata prima, si riprova con backoff
+            time.sleep(min(2.0, 0.1 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+
+    raise IndexConflictError(f"Impossibile aggiornare {key} dopo {INDEX_MAX_RETRIES} tentativi")
+
+
+def commit_json(s3, bucket: str, key: str, mutate: Callable[[Any], Any], default=None,
+                acl: Optional[str] = PUBLIC_ACL) -> Any:
+    """
+    Come commit_object, per un oggetto JSON: `mutate` riceve e restituisce il contenuto decodificato.
+
+    Returns:
+        Il contenuto scritto (o quello esistente, se `mutate` non cambia nulla)
+    """
+    def mutate_bytes(body):
+        current = json.loads(body.decode('utf-8')) if body is not None else default
+        updated = mutate(current)
+        if updated == current and body is not None:
+            return None
+        return json.dumps(updated).encode('utf-8')
+
+    written = commit_object(s3, bucket, key, mutate_bytes, content_type='application/json', acl=acl)
+    return json.loads(written.decode('utf-8')) if written is not None else default
+
+
+def commit_index(s3, bucket: str, index_key: str,
+                 add: Iterable[str] = (), remove: Iterable[str] = ()) -> List[str]:
+    """
+    Aggiunge/rimuove voci da index.json con una sola scrittura condizionale.
+
+    Returns:
+        La lista file scritta (ordine inverso per nome = più recente prima)
+    """
+    add, remove = list(add), set(remove)
+
+    def mutate(files):
+        return sorted((set(files or []) | set(add)) - remove, reverse=True)
+
+    return commit_json(s3, bucket, index_key, mutate, default=[])
@@ -0,0 +1,53 @@
+import threading
+import tomllib
+from pathlib import Path
+from typing import Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# CLIENT S3 SENZA STREAMLIT
+# ==============================================================================
+# Per servizi e strumenti a riga di comando (report, export, servizio KPI):
+# stesse credenziali della dashboard, lette da .streamlit/secrets.toml
+# (sezione [digitalocean] se presente, altrimenti chiavi globali).
+
+SECRETS_FILE = Path(__file__).resolve().parent.parent / ".streamlit" / "secrets.toml"
+DEFAULT_ENDPOINT = "https://sfo3.digitaloceanspaces.com"
+DEFAULT_BUCKET = "ihosp-kross-archive"
+
+_client = None
+_lock = threading.Lock()
+
+
+def load_secrets(path: Path = SECRETS_FILE) -> dict:
+    """Credenziali S3 dal file secrets (dict vuoto se il file manca)."""
+    if not path.exists():
+        return {}
+    with open(path, 'rb') as f:
+        secrets = tomllib.load(f)
+    return secrets.get('digitalocean', secrets)
+
+
+def get_s3() -> Tuple[object, str]:
+    """
+    Client boto3 autenticato e nome bucket, creati una volta per processo.
+
+    Returns:
+        Tuple (client S3, bucket)
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            import boto3  # import differito: boto3 è l'import più pesante
+            secrets = load_secrets()
+            _client = (boto3.client('s3',
+                                    region_name=secrets.get('region', 'sfo3'),
+                                    endpoint_url=secrets.get('endpoint', DEFAULT_ENDPOINT),
+                                    aws_access_key_id=secrets.get('access_key'),
+                                    aws_secret_access_key=secrets.get('secret_key')),
+                       secrets.get('bucket_name', DEFAULT_BUCKET))
+        return _client
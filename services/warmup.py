@@ -0,0 +1,146 @@
+import threading
+import time
+import datetime
+from typing import Dict, List, Optional
+import logging
+
+from services import forecast_manager, portfolio
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# WARMUP IN BACKGROUND DELLE CACHE
+# ==============================================================================
+# Un thread daemon per processo carica in cache, per ogni struttura, l'anno
+# corrente e il precedente (viste di default dell'Overview) più gli input di
+# Pickup e Pace. L'indice viene riletto a ogni giro: se la generazione del
+# dataset avanza, quella struttura-anno viene ricaricata subito.
+
+WARMUP_INTERVAL = 30  # secondi tra un controllo indice e il successivo
+
+_worker: Optional["WarmupWorker"] = None
+_worker_lock = threading.Lock()
+
+
+def warmup_targets() -> List[str]:
+    return forecast_manager.get_structure_labels()
+
+
+class WarmupWorker(threading.Thread):
+    """
+    Thread che tiene calde le cache di forecast_manager.
+
+    Lo stato per (struttura, anno) è 'cold' finché il primo caricamento non
+    termina, poi 'warm' (o 'error' se il caricamento fallisce).
+    """
+
+    def __init__(self, interval: float = WARMUP_INTERVAL):
+        super().__init__(name="cache-warmup", daemon=True)
+        self.interval = interval
+        self._status_lock = threading.Lock()
+        self._status: Dict[tuple, Dict] = {}
+        self._versions: Dict[tuple, int] = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            current_year = forecast_manager.CURRENT_SYSTEM_YEAR
+            for structure in warmup_targets():
+                for year in (current_year, current_year - 1):
+                    self._warm(structure, year, with_pickup=(year == current_year))
+            # Vista portafoglio dell'Overview: riusa i dataset appena scaldati
+            for year in (current_year, current_year - 1):
+                try:
+                    portfolio.get_portfolio_daily(year)
+                    portfolio.get_portfolio_monthly(year)
+                except Exception as e:
+                    logger.warning(f"Warmup portafoglio {year} fallito: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _set_status(self, structure, year, state, version=None, error=None):
+        with self._status_lock:
+            self._status[(structure, year)] = {
+                'structure': structure,
+                'year': year,
+                'state': state,
+                'version': version,
+                'error': error,
+                'updated_at': datetime.datetime.now()
+            }
+
+    def _warm(self, structure: str, year: int, with_pickup: bool):
+        try:
+            generation = forecast_manager.get_generation(structure, year, refresh=True)
+            if self._versions.get((structure, year)) == generation:
+                return
+
+            started = time.time()
+            df, _ = forecast_manager.get_consolidated_data(structure, year)
+            if df.empty and forecast_manager.get_index_files(structure, year):
+                # L'indice ha file ma lo snapshot non è arrivato: non è 'warm', si riprova al prossimo giro
+                raise RuntimeError("ultimo snapshot non scaricato")
+            forecast_manager.get_monthly_summary(structure, year)
+            # Colonna "Trend Prev" dell'Overview
+            forecast_manager.get_previous_snapshot(structure, year)
+
+            if with_pickup:
+                self._warm_pickup_and_pace(structure, year)
+
+            self._versions[(structure, year)] = generation
+            self._set_status(structure, year, 'warm', version=generation)
+            logger.info(f"Warmup {structure} {year}: {time.time() - started:.1f}s")
+        except Exception as e:
+            self._versions.pop((structure, year), None)
+            self._set_status(structure, year, 'error', error=str(e))
+            logger.warning(f"Warmup fallito per {structure} {year}: {e}")
+
+    def _warm_pickup_and_pace(self, structure: str, year: int):
+        df_snaps = forecast_manager.get_available_snapshots(structure, year)
+        if df_snaps.empty:
+            return
+
+        # Default della pagina Pickup: ultimo snapshot vs 1 giorno prima
+        latest = df_snaps.iloc[0]
+        target_date = latest['date'] - datetime.timedelta(days=1)
+        past = df_snaps[df_snaps['date'] <= target_date]
+        file_old = past.iloc[0]['filename'] if not past.empty else df_snaps.iloc[-1]['filename']
+        if file_old != latest['filename']:
+            forecast_manager.get_pickup_data(structure, year, latest['filename'], file_old)
+
+        forecast_manager.get_pace_data(structure, year)
+
+    def status(self) -> Dict:
+        """
+        Stato complessivo e dettaglio: 'warm' se tutte le struttura-anno sono calde,
+        'error' se almeno un caricamento è fallito, altrimenti 'cold'.
+        """
+        current_year = forecast_manager.CURRENT_SYSTEM_YEAR
+        expected = [(s, y) for s in warmup_targets() for y in (current_year, current_year - 1)]
+        with self._status_lock:
+            details = [self._status.get(k, {'structure': k[0], 'year': k[1], 'state': 'cold',
+                                            'version': None, 'error': None, 'updated_at': None}) for k in expected]
+        states = {d['state'] for d in details}
+        overall = 'warm' if states == {'warm'} else 'error' if 'error' in states else 'cold'
+        return {'state': overall, 'details': details}
+
+
+def start_warmup(interval: float = WARMUP_INTERVAL) -> WarmupWorker:
+    """Avvia il worker una sola volta per processo (chiamate successive restituiscono lo stesso)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = WarmupWorker(interval)
+            _worker.start()
+        return _worker
+
+
+def get_warmup_status() -> Dict:
+    """Stato del warmup; 'cold' se il worker non è ancora partito."""
+    if _worker is None:
+        return {'state': 'cold', 'details': []}
+    return _worker.status()
@@ -0,0 +1,26 @@
+import io
+
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from services import kpi_query
+
+
+def test_write_arrow_roundtrip_non_empty_cell():
+    cell = kpi_query._conform(pd.DataFrame({
+        'structure': ["Lavagnini My Place"], 'year': [2026], 'month': [6], 'date': [pd.NaT],
+        'revenue': [12500.0], 'rooms_sold': [100.0], 'rooms': [150.0], 'days': [30.0],
+        'adr': [125.0], 'occupancy_pct': [66.67], 'revpar': [83.33]
+    }))
+    sink = io.BytesIO()
+
+    assert kpi_query.write_arrow([kpi_query._empty_cell(), cell], sink) == 1
+
+    table = pa.ipc.open_stream(sink.getvalue()).read_all()
+    assert table.schema == kpi_query.arrow_schema()
+    out = table.to_pandas()
+    assert out['structure'].tolist() == ["Lavagnini My Place"]
+    assert out[['year', 'month']].values.tolist() == [[2026, 6]]
+    assert out['revenue'].tolist() == [12500.0]
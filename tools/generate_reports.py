@@ -0,0 +1,38 @@
+"""
+Report mensili per struttura (KPI, griglia mesi, pickup, copertura budget) in HTML.
+
+Gli input si caricano una volta dalla cache dataset, una struttura per thread
+(vedi services/reports.py).
+
+Uso:
+    python tools/generate_reports.py --year 2026                      # tutte le strutture, tutti i mesi
+    python tools/generate_reports.py --year 2026 --months 6 7 --structures "Lavagnini My Place"
+    python tools/generate_reports.py --year 2026 --out /tmp/report --workers 4
+"""
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services import forecast_manager, reports  # noqa: E402
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Report mensili per struttura")
+    parser.add_argument('--year', type=int, default=forecast_manager.CURRENT_SYSTEM_YEAR)
+    parser.add_argument('--months', nargs='+', type=int, choices=range(1, 13), metavar='MESE')
+    parser.add_argument('--structures', nargs='+', choices=forecast_manager.get_structure_labels(), metavar='STRUTTURA')
+    parser.add_argument('--out', type=Path, default=reports.REPORT_DIR)
+    parser.add_argument('--workers', type=int, default=reports.REPORT_WORKERS, help="Strutture elaborate in parallelo")
+    args = parser.parse_args(argv)
+
+    paths = reports.generate_reports(args.year, args.months, args.structures, args.out, args.workers)
+    for path in paths:
+        print(path)
+    return 0 if paths else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,98 @@
+"""
+Budget di tempo di import per pagina (cold start).
+
+Per ogni pagina raccoglie gli import eseguiti a livello di modulo (quelli dentro
+le funzioni sono lazy e non contano), li esegue in un interprete pulito con
+`python -X importtime` e confronta il tempo cumulativo con il budget.
+
+Uso:
+    python tools/import_budget.py            # tabella + exit code 1 se fuori budget
+    python tools/import_budget.py --json     # output JSON
+"""
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Budget in millisecondi per pagina (import a freddo, interprete nuovo)
+BUDGET_MS = {
+    "Dashboard Overview.py": 1500,
+    "pages/02_Analisi_Dettaglio.py": 2000,
+    "pages/03_Confronto_Pickup.py": 2500,
+    "pages/04_Pace_Analysis.py": 2500,
+    "pages/05_Calendario_Eventi.py": 2500,
+    "pages/06_Budget_Tool.py": 1500,
+    "pages/07_Budget_Target.py": 2500,
+    "pages/98_Carica_Dati.py": 1200,
+    "pages/99_Ispettore.py": 1200,
+}
+
+
+def module_level_imports(path: Path) -> str:
+    """Restituisce il codice degli import eseguiti a livello di modulo (no funzioni/classi)."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    nodes = []
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                nodes.append(node)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            else:
+                # if/with/try a livello di modulo vengono comunque eseguiti
+                for field in ("body", "orelse", "finalbody"):
+                    visit(getattr(node, field, []) or [])
+                for handler in getattr(node, "handlers", []) or []:
+                    visit(handler.body)
+
+    visit(tree.body)
+    return "\n".join(ast.unparse(n) for n in nodes)
+
+
+def measure_import_ms(code: str) -> float:
+    """Esegue `code` con -X importtime e somma il cumulativo dei moduli di primo livello."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import fallito")
+
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [p for p in line.split("|")]
+        # I moduli di primo livello non hanno indentazione nel nome
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative.strip())
+    return total_us / 1000
+
+
+def main(argv):
+    results = []
+    for page, budget in BUDGET_MS.items():
+        code = module_level_imports(ROOT / page)
+        try:
+            ms = measure_import_ms(code)
+            results.append({"page": page, "import_ms": round(ms, 1), "budget_ms": budget, "ok": ms <= budget})
+        except RuntimeError as e:
+            results.append({"page": page, "import_ms": None, "budget_ms": budget, "ok": False, "error": str(e)})
+
+    if "--json" in argv:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            status = "OK " if r["ok"] else "KO "
+            value = f"{r['import_ms']:>8.1f} ms" if r["import_ms"] is not None else f"  errore: {r.get('error')}"
+            print(f"{status} {r['page']:<32} {value}  (budget {r['budget_ms']} ms)")
+
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,212 @@
+"""
+KPI senza Streamlit: riga di comando e piccolo servizio HTTP JSON locale (anche export tabelle).
+
+Usa gli stessi loader e la stessa cache dataset delle pagine (services.kpi_query).
+Una query è struttura x anno x mesi a una granularità; più query si possono
+mandare insieme e il risultato esce in streaming, cella per cella.
+
+Uso:
+    python tools/kpi_service.py query --years 2025 2026                  # tutte le strutture, mensile
+    python tools/kpi_service.py query --years 2026 --months 6 7 8 --grain day --structures "Lavagnini My Place"
+    python tools/kpi_service.py query --file batch.json --format arrow > kpi.arrow
+    python tools/kpi_service.py export --table monthly_grid --years 2025 2026 --format xlsx --out griglia.xlsx
+    python tools/kpi_service.py serve --port 8765 [--warmup]
+
+Servizio HTTP:
+    GET  /health
+    GET  /structures
+    GET  /kpi?years=2025,2026&months=1,2&grain=month&structures=...&format=jsonl
+    POST /kpi?format=arrow     corpo: una query, una lista, oppure {"queries": [...]}
+    GET  /export?table=monthly_grid&years=2025,2026&structures=...&format=xlsx
+         tabelle: monthly_grid, daily_detail, pickup_movers, budget_comparison
+         formati: xlsx, csv, parquet
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services import exports, forecast_manager, kpi_query, portfolio  # noqa: E402
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def _split(values):
+    """Valori di una query string: ripetuti (?years=2025&years=2026) o separati da virgola."""
+    return [v for item in values for v in item.split(',') if v]
+
+
+def query_from_params(params) -> dict:
+    """Query KPI dai parametri di una GET."""
+    query = {'years': _split(params.get('years', [])), 'grain': params.get('grain', ['month'])[0]}
+    if 'months' in params:
+        query['months'] = _split(params['months'])
+    if 'structures' in params:
+        query['structures'] = _split(params['structures'])
+    return query
+
+
+class KpiHandler(BaseHTTPRequestHandler):
+    # HTTP/1.0: la risposta si chiude con la connessione, le righe si scrivono man mano
+    protocol_version = "HTTP/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, queries, fmt):
+        if fmt not in kpi_query.OUTPUT_FORMATS:
+            return self._send_json(400, {'error': f"Formato sconosciuto: {fmt}"})
+        try:
+            kpi_query.expand_queries(queries)  # validazione prima di inviare lo stato 200
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+
+        self.send_response(200)
+        self.send_header('Content-Type', kpi_query.OUTPUT_FORMATS[fmt])
+        self.end_headers()
+        try:
+            kpi_query.write_kpis(queries, self.wfile, fmt)
+        except BrokenPipeError:
+            pass  # client disconnesso a metà stream
+
+    def _export(self, params):
+        table = params.get('table', [''])[0]
+        fmt = params.get('format', ['xlsx'])[0]
+        structures = _split(params.get('structures', [])) or forecast_manager.get_structure_labels()
+        try:
+            years = [int(y) for y in _split(params.get('years', []))]
+        except ValueError:
+            return self._send_json(400, {'error': "Anni non validi"})
+        if table not in exports.EXPORT_TABLES or fmt not in exports.EXPORT_FORMATS or not years:
+            return self._send_json(400, {'error': f"Servono table ({', '.join(exports.EXPORT_TABLES)}), "
+                                                  f"years e format ({', '.join(exports.EXPORT_FORMATS)})"})
+
+        self.send_response(200)
+        self.send_header('Content-Type', exports.EXPORT_FORMATS[fmt])
+        self.send_header('Content-Disposition', f'attachment; filename="{table}.{fmt}"')
+        self.end_headers()
+        try:
+            if fmt == 'csv':
+                exports.export_table(table, structures, years, self.wfile, fmt)
+            else:
+                # xlsx e parquet si chiudono con un indice finale: file temporaneo su disco, poi copia
+                with tempfile.TemporaryFile() as tmp:
+                    exports.export_table(table, structures, years, tmp, fmt)
+                    tmp.seek(0)
+                    shutil.copyfileobj(tmp, self.wfile)
+        except BrokenPipeError:
+            pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == '/health':
+            return self._send_json(200, {'status': 'ok'})
+        if url.path == '/structures':
+            return self._send_json(200, {'structures': forecast_manager.get_structure_labels(),
+                                         'portfolio': portfolio.PORTFOLIO_LABEL})
+        if url.path == '/kpi':
+            return self._stream([query_from_params(params)], params.get('format', ['jsonl'])[0])
+        if url.path == '/export':
+            return self._export(params)
+        self._send_json(404, {'error': f"Percorso sconosciuto: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/kpi':
+            return self._send_json(404, {'error': f"Percorso sconosciuto: {url.path}"})
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            queries = kpi_query.parse_queries(body)
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        self._stream(queries, parse_qs(url.query).get('format', ['jsonl'])[0])
+
+    def log_message(self, format, *args):
+        kpi_query.logger.info("%s %s", self.address_string(), format % args)
+
+
+def serve(host: str, port: int, warmup: bool = False):
+    if warmup:
+        # Stesso worker della dashboard: la cache resta calda tra una richiesta e l'altra
+        from services.warmup import start_warmup
+        start_warmup()
+    server = ThreadingHTTPServer((host, port), KpiHandler)
+    print(f"Servizio KPI su http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="KPI senza Streamlit (CLI e servizio HTTP)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    q = sub.add_parser('query', help="Esegue una query (o un batch da file) e scrive su stdout")
+    q.add_argument('--years', nargs='+', type=int)
+    q.add_argument('--months', nargs='+', type=int)
+    q.add_argument('--structures', nargs='+')
+    q.add_argument('--grain', choices=kpi_query.QUERY_GRAINS, default='month')
+    q.add_argument('--file', help="File JSON con una query o una lista di query")
+    q.add_argument('--format', choices=list(kpi_query.OUTPUT_FORMATS), default='jsonl')
+
+    e = sub.add_parser('export', help="Esporta una tabella (più strutture e anni) su file o stdout")
+    e.add_argument('--table', choices=list(exports.EXPORT_TABLES), required=True)
+    e.add_argument('--years', nargs='+', type=int, required=True)
+    e.add_argument('--structures', nargs='+')
+    e.add_argument('--format', choices=list(exports.EXPORT_FORMATS), default='xlsx')
+    e.add_argument('--out', type=Path, help="File di destinazione (default: stdout)")
+
+    s = sub.add_parser('serve', help="Avvia il servizio HTTP locale")
+    s.add_argument('--host', default=DEFAULT_HOST)
+    s.add_argument('--port', type=int, default=DEFAULT_PORT)
+    s.add_argument('--warmup', action='store_true', help="Avvia il worker di warmup della cache")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.host, args.port, args.warmup)
+        return 0
+
+    if args.command == 'export':
+        structures = args.structures or forecast_manager.get_structure_labels()
+        if args.out:
+            with open(args.out, 'wb') as sink:
+                exports.export_table(args.table, structures, args.years, sink, args.format)
+        else:
+            exports.export_table(args.table, structures, args.years, sys.stdout.buffer, args.format)
+        return 0
+
+    try:
+        if args.file:
+            queries = kpi_query.parse_queries(Path(args.file).read_bytes())
+        else:
+            queries = [{'years': args.years or [], 'months': args.months,
+                        'structures': args.structures, 'grain': args.grain}]
+        kpi_query.expand_queries(queries)
+    except ValueError as e:
+        print(f"Errore: {e}", file=sys.stderr)
+        return 2
+
+    kpi_query.write_kpis(queries, sys.stdout.buffer, args.format)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable
+
+
+# ==============================================================================
+# RIDUZIONE PUNTI DEI GRAFICI (LATO SERVER)
+# ==============================================================================
+# Un grafico non mostra più punti dei pixel disponibili: oltre quella soglia i
+# dati vengono ridotti prima di serializzarli verso il browser.
+#   Linee -> LTTB (Largest-Triangle-Three-Buckets), conserva picchi e forma.
+#   Barre -> un valore per gruppo di giorni consecutivi (di default la riga
+#            con il valore massimo, così i picchi restano visibili).
+# Sotto la soglia i dati passano invariati.
+
+DEFAULT_CHART_WIDTH = 1200      # px, grafico a tutta larghezza
+PIXELS_PER_POINT = 2
+
+
+def max_points(width: int = DEFAULT_CHART_WIDTH) -> int:
+    """Punti massimi per un grafico largo `width` pixel."""
+    return max(3, int(width) // PIXELS_PER_POINT)
+
+
+def _numeric_x(values) -> np.ndarray:
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').astype('int64') / 1e9
+    return values.to_numpy(dtype='float64')
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Indici dei punti scelti da LTTB (primo e ultimo sempre inclusi).
+
+    Args:
+        x: Ascisse ordinate (numeri o date)
+        y: Ordinate
+        n_out: Punti da mantenere
+
+    Returns:
+        Array di indici crescenti (tutti gli indici se n_out >= len(x))
+    """
+    x = _numeric_x(x)
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 bucket tra il primo e l'ultimo punto
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    selected = np.empty(n_out, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        # Area del triangolo (punto scelto prima, candidato, media del bucket successivo)
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_line(df: pd.DataFrame, x: str, y: str, width: int = DEFAULT_CHART_WIDTH) -> pd.DataFrame:
+    """Righe di `df` scelte con LTTB sulla serie `y` (df ordinato per `x`)."""
+    n_out = max_points(width)
+    if len(df) <= n_out:
+        return df
+    df = df.sort_values(x)
+    return df.iloc[lttb_indices(df[x], df[y], n_out)]
+
+
+def downsample_bars(df: pd.DataFrame, x: str, columns: Iterable[str], width: int = DEFAULT_CHART_WIDTH,
+                    how: str = 'max') -> pd.DataFrame:
+    """
+    Una barra per gruppo di righe consecutive.
+
+    Args:
+        df: Dati giornalieri
+        x: Colonna dell'asse X (ordinamento)
+        columns: Colonne dei valori; la prima decide la riga del gruppo con 'max'/'absmax'
+        width: Larghezza del grafico in pixel
+        how: 'max' / 'absmax' (riga con il picco, valori reali) oppure 'mean' / 'sum'
+
+    Returns:
+        DataFrame ridotto (invariato se già sotto la soglia)
+    """
+    columns = list(columns)
+    n_out = max_points(width)
+    if len(df) <= n_out:
+        return df
+
+    df = df.sort_values(x).reset_index(drop=True)
+    bucket = np.arange(len(df)) * n_out // len(df)
+    if how in ('max', 'absmax'):
+        peak = df[columns[0]].abs() if how == 'absmax' else df[columns[0]]
+        return df.loc[peak.groupby(bucket).idxmax().dropna().astype('int64')]
+
+    out = df.groupby(bucket).agg({x: 'first', **{c: how for c in columns}})
+    return out.reset_index(drop=True)
@@ -1,6 +1,10 @@
+import re
 import streamlit as st
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
+
+from services.dataset_cache import get_cache
 
 
 def format_currency(value: float, decimals: int = 2) -> str:
@@ -303,6 +307,166 @@ def render_day_grid(daily_df: pd.DataFrame, height: int = 400):
     )
 
 
+# ==============================================================================
+# GRIGLIE NATIVE (ARROW) CON COLORI VETTORIALI
+# ==============================================================================
+# I colori si calcolano con NumPy su intere colonne (niente Styler.map cella per
+# cella, niente matplotlib per i gradienti). La formattazione dei numeri passa
+# da column_config, quindi la tabella resta Arrow nativa. Lo Styler entra in
+# gioco solo se ci sono colori, con una sola apply su tutta la tabella.
+#
+# La matrice CSS di una tabella si calcola una volta per contenuto (impronta di
+# dati e colori) e resta nella cache condivisa: i rerun costruiscono solo lo
+# Styler (API pubblica, Styler.apply) con gli stili già pronti.
+
+DELTA_POSITIVE = '#28a745'
+DELTA_NEGATIVE = '#dc3545'
+
+# Estremi (e punto medio per le divergenti) in RGB, come le colormap matplotlib omonime
+GRADIENTS = {
+    'Blues': [(247, 251, 255), (8, 81, 156)],
+    'Greens': [(247, 252, 245), (0, 109, 44)],
+    'Reds_r': [(165, 15, 21), (255, 245, 240)],
+    'RdYlGn': [(215, 48, 39), (255, 255, 191), (26, 152, 80)]
+}
+
+
+def gradient_css(values, cmap: str = 'Blues') -> np.ndarray:
+    """
+    CSS di sfondo (con testo leggibile) per una colonna, normalizzata tra min e max.
+
+    Returns:
+        Array di stringhe CSS ('' dove il valore è NaN)
+    """
+    values = np.asarray(values, dtype='float64')
+    stops = np.asarray(GRADIENTS[cmap], dtype='float64')
+    finite = np.isfinite(values)
+    if not finite.any():
+        return np.full(len(values), '', dtype=object)
+
+    low, high = values[finite].min(), values[finite].max()
+    t = np.where(finite, (values - low) / (high - low) if high > low else 0.5, 0.0)
+    # Interpolazione lineare tra gli stop della scala
+    scaled = t * (len(stops) - 1)
+    idx = np.clip(np.floor(scaled).astype('int64'), 0, len(stops) - 2)
+    frac = (scaled - idx)[:, None]
+    rgb = np.rint(stops[idx] * (1 - frac) + stops[idx + 1] * frac).astype('int64')
+
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    luminance = (0.299 * rgb[:, 0] + 0.587 * rgb[:, 1] + 0.114 * rgb[:, 2]) / 255
+    text = np.where(luminance < 0.5, 'color: #f1f1f1;', 'color: #000000;')
+    css = np.char.add(np.char.mod('background-color: #%06x; ', packed), text)
+    return np.where(finite, css.astype(object), '')
+
+
+def delta_css(values, neutral_zero: bool = False) -> np.ndarray:
+    """
+    Testo verde/rosso in grassetto secondo il segno del delta.
+    Con neutral_zero gli zeri restano attenuati (nessuna variazione).
+    """
+    values = np.asarray(values, dtype='float64')
+    css = np.where(values >= 0, f'color: {DELTA_POSITIVE}; font-weight: bold;',
+                   f'color: {DELTA_NEGATIVE}; font-weight: bold;').astype(object)
+    if neutral_zero:
+        css = np.where(values == 0, 'color: inherit; opacity: 0.4', css)
+    return np.where(np.isnan(values), '', css)
+
+
+def _grid_fingerprint(df: pd.DataFrame, gradients: Dict, deltas: list, row_css, cell_css: Dict,
+                      neutral_zero: bool) -> int:
+    """Impronta di dati e colori di una tabella (hash vettoriale, nessun ciclo sulle celle)."""
+    parts = [tuple(map(str, df.columns)), tuple(sorted(gradients.items())), tuple(deltas), neutral_zero,
+             pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()]
+    if row_css is not None:
+        parts.append(pd.util.hash_array(np.asarray(row_css, dtype=object)).tobytes())
+    for col, values in sorted(cell_css.items()):
+        parts.append((col, pd.util.hash_array(np.asarray(values, dtype=object)).tobytes()))
+    return hash(tuple(parts))
+
+
+def _grid_css(df: pd.DataFrame, gradients: Dict, deltas: list, row_css, cell_css: Dict,
+              neutral_zero: bool) -> pd.DataFrame:
+    """Matrice CSS della tabella (stessa forma di `df`)."""
+    css = np.full(df.shape, '', dtype=object)
+    if row_css is not None:
+        css[:] = np.asarray(row_css, dtype=object)[:, None]
+    columns = list(df.columns)
+    for col, cmap in gradients.items():
+        css[:, columns.index(col)] = gradient_css(df[col], cmap)
+    for col in deltas:
+        css[:, columns.index(col)] = delta_css(df[col], neutral_zero)
+    for col, values in cell_css.items():
+        css[:, columns.index(col)] = np.asarray(values, dtype=object)
+
+    return pd.DataFrame(css, index=df.index, columns=df.columns)
+
+
+def render_grid(df: pd.DataFrame, column_config: Optional[Dict] = None,
+                gradients: Optional[Dict[str, str]] = None, deltas: Iterable[str] = (),
+                row_css=None, cell_css: Optional[Dict[str, np.ndarray]] = None,
+                neutral_zero: bool = False, **kwargs):
+    """
+    Mostra una tabella con st.dataframe: formati da column_config, colori calcolati per colonna.
+
+    Args:
+        df: Dati da mostrare (valori numerici, non stringhe formattate)
+        column_config: Configurazione colonne di Streamlit (formati, etichette)
+        gradients: {colonna: scala} per gli sfondi a gradiente (vedi GRADIENTS)
+        deltas: Colonne colorate verde/rosso per segno
+        row_css: CSS per riga (array lungo len(df)), applicato a tutte le colonne
+        cell_css: {colonna: array CSS} già calcolato dal chiamante
+        neutral_zero: Attenua gli zeri nelle colonne delta
+        **kwargs: Argomenti passati a st.dataframe (height, hide_index, ...)
+    """
+    kwargs.setdefault('use_container_width', True)
+    gradients, deltas, cell_css = gradients or {}, list(deltas), dict(cell_css or {})
+
+    if not (gradients or deltas or cell_css or row_css is not None):
+        st.dataframe(df, column_config=column_config, **kwargs)
+        return
+
+    # CSS calcolato una volta per contenuto; lo Styler (non thread-safe) è nuovo a ogni rerun
+    key = ('grid_css', _grid_fingerprint(df, gradients, deltas, row_css, cell_css, neutral_zero))
+    styles = get_cache().get_or_load(key, lambda: _grid_css(df, gradients, deltas, row_css, cell_css, neutral_zero))
+    # Il formato di column_config prevale sui valori di display dello Styler
+    styler = df.style.apply(lambda _: styles, axis=None).format(precision=2, na_rep='')
+    st.dataframe(styler, column_config=column_config, **kwargs)
+
+
+def spec_column_config(spec: Dict, df: Optional[pd.DataFrame] = None) -> Dict:
+    """
+    column_config da una specifica {colonna: (etichetta, formato printf)} (vedi services/reports.py),
+    la stessa usata dagli export: a video e nel file i formati coincidono.
+    """
+    return {
+        col: st.column_config.NumberColumn(label, format=fmt) if fmt else st.column_config.TextColumn(label)
+        for col, (label, fmt) in spec.items()
+        if df is None or col in df.columns
+    }
+
+
+def render_export(df: pd.DataFrame, spec: Dict, file_stem: str, key: str, title: str = "Export"):
+    """
+    Pulsanti di download (Excel, CSV) della tabella mostrata, con etichette e formati di `spec`.
+    I file si generano solo al click (callable di download_button), non a ogni rerun.
+
+    Args:
+        df: Tabella così come passata a render_grid (valori numerici)
+        spec: Specifica colonne {colonna: (etichetta, formato printf)}
+        file_stem: Nome del file senza estensione
+        key: Prefisso delle chiavi dei widget
+        title: Nome del foglio Excel
+    """
+    from services import exports  # import differito: solo le pagine con export caricano il modulo
+
+    file_stem = re.sub(r'[^\w-]+', '_', file_stem).strip('_')
+    c_xlsx, c_csv, _ = st.columns([1, 1, 6])
+    c_xlsx.download_button("⬇️ Excel", lambda: exports.table_bytes(df, spec, 'xlsx', title), f"{file_stem}.xlsx",
+                           mime=exports.EXPORT_FORMATS['xlsx'], key=f"{key}_xlsx", on_click='ignore')
+    c_csv.download_button("⬇️ CSV", lambda: exports.table_bytes(df, spec, 'csv'), f"{file_stem}.csv",
+                          mime=exports.EXPORT_FORMATS['csv'], key=f"{key}_csv", on_click='ignore')
+
+
 def render_comparison_chart(comparison_df: pd.DataFrame, metric: str = 'revenue', 
                            title: Optional[str] = None):
     """
@@ -1,8 +1,6 @@
 import pandas as pd
 import streamlit as st
-import boto3
 from io import BytesIO
-from datetime import datetime
 
 class ForecastManager:
     def __init__(self):
@@ -12,11 +10,19 @@ class ForecastManager:
         self.secret = st.secrets["secret_key"]
         self.bucket = st.secrets["bucket_name"]
         
-        self.s3 = boto3.client('s3',
-            endpoint_url=self.endpoint,
-            aws_access_key_id=self.key,
-            aws_secret_access_key=self.secret
-        )
+        self._s3 = None
+
+    @property
+    def s3(self):
+        """Client S3 creato al primo utilizzo (boto3 è l'import più pesante)."""
+        if self._s3 is None:
+            import boto3
+            self._s3 = boto3.client('s3',
+                endpoint_url=self.endpoint,
+                aws_access_key_id=self.key,
+                aws_secret_access_key=self.secret
+            )
+        return self._s3
 
     def get_consolidated_data(self, struttura, anno):
         """Legge file Excel o CSV eliminando totali e normalizzando i nomi delle colonne"""
@@ -88,47 +94,41 @@ class ForecastManager:
         except Exception as e:
             return pd.DataFrame(), f"Errore S3: {str(e)}"
 
-    def save_budget(self, df, struttura, anno, tipo='test'):
+    def save_budget(self, df, struttura, anno, tipo='test', label=""):
         """
-        Salva il budget su DigitalOcean Spaces in formato CSV.
+        Salva il budget come nuova versione nell'archivio versioni (services/budget_store).
+        
+        Ogni salvataggio aggiunge una versione (mai sovrascritta). Per il budget
+        ufficiale si aggiorna anche budget_official.csv, letto da 07 - Budget Target.
         
         Args:
             df: DataFrame con i dati del budget
             struttura: Nome della struttura (es: "Lavagnini", "La Terrazza")
             anno: Anno del budget (es: 2026)
             tipo: 'official' o 'test' (default: 'test')
+            label: Descrizione libera della versione
         
         Returns:
-            Tuple[bool, str]: (success, percorso_file_o_messaggio_errore)
+            Tuple[bool, str]: (success, id_versione_o_messaggio_errore)
         """
+        from services import budget_store
+        
         try:
-            # Normalizza nome struttura
-            folder_struct = struttura.replace(" ", "_")
+            meta = budget_store.append_version(self.s3, self.bucket, df, struttura, anno, tipo=tipo, label=label)
             
-            # Determina il percorso in base al tipo
             if tipo == 'official':
                 # Percorso: Budgets-Official/[Struttura]-[Anno]/budget_official.csv
-                folder_path = f"Budgets-Official/{folder_struct}-{anno}"
-                filename = f"{folder_path}/budget_official.csv"
-            else:  # tipo == 'test'
-                # Percorso: Budgets-Test/[Struttura]-[Anno]/budget_test_[timestamp].csv
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-                folder_path = f"Budgets-Test/{folder_struct}-{anno}"
-                filename = f"{folder_path}/budget_test_{timestamp}.csv"
-            
-            # Converti il DataFrame in CSV
-            csv_buffer = BytesIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            
-            # Carica su S3
-            self.s3.put_object(
-                Bucket=self.bucket,
-                Key=filename,
-                Body=csv_buffer.getvalue()
-            )
+                filename = budget_store.official_key(struttura, anno)
+                
+                csv_buffer = BytesIO()
+                df.to_csv(csv_buffer, index=False)
+                self.s3.put_object(
+                    Bucket=self.bucket,
+                    Key=filename,
+                    Body=csv_buffer.getvalue()
+                )
             
-            return True, filename
+            return True, meta['id']
             
         except Exception as e:
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)